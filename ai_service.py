@@ -5,15 +5,108 @@ Handles natural language processing and response generation
 
 import os
 import json
+import random
+import asyncio
 import logging
-import requests
+import importlib.util
 import time
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+
+import httpx
+import openai
 from dotenv import load_dotenv
 
+from sql_cache import SemanticSQLCache, is_cacheable_sql, normalize_question
+from sql_templates import SQLTemplate, build_template
+from intents import IntentMatch, intent_matcher
+from single_flight import SingleFlight
+from columnar_result import QueryData
+from metrics import span, timed
+
 load_dotenv()
 log = logging.getLogger("jen.ai")
 
+# Canned intents whose SQL does not depend on a reporting period
+PERIODLESS_INTENTS = {"agent_count"}
+
+# Canned SQL for common intents, keyed by (intent, scope) - "user" is the fallback scope
+CANNED_QUERIES = {
+    ("total_income", "user"): """
+            SELECT SUM(NET_COMMISSION) as total_income
+            FROM payroll_Queue_Archive 
+            WHERE USER_ID = %s 
+              AND YEAR(Wire_Date) = YEAR(GETDATE())
+              AND (BuyerID > 0 OR ListingID > 0);
+            """,
+    ("total_income", "team"): """
+            SELECT SUM(NET_COMMISSION) as total_income
+            FROM payroll_Queue_Archive 
+            WHERE EQUITY_DIVISION_25_ID = %s
+              AND YEAR(Wire_Date) = YEAR(GETDATE())
+              AND (BuyerID > 0 OR ListingID > 0);
+            """,
+    ("total_income", "system"): """
+            SELECT SUM(NET_COMMISSION) as total_income
+            FROM payroll_Queue_Archive 
+            WHERE YEAR(Wire_Date) = YEAR(GETDATE())
+              AND (BuyerID > 0 OR ListingID > 0);
+            """,
+    ("deal_count", "user"): """
+            SELECT COUNT(*) as deal_count
+            FROM payroll_Queue_Archive 
+            WHERE USER_ID = %s 
+              AND YEAR(Wire_Date) = YEAR(GETDATE())
+              AND (BuyerID > 0 OR ListingID > 0);
+            """,
+    ("worst_month", "user"): """
+            SELECT TOP 1 
+                DATENAME(month, Wire_Date) + ' ' + CAST(YEAR(Wire_Date) as varchar) as month,
+                SUM(NET_COMMISSION) as total 
+            FROM payroll_Queue_Archive 
+            WHERE USER_ID = %s 
+              AND YEAR(Wire_Date) = YEAR(GETDATE())
+              AND (BuyerID > 0 OR ListingID > 0)
+            GROUP BY DATENAME(month, Wire_Date), YEAR(Wire_Date) 
+            HAVING SUM(NET_COMMISSION) > 0
+            ORDER BY total ASC;
+            """,
+    ("best_month", "user"): """
+            SELECT TOP 1 
+                DATENAME(month, Wire_Date) + ' ' + CAST(YEAR(Wire_Date) as varchar) as month,
+                SUM(NET_COMMISSION) as total 
+            FROM payroll_Queue_Archive 
+            WHERE USER_ID = %s 
+              AND YEAR(Wire_Date) = YEAR(GETDATE())
+              AND (BuyerID > 0 OR ListingID > 0)
+            GROUP BY DATENAME(month, Wire_Date), YEAR(Wire_Date) 
+            HAVING SUM(NET_COMMISSION) > 0
+            ORDER BY total DESC;
+            """,
+    ("average_deal_size", "user"): """
+            SELECT AVG(SalesPrice) as average_deal_size
+            FROM payroll_Queue_Archive 
+            WHERE USER_ID = %s 
+              AND YEAR(Wire_Date) = YEAR(GETDATE())
+              AND (BuyerID > 0 OR ListingID > 0)
+              AND SalesPrice > 0;
+            """,
+    ("agent_count", "team"): """
+                SELECT COUNT(DISTINCT u.USER_ID) as agent_count
+                FROM TBL_USER_CREATE u
+                INNER JOIN TBL_FEES_MASTER f ON u.FEE_ID = f.FEE_ID
+                WHERE f.EQUITY_DIVISION_25_ID = %s
+                  AND u.USTATUS = 1
+                  AND u.STATUS_ID NOT IN (2, 11)
+                  AND u.UTYPE_ID = 14;
+                """,
+    ("agent_count", "system"): """
+                SELECT COUNT(DISTINCT USER_ID) as agent_count
+                FROM TBL_USER_CREATE
+                WHERE USTATUS = 1 
+                  AND UTYPE_ID = 14;
+                """
+}
+
 class JenAI:
     """AI service for natural language processing and response generation"""
     
@@ -23,6 +116,42 @@ class JenAI:
         self.model = os.getenv("OPENAI_MODEL", "openai/gpt-4o-mini")
         self.is_openrouter = "openrouter.ai" in self.base_url
         
+        # Shared keep-alive HTTP client for OpenRouter (created on first use inside the event loop)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        # Total attempts per request; always at least one
+        self.llm_max_retries = max(1, int(os.getenv("LLM_MAX_RETRIES", "3")))
+        self.llm_deadline = float(os.getenv("LLM_DEADLINE_SECONDS", "25"))
+        self.llm_attempt_timeout = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "15"))
+        
+        # Long-lived async OpenAI client for direct-OpenAI mode, with its own pool and concurrency cap
+        self.openai_max_concurrency = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        self._openai_semaphore: Optional[asyncio.Semaphore] = None
+        self._openai_client: Optional[openai.AsyncOpenAI] = None
+        if self.api_key and not self.is_openrouter:
+            self._openai_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                max_retries=max(0, self.llm_max_retries - 1),
+                timeout=self.llm_attempt_timeout,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.openai_max_concurrency,
+                        max_keepalive_connections=self.openai_max_concurrency,
+                        keepalive_expiry=60
+                    ),
+                    timeout=httpx.Timeout(self.llm_attempt_timeout, connect=5.0)
+                )
+            )
+        
+        # Learned NL->SQL cache so paraphrased questions skip the LLM
+        self.sql_cache = SemanticSQLCache(
+            path=os.getenv("SQL_CACHE_PATH", "sql_cache.json"),
+            max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "2000")),
+            ttl_seconds=float(os.getenv("SQL_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+            threshold=float(os.getenv("SQL_CACHE_SIMILARITY", "0.75"))
+        )
+        self._canned_templates: Dict[str, SQLTemplate] = {}
+        self.generation_flight = SingleFlight("sql_generation")
+        
         log.info(f"JenAI initialized - Provider: {'OpenRouter' if self.is_openrouter else 'OpenAI'}, Model: {self.model}")
         
         # Voice personality for Jen
@@ -37,31 +166,132 @@ class JenAI:
         """Check if AI service is healthy"""
         return bool(self.api_key)
     
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client reused for every OpenRouter request"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                    "HTTP-Referer": "https://equity-usa.net",
+                    "X-Title": "Jen AI Assistant"
+                },
+                # HTTP/2 needs the optional h2 package; fall back to keep-alive HTTP/1.1
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+                    max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", "10")),
+                    keepalive_expiry=60
+                ),
+                timeout=httpx.Timeout(self.llm_attempt_timeout, connect=5.0)
+            )
+        return self._http_client
+    
+    async def aclose(self):
+        """Close pooled HTTP connections"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self._openai_client is not None:
+            await self._openai_client.close()
+        self.sql_cache.save()
+    
     async def generate_sql_query(self, question: str, user_type: str, user_id: str) -> Optional[str]:
-        """Generate SQL query from natural language question"""
+        """Generate SQL query from natural language question
+        
+        The SQL is parameterized; use prepare_query to get the matching parameters.
+        """
+        prepared = await self.prepare_query(question, user_type, user_id)
+        return prepared[0] if prepared else None
+    
+    async def prepare_query(self, question: str, user_type: str, user_id: str,
+                            intent: Optional[IntentMatch] = None) -> Optional[Tuple[str, List[Any]]]:
+        """Resolve a question to executable SQL plus its bound parameters"""
+        template = await self._resolve_template(question, user_type, user_id, intent)
+        if template is None:
+            return None
+        return template.prepared_sql, template.bind(question, user_id, slots=intent.slots if intent else None)
+    
+    async def _resolve_template(self, question: str, user_type: str, user_id: str,
+                                intent: Optional[IntentMatch] = None) -> Optional[SQLTemplate]:
+        """Find or generate the SQL template that answers a question"""
         
         if not self.api_key:
             log.error("No API key configured")
             return None
         
-        # Check for cached queries first (instant response)
-        cached_query = self._get_cached_query(question, user_type)
+        # Check for cached queries first (instant response), then a template previously
+        # generated for this question or a paraphrase of it
+        with span("cache_lookup"):
+            cached_query = self._get_cached_query(question, user_type, intent)
+            entry = None if cached_query else self.sql_cache.lookup(question, user_type)
         if cached_query:
             log.info(f"Using cached query for: {question[:50]}...")
-            return cached_query
+            return self._canned_template(cached_query)
+        
+        if entry:
+            log.info(f"Using learned query for: {question[:50]}...")
+            if "template" in entry:
+                return SQLTemplate.from_dict(entry["template"])
+            return build_template(entry["sql"], entry["question"])
         
-        # Generate using AI service
+        # Generate using AI service - identical questions arriving together share one LLM call
+        key = (user_type, normalize_question(question) or question.lower().strip())
+        template, owner = await self.generation_flight.run(key, self._generate_template, question, user_type, user_id)
+        if owner is not None and owner != user_id:
+            # The shared SQL was specific to whoever generated it
+            template, _ = await self._generate_template(question, user_type, user_id)
+        return template
+    
+    async def _generate_template(self, question: str, user_type: str,
+                                 user_id: str) -> Tuple[Optional[SQLTemplate], Optional[str]]:
+        """Generate a template with the LLM
+        
+        Returns the template and, when its SQL only fits this user, their id.
+        """
         try:
             prompt = self._build_sql_prompt(question, user_type, user_id)
             
-            if self.is_openrouter:
-                return await self._generate_with_openrouter(prompt)
-            else:
-                return await self._generate_with_openai(prompt)
+            with span("llm"):
+                if self.is_openrouter:
+                    sql = await self._generate_with_openrouter(prompt)
+                else:
+                    sql = await self._generate_with_openai(prompt)
+            
+            if not sql:
+                return None, None
+            
+            # One template serves every user (and every period, when the period is a slot)
+            template = build_template(sql, question, user_id)
+            if not is_cacheable_sql(template.sql, user_id):
+                return template, user_id
+            self.sql_cache.put(
+                question,
+                user_type,
+                template.sql,
+                template=template.to_dict(),
+                period_agnostic=template.is_periodic,
+                limit_agnostic=template.has_limit
+            )
+            return template, None
                 
         except Exception as e:
             log.error(f"SQL generation failed: {e}")
-            return None
+            return None, None
+    
+    def _canned_template(self, sql: str) -> SQLTemplate:
+        template = self._canned_templates.get(sql)
+        if template is None:
+            template = build_template(sql, "")
+            self._canned_templates[sql] = template
+        return template
+    
+    def forget_sql(self, question: str, user_type: str, sql: str):
+        """Drop learned SQL that failed to execute so it is regenerated next time"""
+        if any(sql == template.prepared_sql for template in self._canned_templates.values()):
+            return
+        self.sql_cache.discard(question, user_type)
     
     def _build_sql_prompt(self, question: str, user_type: str, user_id: str) -> str:
         """Build the SQL generation prompt"""
@@ -117,13 +347,6 @@ SQL Query:"""
     async def _generate_with_openrouter(self, prompt: str) -> Optional[str]:
         """Generate SQL using OpenRouter API"""
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://equity-usa.net",
-            "X-Title": "Jen AI Assistant"
-        }
-        
         data = {
             "model": self.model,
             "messages": [{"role": "user", "content": prompt}],
@@ -134,15 +357,21 @@ SQL Query:"""
             "presence_penalty": 0
         }
         
-        # Retry logic for reliability
-        max_retries = 3
-        for attempt in range(max_retries):
+        client = self._get_http_client()
+        deadline = time.monotonic() + self.llm_deadline
+        
+        # Retry with jittered backoff, all attempts sharing one deadline budget
+        for attempt in range(self.llm_max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            retry_after = None
             try:
-                response = requests.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
+                response = await client.post(
+                    "/chat/completions",
                     json=data,
-                    timeout=30
+                    timeout=min(self.llm_attempt_timeout, remaining)
                 )
                 
                 if response.status_code == 200:
@@ -151,36 +380,56 @@ SQL Query:"""
                     sql = self._clean_sql(sql)
                     log.info(f"Generated SQL via OpenRouter: {sql[:100]}...")
                     return sql
-                else:
-                    log.error(f"OpenRouter API error: {response.status_code} - {response.text[:200]}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                        continue
+                
+                log.error(f"OpenRouter API error: {response.status_code} - {response.text[:200]}")
+                # Client errors other than rate limiting will not succeed on retry
+                if response.status_code < 500 and response.status_code != 429:
                     return None
+                retry_after = response.headers.get("Retry-After")
                     
             except Exception as e:
-                if attempt < max_retries - 1:
-                    log.warning(f"OpenRouter attempt {attempt + 1} failed, retrying: {e}")
-                    time.sleep(2)
-                    continue
-                else:
-                    log.error(f"OpenRouter failed after {max_retries} attempts: {e}")
-                    return None
+                log.warning(f"OpenRouter attempt {attempt + 1} failed: {e}")
+            
+            if attempt < self.llm_max_retries - 1:
+                delay = self._backoff_delay(attempt, retry_after)
+                if time.monotonic() + delay >= deadline:
+                    break
+                await asyncio.sleep(delay)
         
+        log.error(f"OpenRouter failed within {self.llm_deadline}s budget")
         return None
     
+    @staticmethod
+    def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header"""
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(8.0, 0.5 * (2 ** attempt)))
+    
     async def _generate_with_openai(self, prompt: str) -> Optional[str]:
         """Generate SQL using direct OpenAI API"""
+        if self._openai_client is None:
+            log.error("OpenAI client not configured")
+            return None
+        
+        # Created lazily so it binds to the running event loop
+        if self._openai_semaphore is None:
+            self._openai_semaphore = asyncio.Semaphore(self.openai_max_concurrency)
+        
         try:
-            import openai
-            client = openai.OpenAI(api_key=self.api_key)
-            
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=800
-            )
+            async with self._openai_semaphore:
+                response = await asyncio.wait_for(
+                    self._openai_client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0.1,
+                        max_tokens=800
+                    ),
+                    self.llm_deadline
+                )
             
             sql = response.choices[0].message.content.strip()
             sql = self._clean_sql(sql)
@@ -208,122 +457,49 @@ SQL Query:"""
             
         return sql
     
-    def _get_cached_query(self, question: str, user_type: str) -> Optional[str]:
+    def classify(self, question: str, user_type: str) -> IntentMatch:
+        """Classify a question once so SQL selection and response formatting share the result"""
+        return intent_matcher.classify(question, user_type)
+    
+    def _get_cached_query(self, question: str, user_type: str, intent: Optional[IntentMatch] = None) -> Optional[str]:
         """Get cached SQL query for common questions (instant response)"""
         
-        q = question.lower().strip()
-        
-        # Income queries
-        if any(word in q for word in ["total income", "how much money", "total commission", "income this year"]):
-            return """
-            SELECT SUM(NET_COMMISSION) as total_income
-            FROM payroll_Queue_Archive 
-            WHERE USER_ID = %s 
-              AND YEAR(Wire_Date) = YEAR(GETDATE())
-              AND (BuyerID > 0 OR ListingID > 0);
-            """
-        
-        # Deal count queries
-        if any(phrase in q for phrase in ["how many deals", "deal count", "number of deals"]):
-            return """
-            SELECT COUNT(*) as deal_count
-            FROM payroll_Queue_Archive 
-            WHERE USER_ID = %s 
-              AND YEAR(Wire_Date) = YEAR(GETDATE())
-              AND (BuyerID > 0 OR ListingID > 0);
-            """
-        
-        # Worst month query
-        if "worst month" in q:
-            return """
-            SELECT TOP 1 
-                DATENAME(month, Wire_Date) + ' ' + CAST(YEAR(Wire_Date) as varchar) as month,
-                SUM(NET_COMMISSION) as total 
-            FROM payroll_Queue_Archive 
-            WHERE USER_ID = %s 
-              AND YEAR(Wire_Date) = YEAR(GETDATE())
-              AND (BuyerID > 0 OR ListingID > 0)
-            GROUP BY DATENAME(month, Wire_Date), YEAR(Wire_Date) 
-            HAVING SUM(NET_COMMISSION) > 0
-            ORDER BY total ASC;
-            """
-        
-        # Best month query
-        if "best month" in q:
-            return """
-            SELECT TOP 1 
-                DATENAME(month, Wire_Date) + ' ' + CAST(YEAR(Wire_Date) as varchar) as month,
-                SUM(NET_COMMISSION) as total 
-            FROM payroll_Queue_Archive 
-            WHERE USER_ID = %s 
-              AND YEAR(Wire_Date) = YEAR(GETDATE())
-              AND (BuyerID > 0 OR ListingID > 0)
-            GROUP BY DATENAME(month, Wire_Date), YEAR(Wire_Date) 
-            HAVING SUM(NET_COMMISSION) > 0
-            ORDER BY total DESC;
-            """
-        
-        # Average deal size
-        if "average deal" in q or "average sale" in q:
-            return """
-            SELECT AVG(SalesPrice) as average_deal_size
-            FROM payroll_Queue_Archive 
-            WHERE USER_ID = %s 
-              AND YEAR(Wire_Date) = YEAR(GETDATE())
-              AND (BuyerID > 0 OR ListingID > 0)
-              AND SalesPrice > 0;
-            """
-        
-        # Broker and Managing Broker queries
-        if user_type in ["broker", "managingbroker"]:
-            if "how many agents" in q:
-                return """
-                SELECT COUNT(DISTINCT u.USER_ID) as agent_count
-                FROM TBL_USER_CREATE u
-                INNER JOIN TBL_FEES_MASTER f ON u.FEE_ID = f.FEE_ID
-                WHERE f.EQUITY_DIVISION_25_ID = %s
-                  AND u.USTATUS = 1
-                  AND u.STATUS_ID NOT IN (2, 11)
-                  AND u.UTYPE_ID = 14;
-                """
-            if "total income" in q or "how much" in q:
-                return """
-                SELECT SUM(NET_COMMISSION) as total_income
-                FROM payroll_Queue_Archive 
-                WHERE EQUITY_DIVISION_25_ID = %s
-                  AND YEAR(Wire_Date) = YEAR(GETDATE())
-                  AND (BuyerID > 0 OR ListingID > 0);
-                """
-        
-        # Admin queries - can see system-wide statistics
-        if user_type == "admin":
-            if "total income" in q or "system" in q:
-                return """
-                SELECT SUM(NET_COMMISSION) as total_income
-                FROM payroll_Queue_Archive 
-                WHERE YEAR(Wire_Date) = YEAR(GETDATE())
-                  AND (BuyerID > 0 OR ListingID > 0);
-                """
-            if "how many agents" in q or "agent count" in q:
-                return """
-                SELECT COUNT(DISTINCT USER_ID) as agent_count
-                FROM TBL_USER_CREATE
-                WHERE USTATUS = 1 
-                  AND UTYPE_ID = 14;
-                """
-        
-        return None  # No cached query found
+        if intent is None:
+            intent = self.classify(question, user_type)
+        key = self.canned_query_key(intent)
+        if key is None:
+            return None
+        # Canned payroll SQL is year-to-date; other periods need a template with a period slot
+        if key[0] not in PERIODLESS_INTENTS and intent.slots.get("period") not in (None, "this_year"):
+            return None
+        return CANNED_QUERIES[key]
     
-    def generate_response(self, question: str, data: List[Dict[str, Any]], user_name: str, user_type: str) -> str:
-        """Generate natural language response from query results"""
+    def canned_query_key(self, intent: IntentMatch) -> Optional[Tuple[str, str]]:
+        """The (intent, scope) entry of CANNED_QUERIES that answers this intent, if any"""
+        if intent.intent is None:
+            return None  # No cached query found
+        for key in ((intent.intent, intent.scope), (intent.intent, "user")):
+            if key in CANNED_QUERIES:
+                return key
+        return None
+    
+    @timed("format")
+    def generate_response(self, question: str, data: QueryData, user_name: str, user_type: str,
+                          intent: Optional[IntentMatch] = None) -> str:
+        """Generate natural language response from query results
+        
+        data may be row dicts or a ColumnarResult; only the first few rows are
+        ever looked at, so a columnar result is never converted wholesale.
+        """
         
         if not data:
             return f"I couldn't find any data for your question. You might want to try asking about a different time period or check if you have any transactions recorded."
         
-        question_lower = question.lower()
+        if intent is None:
+            intent = self.classify(question, user_type)
         
         # Handle income/money questions
-        if any(word in question_lower for word in ["income", "money", "commission", "earned", "made"]):
+        if intent.has("income_word"):
             if len(data) == 1:
                 value = None
                 for key, val in data[0].items():
@@ -338,7 +514,7 @@ SQL Query:"""
                         return f"Hi {user_name.split()[0]}! Your total income this year is ${value:,.2f}. Great work!"
         
         # Handle count questions  
-        if "how many" in question_lower or "count" in question_lower:
+        if intent.has("count_word"):
             if len(data) == 1:
                 value = None
                 for key, val in data[0].items():
@@ -347,18 +523,18 @@ SQL Query:"""
                         break
                 
                 if value is not None and isinstance(value, int):
-                    if "deal" in question_lower:
+                    if intent.has("deal"):
                         if value == 0:
                             return f"Hi {user_name.split()[0]}! You haven't closed any deals this year yet. Keep pushing!"
                         else:
                             return f"Hi {user_name.split()[0]}! You've closed {value:,} deal{'s' if value != 1 else ''} this year. Excellent work!"
-                    elif "agent" in question_lower and user_type in ["broker", "managingbroker"]:
+                    elif intent.has("agent") and user_type in ["broker", "managingbroker"]:
                         return f"Hi {user_name.split()[0]}! You have {value:,} active agent{'s' if value != 1 else ''} in your team."
-                    elif "agent" in question_lower and user_type == "admin":
+                    elif intent.has("agent") and user_type == "admin":
                         return f"Hi {user_name.split()[0]}! There are {value:,} active agent{'s' if value != 1 else ''} in the system."
         
         # Handle "who" questions
-        if "who" in question_lower and len(data) > 0:
+        if intent.has("who") and len(data) > 0:
             first_row = data[0]
             
             # Look for name fields
@@ -372,7 +548,7 @@ SQL Query:"""
                     break
             
             if name:
-                if "top" in question_lower and len(data) > 1:
+                if intent.has("top") and len(data) > 1:
                     names = []
                     for row in data[:5]:  # Top 5
                         if 'agent_name' in row:
@@ -384,19 +560,19 @@ SQL Query:"""
                     return f"Hi {user_name.split()[0]}! The answer is {name}."
         
         # Handle month queries
-        if "month" in question_lower and len(data) == 1:
+        if intent.has("month") and len(data) == 1:
             first_row = data[0]
             if "month" in first_row:
                 month = first_row["month"]
                 for key, val in first_row.items():
                     if key != "month" and isinstance(val, (int, float)):
-                        if "worst" in question_lower:
+                        if intent.has("worst"):
                             return f"Hi {user_name.split()[0]}! Your lowest month was {month} with ${val:,.2f} in commissions."
-                        elif "best" in question_lower:
+                        elif intent.has("best"):
                             return f"Hi {user_name.split()[0]}! Your best month was {month} with ${val:,.2f} in commissions. Outstanding!"
         
         # Handle average queries
-        if "average" in question_lower and len(data) == 1:
+        if intent.has("average") and len(data) == 1:
             first_row = data[0]
             for key, val in first_row.items():
                 if "average" in key.lower() and isinstance(val, (int, float)):
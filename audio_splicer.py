@@ -0,0 +1,300 @@
+"""
+Audio Splicer for Jen AI Assistant
+Assembles templated answers from pre-rendered carrier phrases and number fragments
+"""
+
+import io
+import re
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List, Set, Callable, Awaitable
+
+from pydub import AudioSegment
+from pydub.silence import detect_leading_silence
+from pydub.utils import which
+
+from single_flight import SingleFlight
+from metrics import timed
+
+log = logging.getLogger("jen.splicer")
+
+_ONES = (
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"
+)
+_TENS = ("", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety")
+_SCALES = ((10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand"))
+_MAX_NUMBER = 10 ** 12
+
+def _below_hundred(n: int) -> str:
+    if n < 20:
+        return _ONES[n]
+    tens, ones = divmod(n, 10)
+    return f"{_TENS[tens]} {_ONES[ones]}" if ones else _TENS[tens]
+
+def _below_thousand(n: int) -> List[str]:
+    hundreds, rest = divmod(n, 100)
+    parts = [f"{_ONES[hundreds]} hundred"] if hundreds else []
+    if rest:
+        parts.append(_below_hundred(rest))
+    return parts
+
+def number_fragments(n: int) -> Optional[List[str]]:
+    """Spoken fragments for 0 <= n < 10**12: 1234 -> ["one", "thousand", "two hundred", "thirty four"]
+    
+    Every fragment comes from NUMBER_VOCABULARY (117 clips, about 130 once
+    the templates' carrier phrases are added), so any number is spliced from
+    pre-rendered audio.
+    None when n is out of range.
+    """
+    if not 0 <= n < _MAX_NUMBER:
+        return None
+    if n == 0:
+        return ["zero"]
+    parts: List[str] = []
+    for scale, word in _SCALES:
+        group, n = divmod(n, scale)
+        if group:
+            parts.extend(_below_thousand(group))
+            parts.append(word)
+    parts.extend(_below_thousand(n))
+    return parts
+
+def money_fragments(amount: str) -> Optional[List[str]]:
+    """"$1,234.56" -> one thousand two hundred thirty four dollars and fifty six cents"""
+    dollars_text, _, cents_text = amount.lstrip("$").replace(",", "").partition(".")
+    dollars, cents = int(dollars_text), int(cents_text or 0)
+    parts = number_fragments(dollars)
+    if parts is None:
+        return None
+    parts.append("dollar" if dollars == 1 else "dollars")
+    if cents:
+        parts.extend(["and", _below_hundred(cents), "cent" if cents == 1 else "cents"])
+    return parts
+
+NUMBER_VOCABULARY = (
+    [_below_hundred(n) for n in range(100)]
+    + [f"{_ONES[n]} hundred" for n in range(1, 10)]
+    + [word for _, word in _SCALES]
+    + ["dollar", "dollars", "and", "cent", "cents"]
+)
+
+_SLOT = re.compile(r"\{(money|count|s)\}")
+_SLOT_PATTERNS = {
+    "money": r"(\$\d{1,3}(?:,\d{3})*(?:\.\d\d)?)",
+    "count": r"(\d{1,3}(?:,\d{3})*)",
+    "s": r"(s?)"
+}
+
+def _speakable(text: str) -> bool:
+    """Literal text worth a clip - a bare "." between slots isn't"""
+    return any(c.isalnum() for c in text)
+
+class SpliceTemplate:
+    """One answer sentence shape, e.g. "Your total income this year is {money}."
+    
+    {money} and {count} are spoken from number fragments; {s} is a plural
+    suffix folded into the surrounding carrier phrase, so both "deal" and
+    "deals" variants are carriers of their own.
+    """
+    
+    __slots__ = ("template", "pattern")
+    
+    def __init__(self, template: str):
+        self.template = template
+        pattern, position = "", 0
+        for slot in _SLOT.finditer(template):
+            pattern += re.escape(template[position:slot.start()]) + _SLOT_PATTERNS[slot.group(1)]
+            position = slot.end()
+        self.pattern = re.compile(f"^{pattern}{re.escape(template[position:])}$")
+    
+    def fragments(self, sentence: str) -> Optional[List[str]]:
+        """Carrier phrases and number fragments that speak sentence, in order, or None"""
+        match = self.pattern.match(sentence)
+        if match is None:
+            return None
+        values = iter(match.groups())
+        parts: List[str] = []
+        literal, position = "", 0
+        for slot in _SLOT.finditer(self.template):
+            literal += self.template[position:slot.start()]
+            position = slot.end()
+            value = next(values)
+            if slot.group(1) == "s":
+                literal += value
+                continue
+            if _speakable(literal):
+                parts.append(literal.strip())
+            literal = ""
+            spoken = money_fragments(value) if slot.group(1) == "money" else number_fragments(int(value.replace(",", "")))
+            if spoken is None:
+                return None
+            parts.extend(spoken)
+        literal += self.template[position:]
+        if _speakable(literal):
+            parts.append(literal.strip())
+        return parts
+    
+    def carriers(self) -> List[str]:
+        """Every fixed phrase this template can need, singular and plural"""
+        phrases = []
+        for suffix in ("", "s"):
+            text = self.template.replace("{s}", suffix)
+            for phrase in re.split(r"\{(?:money|count)\}", text):
+                if _speakable(phrase) and phrase.strip() not in phrases:
+                    phrases.append(phrase.strip())
+        return phrases
+
+# Sentence shapes produced by JenAI.generate_response (after split_sentences)
+TEMPLATES = (
+    SpliceTemplate("Your total income this year is {money}."),
+    SpliceTemplate("You've closed {count} deal{s} this year."),
+    SpliceTemplate("You have {count} active agent{s} in your team."),
+    SpliceTemplate("There are {count} active agent{s} in the system."),
+    SpliceTemplate("Your average deal size is {money}."),
+    SpliceTemplate("The result is {money}."),
+    SpliceTemplate("The result is {count}."),
+    SpliceTemplate("I found {count} result{s} for your question.")
+)
+
+class AudioSplicer:
+    """Speaks templated sentences by splicing cached fragment clips
+    
+    render(text) supplies a fragment's audio (the voice service's cached TTS,
+    so each fragment is synthesized once ever). Fragments are decoded and
+    silence-trimmed once, kept in memory, and joined with a short crossfade.
+    assemble() returns None - so callers fall back to live TTS - for
+    free-form text, while a needed fragment is still loading (it is loaded
+    in the background for next time) and when decoding is not possible
+    (MP3 needs ffmpeg).
+    """
+    
+    def __init__(self, render: Callable[[str], Awaitable[Optional[bytes]]], templates=TEMPLATES,
+                 crossfade_ms: int = 15, audio_format: str = "mp3", bitrate: str = "128k"):
+        self.render = render
+        self.templates = templates
+        self.crossfade_ms = crossfade_ms
+        self.audio_format = audio_format
+        self.bitrate = bitrate
+        self.enabled = audio_format == "wav" or which(AudioSegment.converter) is not None
+        if not self.enabled:
+            log.warning(f"Audio splicing disabled - {AudioSegment.converter} not found for {audio_format} decoding")
+        self._segments: Dict[str, AudioSegment] = {}
+        self._loading = SingleFlight("splice_fragments")
+        self._background: Set["asyncio.Task[Optional[AudioSegment]]"] = set()
+        self._stats = {"spliced": 0, "unmatched": 0, "cold": 0, "failed": 0}
+    
+    def plan(self, sentence: str) -> Optional[List[str]]:
+        """Fragments for a sentence matching one of the templates"""
+        if not self.enabled:
+            return None
+        for template in self.templates:
+            fragments = template.fragments(sentence)
+            if fragments is not None:
+                return fragments
+        return None
+    
+    @timed("tts_splice")
+    async def assemble(self, sentence: str) -> Optional[bytes]:
+        """Spliced audio for sentence, or None to use live TTS"""
+        fragments = self.plan(sentence)
+        if fragments is None:
+            self._stats["unmatched"] += 1
+            return None
+        
+        missing = [fragment for fragment in dict.fromkeys(fragments) if fragment not in self._segments]
+        if missing:
+            # Rendering several fragments now would be slower than one live call - load them for next time
+            self._stats["cold"] += 1
+            for fragment in missing:
+                self._load_in_background(fragment)
+            return None
+        
+        loop = asyncio.get_running_loop()
+        try:
+            audio = await loop.run_in_executor(None, self._splice, [self._segments[f] for f in fragments])
+        except Exception as e:
+            log.error(f"Audio splice failed for {sentence[:50]}: {e}")
+            self._stats["failed"] += 1
+            return None
+        self._stats["spliced"] += 1
+        return audio
+    
+    def _load_in_background(self, fragment: str):
+        """Start loading a fragment without waiting; its failure is logged, not lost"""
+        task = asyncio.ensure_future(self._segment(fragment))
+        self._background.add(task)
+        
+        def done(task: "asyncio.Task[Optional[AudioSegment]]"):
+            self._background.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                log.error(f"Could not load fragment {fragment!r}: {task.exception()}")
+        
+        task.add_done_callback(done)
+    
+    async def _segment(self, fragment: str) -> Optional[AudioSegment]:
+        segment = self._segments.get(fragment)
+        if segment is None:
+            segment = await self._loading.run(fragment, self._load, fragment)
+        return segment
+    
+    async def _load(self, fragment: str) -> Optional[AudioSegment]:
+        audio = await self.render(fragment)
+        if audio is None:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            segment = await loop.run_in_executor(None, self._decode, audio)
+        except Exception as e:
+            log.error(f"Could not decode fragment {fragment!r}: {e}")
+            return None
+        self._segments[fragment] = segment
+        return segment
+    
+    def _decode(self, audio: bytes) -> AudioSegment:
+        """Decode a clip and trim the silence TTS leaves at either end"""
+        segment = AudioSegment.from_file(io.BytesIO(audio), format=self.audio_format)
+        start = detect_leading_silence(segment)
+        end = len(segment) - detect_leading_silence(segment.reverse())
+        return segment[start:end] if end > start else segment
+    
+    def _splice(self, segments: List[AudioSegment]) -> bytes:
+        spliced = segments[0]
+        for segment in segments[1:]:
+            crossfade = min(self.crossfade_ms, len(spliced), len(segment))
+            spliced = spliced.append(segment, crossfade=crossfade)
+        buffer = io.BytesIO()
+        spliced.export(buffer, format=self.audio_format, bitrate=self.bitrate)
+        return buffer.getvalue()
+    
+    def vocabulary(self) -> List[str]:
+        """Every fragment any template can need"""
+        phrases: List[str] = []
+        for template in self.templates:
+            phrases.extend(template.carriers())
+        return list(dict.fromkeys(phrases + NUMBER_VOCABULARY))
+    
+    async def warm_up(self, parallelism: int = 3) -> int:
+        """Render and decode the whole vocabulary ahead of the first answer; returns how many are ready"""
+        if not self.enabled:
+            return 0
+        semaphore = asyncio.Semaphore(parallelism)
+        
+        async def load(fragment: str) -> bool:
+            async with semaphore:
+                return await self._segment(fragment) is not None
+        
+        fragments = self.vocabulary()
+        results = await asyncio.gather(*(load(fragment) for fragment in fragments), return_exceptions=True)
+        for fragment, result in zip(fragments, results):
+            if isinstance(result, Exception):
+                log.error(f"Could not load fragment {fragment!r}: {result}")
+        return sum(result is True for result in results)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "fragments_loaded": len(self._segments),
+            "vocabulary": len(self.vocabulary())
+        }
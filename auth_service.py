@@ -10,6 +10,7 @@ from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
 from database_service import db_service
+from metrics import timed
 
 load_dotenv()
 log = logging.getLogger("jen.auth")
@@ -35,6 +36,7 @@ class AuthService:
         """Verify API key is valid"""
         return api_key in self.api_keys
     
+    @timed("identify")
     async def identify_user(self, caller_id: Optional[str] = None, transcript: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Identify user from caller ID or speech transcript"""
         
@@ -88,6 +90,9 @@ class AuthService:
             r"i'm ([a-zA-Z\s]+)",
         ]
         
+        # Several patterns often capture the same name - look each distinct one up once
+        names = []
+        
         for pattern in name_patterns:
             match = re.search(pattern, text)
             if match:
@@ -95,10 +100,8 @@ class AuthService:
                 # Remove common words that might be picked up
                 name = re.sub(r'\b(calling|speaking|here)\b', '', name).strip()
                 
-                if len(name.split()) >= 2:  # At least first and last name
-                    user_info = await db_service.find_user_by_name(name)
-                    if user_info:
-                        return user_info
+                if len(name.split()) >= 2 and name not in names:  # At least first and last name
+                    names.append(name)
         
         # Look for common greetings with names
         greeting_patterns = [
@@ -114,10 +117,13 @@ class AuthService:
                 # Clean up the name
                 name = re.sub(r'\b(jen|calling|speaking|here|and)\b', '', name).strip()
                 
-                if len(name.split()) >= 2 and len(name) > 3:
-                    user_info = await db_service.find_user_by_name(name)
-                    if user_info:
-                        return user_info
+                if len(name.split()) >= 2 and len(name) > 3 and name not in names:
+                    names.append(name)
+        
+        for name in names:
+            user_info = await db_service.find_user_by_name(name)
+            if user_info:
+                return user_info
         
         return None
     
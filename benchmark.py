@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Jen AI Assistant - Micro-benchmarks
+Measures hot-path costs that run on every question, without a database or LLM
+
+Usage: python benchmark.py [intents] [names] [json]
+"""
+
+import os
+import sys
+import timeit
+from typing import Dict, Any, List, Callable
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_QUESTIONS = [
+    "What is my total income this year?",
+    "How many deals did I close this year?",
+    "What was my worst month?",
+    "What was my best month this year?",
+    "What is my average deal size?",
+    "How many agents are in my team?",
+    "How much did my team make this year?",
+    "Who are my top 5 agents by commission?",
+    "Show me system statistics",
+    "What did I earn so far in 2026 compared to last year?"
+]
+
+def legacy_classify(question: str, user_type: str) -> Dict[str, Any]:
+    """The substring scans _get_cached_query and generate_response used to run per question"""
+    q = question.lower().strip()
+    intent = None
+    if any(word in q for word in ["total income", "how much money", "total commission", "income this year"]):
+        intent = "total_income"
+    elif any(phrase in q for phrase in ["how many deals", "deal count", "number of deals"]):
+        intent = "deal_count"
+    elif "worst month" in q:
+        intent = "worst_month"
+    elif "best month" in q:
+        intent = "best_month"
+    elif "average deal" in q or "average sale" in q:
+        intent = "average_deal_size"
+    elif user_type in ["broker", "managingbroker"] and "how many agents" in q:
+        intent = "agent_count"
+    elif user_type in ["broker", "managingbroker"] and ("total income" in q or "how much" in q):
+        intent = "total_income"
+    elif user_type == "admin" and ("total income" in q or "system" in q):
+        intent = "total_income"
+    elif user_type == "admin" and ("how many agents" in q or "agent count" in q):
+        intent = "agent_count"
+    
+    # generate_response lowercased the question again and repeated its own checks
+    question_lower = question.lower()
+    cues = [
+        any(word in question_lower for word in ["income", "money", "commission", "earned", "made"]),
+        "how many" in question_lower or "count" in question_lower,
+        "deal" in question_lower,
+        "agent" in question_lower,
+        "who" in question_lower,
+        "top" in question_lower,
+        "month" in question_lower,
+        "worst" in question_lower,
+        "best" in question_lower,
+        "average" in question_lower
+    ]
+    return {"intent": intent, "cues": cues}
+
+def _per_call_us(func: Callable[[], Any], number: int) -> float:
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1e6
+
+def benchmark_intents(number: int = 20000) -> List[Dict[str, Any]]:
+    """Per-question classification cost: compiled matcher vs. legacy substring scans"""
+    from intents import intent_matcher
+    
+    rows = []
+    for question in SAMPLE_QUESTIONS:
+        legacy = _per_call_us(lambda: legacy_classify(question, "broker"), number)
+        cold = _per_call_us(lambda: intent_matcher.classify_uncached(question, "broker"), number)
+        warm = _per_call_us(lambda: intent_matcher.classify(question, "broker"), number)
+        rows.append({
+            "question": question,
+            "legacy_us": legacy,
+            "cold_us": cold,
+            "warm_us": warm
+        })
+    
+    print(f"{'question':<58} {'legacy':>9} {'cold':>9} {'warm':>9}")
+    for row in rows:
+        print(f"{row['question'][:57]:<58} {row['legacy_us']:>8.2f}u {row['cold_us']:>8.2f}u {row['warm_us']:>8.2f}u")
+    avg = lambda key: sum(r[key] for r in rows) / len(rows)
+    print(f"{'average':<58} {avg('legacy_us'):>8.2f}u {avg('cold_us'):>8.2f}u {avg('warm_us'):>8.2f}u")
+    print("cold = first sighting of a question, including period/top-N slot extraction the legacy code never did;")
+    print("       it still costs more than the bare legacy scans - the saving is the memo and classifying once per request")
+    print("warm = repeat question served from the matcher's memo")
+    return rows
+
+SPOKEN_NAMES = ["genesis lopez", "jenesis lopes", "catherine smyth", "stephen garsia", "nobody known"]
+
+def benchmark_names(users: int = 10000, number: int = 2000) -> List[Dict[str, Any]]:
+    """Spoken-name lookup against a synthetic directory of active users"""
+    import random
+    import string
+    from name_index import NameIndex
+    
+    rng = random.Random(7)
+    word = lambda length: "".join(rng.choices(string.ascii_lowercase, k=length)).title()
+    first_names = ["Genesis", "Katherine", "Steven", "Maria", "John"] + [word(6) for _ in range(1500)]
+    last_names = ["Lopez", "Smith", "Garcia", "Nguyen", "Lee"] + [word(7) for _ in range(5000)]
+    directory = [
+        {"USER_ID": i, "F_NAME": rng.choice(first_names), "L_NAME": rng.choice(last_names)}
+        for i in range(users)
+    ]
+    directory += [
+        {"USER_ID": users, "F_NAME": "Genesis", "L_NAME": "Lopez"},
+        {"USER_ID": users + 1, "F_NAME": "Katherine", "L_NAME": "Smith"},
+        {"USER_ID": users + 2, "F_NAME": "Steven", "L_NAME": "Garcia"}
+    ]
+    index = NameIndex()
+    index.load(directory)
+    
+    rows = []
+    print(f"{'spoken name':<24} {'search':>9}  best match")
+    for name in SPOKEN_NAMES:
+        elapsed = _per_call_us(lambda: index.search(name), number)
+        matches = index.search(name, limit=1)
+        best = f"{matches[0][1]['F_NAME']} {matches[0][1]['L_NAME']} ({matches[0][0]})" if matches else "-"
+        rows.append({"name": name, "search_us": elapsed, "best": best})
+        print(f"{name:<24} {elapsed:>8.1f}u  {best}")
+    return rows
+
+def _report_rows(count: int) -> List[Dict[str, Any]]:
+    """Rows shaped like a broker/admin report from execute_query"""
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    
+    start = datetime(2026, 1, 2, 9, 30)
+    return [
+        {
+            "USER_ID": 10000 + i,
+            "agent_name": f"Agent Number{i}",
+            "deal_count": i % 17,
+            "total_commission": Decimal(f"{1234.5 + i * 10.25:.2f}"),
+            "average_deal_size": 412345.67 + i,
+            "last_wire_date": start + timedelta(days=i % 300)
+        }
+        for i in range(count)
+    ]
+
+def benchmark_json(number: int = 200) -> List[Dict[str, Any]]:
+    """Encode time for query responses: stdlib json vs. the shared orjson serializer"""
+    import json
+    from columnar_result import ColumnarResult
+    from serialization import dumps
+    
+    try:
+        from fastapi.encoders import jsonable_encoder
+    except ImportError:
+        jsonable_encoder = None
+    
+    def payload(rows):
+        return {"success": True, "response": "Hi Pat! I found results.", "data": rows, "user": {"name": "Pat Lee"}}
+    
+    cases = [(f"{count} rows", payload(_report_rows(count))) for count in (1, 50, 2000)]
+    cases.append(("2000 rows columnar", payload(ColumnarResult.from_rows(_report_rows(2000)))))
+    
+    rows = []
+    print(f"{'payload':<20} {'json':>10} {'fastapi':>10} {'orjson':>10} {'bytes':>9}")
+    for label, content in cases:
+        runs = max(1, number // max(1, len(content["data"]) // 50))
+        # The stdlib path needs Decimal/datetime/ColumnarResult turned into JSON types first
+        stdlib = _per_call_us(lambda: json.dumps(content, default=_stdlib_default), runs)
+        encoder = _per_call_us(lambda: json.dumps(jsonable_encoder(content)), runs) if jsonable_encoder else None
+        fast = _per_call_us(lambda: dumps(content), runs)
+        size = len(dumps(content))
+        rows.append({"payload": label, "json_us": stdlib, "fastapi_us": encoder, "orjson_us": fast, "bytes": size})
+        fastapi_cell = f"{encoder:>9.1f}u" if encoder is not None else f"{'-':>10}"
+        print(f"{label:<20} {stdlib:>9.1f}u {fastapi_cell} {fast:>9.1f}u {size:>9}")
+    print("fastapi = jsonable_encoder + json.dumps, what endpoints returning plain dicts used to pay")
+    return rows
+
+def _stdlib_default(value: Any) -> Any:
+    from datetime import date
+    from decimal import Decimal
+    from columnar_result import ColumnarResult
+    
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, ColumnarResult):
+        return value.to_dict()
+    raise TypeError(type(value).__name__)
+
+BENCHMARKS = {
+    "intents": benchmark_intents,
+    "names": benchmark_names,
+    "json": benchmark_json
+}
+
+def main():
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        print(f"\n== {name} ==")
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Broadcast Hub for Jen AI Assistant
+Fans dashboard events out to WebSocket clients without making callers wait on them
+"""
+
+import time
+import asyncio
+import logging
+import itertools
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Hashable, Union, Iterable
+
+from serialization import dumps_text
+
+log = logging.getLogger("jen.broadcast")
+
+# Pending-queue key for the notice that replaces messages dropped for a slow client
+_DROPPED = ("dropped",)
+
+class Subscription:
+    """Which events a client wants - each given field narrows the stream
+    
+    types limits event types; teams and users together limit whose events
+    arrive: a match on either the event's user or the user's broker team
+    (EQUITY_DIVISION_25_ID) is enough. A broker's own events count as their
+    team's.
+    """
+    
+    __slots__ = ("types", "teams", "users")
+    
+    def __init__(self, types: Optional[Iterable[Any]] = None, teams: Optional[Iterable[Any]] = None,
+                 users: Optional[Iterable[Any]] = None):
+        self.types = {str(t) for t in types} if types else None
+        self.teams = {str(t) for t in teams} if teams else None
+        self.users = {str(u) for u in users} if users else None
+    
+    @classmethod
+    def from_message(cls, message: Dict[str, Any]) -> "Subscription":
+        """Parse {"types": [...], "teams": [...], "users": [...]} (single values allowed too)"""
+        def values(name: str) -> Optional[List[Any]]:
+            value = message.get(name)
+            if value is None or isinstance(value, list):
+                return value
+            return [value]
+        return cls(values("types"), values("teams"), values("users"))
+    
+    def matches(self, topics: Dict[str, Optional[str]]) -> bool:
+        if self.types is not None and topics.get("type") not in self.types:
+            return False
+        if self.teams is None and self.users is None:
+            return True
+        user_id = topics.get("user_id")
+        if self.users is not None and user_id in self.users:
+            return True
+        if self.teams is not None and (topics.get("team_id") in self.teams or user_id in self.teams):
+            return True
+        return False
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "types": sorted(self.types) if self.types is not None else None,
+            "teams": sorted(self.teams) if self.teams is not None else None,
+            "users": sorted(self.users) if self.users is not None else None
+        }
+
+class Subscriber:
+    """One connected WebSocket: its bounded send queue, writer task and subscription"""
+    
+    __slots__ = ("websocket", "pending", "ready", "task", "subscription", "sent", "dropped", "unreported_drops", "connected_at")
+    
+    def __init__(self, websocket):
+        self.websocket = websocket
+        # None means every event
+        self.subscription: Optional[Subscription] = None
+        # key -> encoded message, oldest first; coalesced messages keep their place in line
+        self.pending: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.unreported_drops = 0
+        self.connected_at = time.time()
+
+class BroadcastHub:
+    """Per-connection bounded queues, each drained by its own writer task
+    
+    publish() only encodes the message once and queues it, so it never waits
+    on a socket. When a client's queue is full its oldest message is dropped
+    and the drops are coalesced into a single {"type": "dropped", "count": n}
+    notice at the front of the queue. Messages published with the same
+    coalesce_key replace one another while still queued. A client whose send
+    takes longer than send_timeout is disconnected.
+    
+    Clients with a Subscription only get events whose topics match it; an
+    event nobody wants is never encoded.
+    """
+    
+    def __init__(self, queue_size: int = 100, send_timeout: float = 5.0):
+        self.queue_size = max(1, queue_size)
+        self.send_timeout = send_timeout
+        self._subscribers: Dict[int, Subscriber] = {}
+        self._sequence = itertools.count()
+        self._stats = {"published": 0, "queued": 0, "coalesced": 0, "dropped": 0, "sent": 0, "filtered": 0, "disconnected_slow": 0}
+    
+    def connect(self, websocket) -> Subscriber:
+        """Register an accepted WebSocket and start its writer (call from within the event loop)"""
+        subscriber = Subscriber(websocket)
+        subscriber.task = asyncio.ensure_future(self._writer(subscriber))
+        self._subscribers[id(websocket)] = subscriber
+        return subscriber
+    
+    def disconnect(self, subscriber: Subscriber):
+        if self._subscribers.get(id(subscriber.websocket)) is subscriber:
+            del self._subscribers[id(subscriber.websocket)]
+        if subscriber.task is not None and subscriber.task is not asyncio.current_task():
+            subscriber.task.cancel()
+        subscriber.pending.clear()
+    
+    def subscribe(self, subscriber: Subscriber, subscription: Optional[Subscription]):
+        """Replace a client's subscription (None to receive every event again)"""
+        subscriber.subscription = subscription
+    
+    def publish(self, message: Dict[str, Any], topics: Optional[Dict[str, Any]] = None,
+                coalesce_key: Optional[Hashable] = None) -> int:
+        """Queue a message for every interested client; returns how many it was queued for
+        
+        topics describe the event for subscription filtering: "type",
+        "user_id" and "team_id" (the user's EQUITY_DIVISION_25_ID).
+        """
+        self._stats["published"] += 1
+        if not self._subscribers:
+            return 0
+        topics = {key: str(value) for key, value in (topics or {}).items() if value is not None}
+        text = None
+        queued = 0
+        for subscriber in list(self._subscribers.values()):
+            if subscriber.subscription is not None and not subscriber.subscription.matches(topics):
+                self._stats["filtered"] += 1
+                continue
+            if text is None:
+                text = dumps_text(message)
+            self._enqueue(subscriber, text, coalesce_key)
+            queued += 1
+        return queued
+    
+    def send(self, subscriber: Subscriber, message: Union[Dict[str, Any], str]):
+        """Queue a message (or raw text) for one client - replies go through its writer too"""
+        self._enqueue(subscriber, message if isinstance(message, str) else dumps_text(message), None)
+    
+    def _enqueue(self, subscriber: Subscriber, text: str, coalesce_key: Optional[Hashable]):
+        pending = subscriber.pending
+        key = ("key", coalesce_key) if coalesce_key is not None else ("seq", next(self._sequence))
+        if key in pending:
+            pending[key] = text
+            self._stats["coalesced"] += 1
+            return
+        
+        queued = len(pending) - (1 if _DROPPED in pending else 0)
+        if queued >= self.queue_size:
+            for oldest in pending:
+                if oldest != _DROPPED:
+                    del pending[oldest]
+                    break
+            subscriber.dropped += 1
+            subscriber.unreported_drops += 1
+            self._stats["dropped"] += 1
+            pending[_DROPPED] = ""
+            pending.move_to_end(_DROPPED, last=False)
+        
+        pending[key] = text
+        self._stats["queued"] += 1
+        subscriber.ready.set()
+    
+    async def _writer(self, subscriber: Subscriber):
+        try:
+            while True:
+                while not subscriber.pending:
+                    subscriber.ready.clear()
+                    await subscriber.ready.wait()
+                key, text = subscriber.pending.popitem(last=False)
+                if key == _DROPPED:
+                    text = dumps_text({"type": "dropped", "count": subscriber.unreported_drops})
+                    subscriber.unreported_drops = 0
+                await asyncio.wait_for(subscriber.websocket.send_text(text), self.send_timeout)
+                subscriber.sent += 1
+                self._stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._stats["disconnected_slow"] += 1
+            log.warning(f"WebSocket client too slow (send exceeded {self.send_timeout}s) - disconnecting")
+            self.disconnect(subscriber)
+            await self._close_quietly(subscriber.websocket)
+        except Exception as e:
+            log.info(f"WebSocket send failed - dropping client: {e}")
+            self.disconnect(subscriber)
+    
+    @staticmethod
+    async def _close_quietly(websocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), 1.0)
+        except Exception:
+            pass
+    
+    def close(self):
+        for subscriber in list(self._subscribers.values()):
+            self.disconnect(subscriber)
+    
+    @property
+    def connections(self) -> int:
+        return len(self._subscribers)
+    
+    def stats(self) -> Dict[str, Any]:
+        backlog: List[int] = [len(s.pending) for s in self._subscribers.values()]
+        return {
+            **self._stats,
+            "connections": len(backlog),
+            "subscribed": sum(1 for s in self._subscribers.values() if s.subscription is not None),
+            "queue_size": self.queue_size,
+            "max_backlog": max(backlog) if backlog else 0
+        }
@@ -0,0 +1,192 @@
+"""
+Columnar Result for Jen AI Assistant
+Query results stored column by column - compact to send, cheap to build from cursor rows
+"""
+
+import sys
+import json
+import struct
+import logging
+from array import array
+from typing import Dict, Any, Optional, List, Iterator, Union
+
+log = logging.getLogger("jen.columnar")
+
+# Media type for the binary encoding produced by ColumnarResult.to_bytes()
+BINARY_MEDIA_TYPE = "application/vnd.jen.columnar"
+
+_MAGIC = b"JENC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBI")
+
+# Column types that pack into fixed-width arrays when the column has no NULLs
+_PACKED = {"int": "q", "float": "d"}
+
+def column_type(values: List[Any]) -> str:
+    """"int", "float", "str", "bool", "null" or "mixed" - NULLs don't affect the type"""
+    found = None
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kind = "bool"
+        elif isinstance(value, int):
+            kind = "int"
+        elif isinstance(value, float):
+            kind = "float"
+        elif isinstance(value, str):
+            kind = "str"
+        else:
+            return "mixed"
+        if found is None:
+            found = kind
+        elif found != kind:
+            if {found, kind} == {"int", "float"}:
+                found = "float"
+            else:
+                return "mixed"
+    return found or "null"
+
+class ColumnarResult:
+    """Column names once plus one list of values per column
+    
+    Behaves like a read-only list of row dicts for the code that formats
+    answers - len(), indexing, slicing and iteration build only the rows
+    actually touched - so generate_response can take one directly.
+    """
+    
+    __slots__ = ("columns", "values", "row_count", "_types")
+    
+    def __init__(self, columns: List[str], values: List[List[Any]], row_count: Optional[int] = None):
+        if len(columns) != len(values):
+            raise ValueError(f"{len(columns)} columns but {len(values)} value lists")
+        self.columns = columns
+        self.values = values
+        self.row_count = row_count if row_count is not None else (len(values[0]) if values else 0)
+        self._types: Optional[List[str]] = None
+    
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "ColumnarResult":
+        """Transpose row dicts (all with the first row's keys)"""
+        if not rows:
+            return cls([], [], 0)
+        columns = list(rows[0])
+        return cls(columns, [[row.get(name) for row in rows] for name in columns], len(rows))
+    
+    @property
+    def types(self) -> List[str]:
+        if self._types is None:
+            self._types = [column_type(values) for values in self.values]
+        return self._types
+    
+    def column(self, name: str) -> List[Any]:
+        return self.values[self.columns.index(name)]
+    
+    def row(self, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += self.row_count
+        if not 0 <= index < self.row_count:
+            raise IndexError("row index out of range")
+        return {name: values[index] for name, values in zip(self.columns, self.values)}
+    
+    def to_rows(self) -> List[Dict[str, Any]]:
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in zip(*self.values)] if columns else []
+    
+    def __len__(self) -> int:
+        return self.row_count
+    
+    def __bool__(self) -> bool:
+        return self.row_count > 0
+    
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(self.row_count))]
+        return self.row(index)
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        columns = self.columns
+        for row in zip(*self.values):
+            yield dict(zip(columns, row))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact JSON form: {"columns": [...], "types": [...], "values": [[...], ...], "row_count": n}"""
+        return {
+            "columns": self.columns,
+            "types": self.types,
+            "values": self.values,
+            "row_count": self.row_count
+        }
+    
+    def to_bytes(self, meta: Optional[Dict[str, Any]] = None) -> bytes:
+        """Binary form - NULL-free int/float columns as little-endian int64/float64 arrays
+        
+        Layout: b"JENC", version byte, uint32 header length, a UTF-8 JSON header
+        (columns, types, row_count, meta, the other columns' values and each
+        packed column's byte offset), then the packed arrays back to back.
+        """
+        encoded: Dict[str, Any] = {}
+        buffers: List[bytes] = []
+        offset = 0
+        for index, (kind, values) in enumerate(zip(self.types, self.values)):
+            typecode = _PACKED.get(kind)
+            if typecode is None or None in values:
+                encoded[str(index)] = {"values": values}
+                continue
+            packed = array(typecode, values)
+            if sys.byteorder != "little":
+                packed.byteswap()
+            data = packed.tobytes()
+            encoded[str(index)] = {"offset": offset, "typecode": typecode}
+            buffers.append(data)
+            offset += len(data)
+        
+        header = json.dumps({
+            "columns": self.columns,
+            "types": self.types,
+            "row_count": self.row_count,
+            "encoding": encoded,
+            "meta": meta or {}
+        }, separators=(",", ":"), default=str).encode("utf-8")
+        return _HEADER.pack(_MAGIC, _VERSION, len(header)) + header + b"".join(buffers)
+    
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "ColumnarResult":
+        """Decode to_bytes() output (its meta is available via read_meta)"""
+        header, body = _split(payload)
+        values = []
+        for index in range(len(header["columns"])):
+            encoding = header["encoding"][str(index)]
+            if "values" in encoding:
+                values.append(encoding["values"])
+                continue
+            typecode = encoding["typecode"]
+            packed = array(typecode)
+            start = encoding["offset"]
+            packed.frombytes(body[start:start + header["row_count"] * packed.itemsize])
+            if sys.byteorder != "little":
+                packed.byteswap()
+            values.append(packed.tolist())
+        return cls(header["columns"], values, header["row_count"])
+    
+    @staticmethod
+    def read_meta(payload: bytes) -> Dict[str, Any]:
+        return _split(payload)[0]["meta"]
+
+def _split(payload: bytes):
+    magic, version, length = _HEADER.unpack_from(payload)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not a columnar result payload")
+    start = _HEADER.size
+    return json.loads(payload[start:start + length]), memoryview(payload)[start + length:]
+
+# Query results flow through the app as either form
+QueryData = Union[List[Dict[str, Any]], ColumnarResult]
+
+def as_rows(data: Optional[QueryData]) -> Optional[List[Dict[str, Any]]]:
+    return data.to_rows() if isinstance(data, ColumnarResult) else data
+
+def as_columnar(data: Optional[QueryData]) -> Optional[ColumnarResult]:
+    if data is None or isinstance(data, ColumnarResult):
+        return data
+    return ColumnarResult.from_rows(data)
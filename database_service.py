@@ -4,17 +4,409 @@ Handles all database operations with proper connection management
 """
 
 import os
+import time
 import logging
 import asyncio
-from typing import Dict, Any, List, Optional, Tuple
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple, Callable, Deque, AsyncIterator
 from datetime import datetime, date
 
 import pymssql
 from dotenv import load_dotenv
 
+from result_cache import ResultCache, DEFAULT_WATERMARK_SQL
+from phone_index import PhoneIndex
+from name_index import NameIndex
+from user_cache import UserProfileCache, user_key
+from columnar_result import ColumnarResult, QueryData
+from metrics import span, record
+
 load_dotenv()
 log = logging.getLogger("jen.database")
 
+# Active users with a phone or cell number, in User_ID order so shared numbers keep the earliest account
+PHONE_DIRECTORY_SQL = """
+    SELECT
+        u.User_ID as id,
+        u.User_Fname + ' ' + u.User_Lname as name,
+        u.User_Phone as phone,
+        u.User_Cell as cell,
+        u.User_Email as email
+    FROM TBL_USER_CREATE u
+    WHERE u.User_Status = 'A'
+      AND (u.User_Phone IS NOT NULL OR u.User_Cell IS NOT NULL)
+      AND u.User_ID > %s
+    ORDER BY u.User_ID
+"""
+
+# User profile columns shared by get_user_info and get_users_info
+USER_PROFILE_SQL = """
+            SELECT 
+                u.USER_ID,
+                d.F_NAME,
+                d.L_NAME,
+                d.F_NAME + ' ' + d.L_NAME as full_name,
+                u.UTYPE_ID,
+                CASE 
+                    WHEN u.UTYPE_ID = 14 THEN 'agent'
+                    WHEN u.UTYPE_ID IN (15, 16) THEN 'broker'
+                    WHEN u.UTYPE_ID = 12 THEN 'managingbroker'
+                    WHEN u.UTYPE_ID = 1 THEN 'admin'
+                    ELSE 'user'
+                END as user_type,
+                d.JOINED_DT,
+                u.USTATUS
+            FROM TBL_USER_CREATE u
+            INNER JOIN TBL_USER_DETAILS d ON u.USER_ID = d.USER_ID"""
+
+# Active users for spoken-name lookup (same user type mapping as find_user_by_name)
+NAME_DIRECTORY_SQL = """
+    SELECT
+        u.USER_ID,
+        d.F_NAME,
+        d.L_NAME,
+        d.F_NAME + ' ' + d.L_NAME as full_name,
+        CASE 
+            WHEN u.UTYPE_ID = 14 THEN 'agent'
+            WHEN u.UTYPE_ID IN (15, 16) THEN 'broker'
+            ELSE 'user'
+        END as user_type
+    FROM TBL_USER_CREATE u
+    INNER JOIN TBL_USER_DETAILS d ON u.USER_ID = d.USER_ID
+    WHERE u.USTATUS = 1
+"""
+
+# Active users' broker teams (TBL_FEES_MASTER.EQUITY_DIVISION_25_ID), for routing dashboard events
+TEAM_DIRECTORY_SQL = """
+    SELECT
+        u.USER_ID,
+        f.EQUITY_DIVISION_25_ID
+    FROM TBL_USER_CREATE u
+    INNER JOIN TBL_FEES_MASTER f ON u.FEE_ID = f.FEE_ID
+    WHERE u.USTATUS = 1
+      AND f.EQUITY_DIVISION_25_ID IS NOT NULL
+"""
+
+def _iso_date(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+def _convert_value(value: Any) -> Any:
+    """Per-value conversion for columns whose type code says nothing useful"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, '__float__') and not isinstance(value, (bool, int, float)):
+        return float(value)
+    return value
+
+def _column_converter(type_code: Any) -> Optional[Callable[[Any], Any]]:
+    """JSON-friendly converter for a result column, or None when values pass through"""
+    if type_code == pymssql.DATETIME:
+        return _iso_date
+    if type_code == pymssql.DECIMAL:
+        return float
+    if type_code in (pymssql.STRING, pymssql.BINARY, pymssql.NUMBER):
+        return None
+    return _convert_value
+
+class RowConverter:
+    """Turns raw result tuples into dicts, with converters chosen once per column
+    
+    Built from cursor.description, so the column mapping and each column's
+    conversion are worked out once per result set rather than per cell.
+    """
+    
+    __slots__ = ("columns", "_conversions")
+    
+    def __init__(self, description):
+        self.columns = [column[0] for column in description]
+        self._conversions = []
+        for index, column in enumerate(description):
+            convert = _column_converter(column[1])
+            if convert is not None:
+                self._conversions.append((index, column[0], convert))
+    
+    def convert(self, rows: List[tuple]) -> List[Dict[str, Any]]:
+        columns = self.columns
+        conversions = self._conversions
+        records = []
+        for row in rows:
+            record = dict(zip(columns, row))
+            for index, name, convert in conversions:
+                value = row[index]
+                if value is not None:
+                    record[name] = convert(value)
+            records.append(record)
+        return records
+    
+    def extend_columns(self, values: List[List[Any]], rows: List[tuple]):
+        """Append a batch to per-column value lists without building row dicts"""
+        converters = [None] * len(self.columns)
+        for index, _, convert in self._conversions:
+            converters[index] = convert
+        for index, column in enumerate(zip(*rows)):
+            convert = converters[index]
+            if convert is None:
+                values[index].extend(column)
+            else:
+                values[index].extend(convert(value) if value is not None else None for value in column)
+
+class QueryStream:
+    """One streamed query's connection and cursor, advanced one blocking step at a time
+    
+    Each step runs as its own DB executor call, so no worker is held while the
+    consumer works through a batch. Steps of one stream never overlap, and a
+    stream closed before it opened never checks out a connection.
+    """
+    
+    def __init__(self, db: "DatabaseService"):
+        self.db = db
+        self.conn = None
+        self.cursor = None
+        self.converter: Optional[RowConverter] = None
+        self.unread = False
+        self.closed = False
+        self._lock = threading.Lock()
+    
+    def open(self, sql: str, params: Optional[List[Any]]):
+        with self._lock:
+            if self.closed:
+                return
+            with span("db_checkout"):
+                self.conn = self.db.pool.acquire()
+            with span("db_execute"):
+                self.cursor = self.db._open_cursor(self.conn, sql, params)
+            if self.cursor.description:
+                self.converter = RowConverter(self.cursor.description)
+                self.unread = True
+    
+    def fetch(self, batch_size: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self.closed or not self.unread:
+                return []
+            with span("db_execute"):
+                rows = self.cursor.fetchmany(batch_size)
+            if not rows:
+                self.unread = False
+                return []
+            with span("row_convert"):
+                return self.converter.convert(rows)
+    
+    def close(self, failed: bool = False):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.conn is not None:
+                self.db._release_after_query(self.conn, self.unread, failed)
+                self.conn = self.cursor = None
+
+class ConnectionPool:
+    """Bounded pool of reusable SQL Server connections
+    
+    Connections are created on demand up to max_size, validated with a cheap
+    SELECT 1 when they have sat idle, and closed once they exceed the idle
+    timeout (never dropping below min_size).
+    """
+    
+    def __init__(self, factory: Callable[[], Any], min_size: int = 1, max_size: int = 10,
+                 max_idle_seconds: float = 300.0, validate_after_seconds: float = 30.0,
+                 checkout_timeout: float = 15.0):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool bounds: min={min_size}, max={max_size}")
+        
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.validate_after_seconds = validate_after_seconds
+        self.checkout_timeout = checkout_timeout
+        
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        
+        self._stats = {
+            "checkouts": 0,
+            "creations": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "timeouts": 0,
+            "validations_failed": 0,
+            "evictions": 0,
+            "discards": 0
+        }
+    
+    def warm_up(self):
+        """Open connections until min_size sessions are available"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._create()
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+    
+    def acquire(self, timeout: Optional[float] = None):
+        """Check out a live connection, waiting up to timeout if the pool is exhausted"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited = False
+        wait_started = 0.0
+        
+        while True:
+            stale = []
+            conn = None
+            idle_for = 0.0
+            create = False
+            
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                
+                stale = self._evict_idle_locked()
+                
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    idle_for = time.monotonic() - last_used
+                    self._in_use += 1
+                elif self._size < self.max_size:
+                    self._size += 1
+                    self._in_use += 1
+                    create = True
+                else:
+                    if not waited:
+                        waited = True
+                        wait_started = time.monotonic()
+                        self._stats["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        self._stats["wait_time_total"] += time.monotonic() - wait_started
+                        raise TimeoutError(f"Timed out after {timeout}s waiting for a database connection")
+                    self._cond.wait(remaining)
+                    continue
+            
+            self._close_quietly(stale)
+            
+            if create:
+                try:
+                    conn = self._create()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+            elif idle_for >= self.validate_after_seconds and not self._is_alive(conn):
+                log.warning("Discarding dead pooled connection")
+                with self._cond:
+                    self._stats["validations_failed"] += 1
+                self.release(conn, discard=True)
+                continue
+            
+            with self._cond:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["wait_time_total"] += time.monotonic() - wait_started
+            return conn
+    
+    def release(self, conn, discard: bool = False):
+        """Return a connection to the pool, or close it if it may be broken"""
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._stats["discards"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+        
+        if conn is not None:
+            self._close_quietly([conn])
+    
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except Exception:
+            # A failed statement usually leaves the session usable; only drop it if it is dead
+            self.release(conn, discard=not self._is_alive(conn))
+            raise
+        else:
+            self.release(conn)
+    
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_quietly(idle)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Pool-wide counters and current occupancy"""
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size
+            }
+    
+    def _create(self):
+        conn = self._factory()
+        with self._cond:
+            self._stats["creations"] += 1
+        return conn
+    
+    def _evict_idle_locked(self) -> List[Any]:
+        """Pop connections idle past max_idle_seconds; caller holds the lock"""
+        evicted = []
+        now = time.monotonic()
+        # Oldest connections sit at the left of the deque
+        while self._idle and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.max_idle_seconds:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._stats["evictions"] += 1
+            evicted.append(conn)
+        return evicted
+    
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _close_quietly(conns: List[Any]):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
 class DatabaseService:
     """Database service for Jen AI Assistant"""
     
@@ -29,10 +421,66 @@ class DatabaseService:
             raise ValueError("Missing required database credentials in environment variables")
         self.port = int(os.getenv("SQLSERVER_PORT", "1433"))
         
+        # Connection pool - sessions are opened lazily and reused across queries
+        self.pool = ConnectionPool(
+            self._connect,
+            min_size=int(os.getenv("SQLSERVER_POOL_MIN", "2")),
+            max_size=int(os.getenv("SQLSERVER_POOL_MAX", "10")),
+            max_idle_seconds=float(os.getenv("SQLSERVER_POOL_IDLE_SECONDS", "300")),
+            validate_after_seconds=float(os.getenv("SQLSERVER_POOL_VALIDATE_SECONDS", "30")),
+            checkout_timeout=float(os.getenv("SQLSERVER_POOL_TIMEOUT", "15"))
+        )
+        
+        # Dedicated executor - pymssql blocks, so every call runs off the event loop
+        self.query_timeout = float(os.getenv("SQLSERVER_QUERY_TIMEOUT", "30"))
+        self.max_pending = int(os.getenv("SQLSERVER_EXECUTOR_QUEUE", "50"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SQLSERVER_EXECUTOR_WORKERS", str(self.pool.max_size))),
+            thread_name_prefix="jen-db"
+        )
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._executor_stats = {"submitted": 0, "rejected": 0, "timeouts": 0}
+        
+        # Rows are fetched and converted in batches; oversized results are refused
+        self.fetch_batch_size = int(os.getenv("SQLSERVER_FETCH_BATCH_SIZE", "500"))
+        self.max_rows = int(os.getenv("SQLSERVER_MAX_ROWS", "10000"))
+        
+        # Payroll results are reused until wires post; a periodic probe detects new data
+        self.result_cache = ResultCache(
+            max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000")),
+            ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", str(24 * 3600)))
+        )
+        self.watermark_sql = os.getenv("RESULT_CACHE_WATERMARK_SQL", DEFAULT_WATERMARK_SQL)
+        self.watermark_interval = float(os.getenv("RESULT_CACHE_PROBE_SECONDS", "60"))
+        self._watermark_task: Optional[asyncio.Task] = None
+        
+        # Caller identification reads an in-memory directory instead of scanning TBL_USER_CREATE
+        self.phone_index = PhoneIndex(
+            negative_ttl_seconds=float(os.getenv("PHONE_INDEX_NEGATIVE_TTL_SECONDS", "600"))
+        )
+        self.phone_refresh_interval = float(os.getenv("PHONE_INDEX_REFRESH_SECONDS", "300"))
+        self.phone_full_reload_interval = float(os.getenv("PHONE_INDEX_FULL_RELOAD_SECONDS", "3600"))
+        self._phone_task: Optional[asyncio.Task] = None
+        
+        # Profiles are re-read on every conversation turn, so keep them briefly
+        self.user_cache = UserProfileCache(
+            max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "5000")),
+            ttl_seconds=float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+        )
+        
+        # Spoken names are matched in memory (tolerating misheard spellings) instead of LIKE scans
+        self.name_index = NameIndex()
+        self.name_refresh_interval = float(os.getenv("NAME_INDEX_REFRESH_SECONDS", "1800"))
+        self._name_task: Optional[asyncio.Task] = None
+        
+        # user_id -> broker team, refreshed with the name index
+        self._user_teams: Dict[str, str] = {}
+        
         log.info(f"Database service initialized - Host: {self.host}, DB: {self.database}")
     
-    def get_connection(self):
-        """Get a database connection"""
+    def _connect(self):
+        """Open a new physical database connection"""
         try:
             conn = pymssql.connect(
                 server=self.host,
@@ -40,63 +488,200 @@ class DatabaseService:
                 user=self.user,
                 password=self.password,
                 database=self.database,
-                timeout=30,
-                login_timeout=30
+                timeout=int(self.query_timeout),
+                login_timeout=30,
+                autocommit=True
             )
             return conn
         except Exception as e:
             log.error(f"Database connection failed: {e}")
             raise
     
+    def get_connection(self):
+        """Get a pooled database connection
+        
+        Use as a context manager so the connection is returned to the pool:
+        
+            with db_service.get_connection() as conn:
+                ...
+        """
+        return self.pool.connection()
+    
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        """Run a blocking database call on the DB executor
+        
+        Rejects the call when too many are already queued and stops waiting once
+        the per-call deadline passes.
+        """
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                self._executor_stats["rejected"] += 1
+                raise RuntimeError(f"Database executor queue is full ({self._pending} pending)")
+            self._pending += 1
+            self._executor_stats["submitted"] += 1
+        
+        try:
+            # The worker runs in the caller's context so its spans join the request's trace
+            future = self._executor.submit(contextvars.copy_context().run, func, *args)
+        except Exception:
+            self._call_done(None)
+            raise
+        # Released when the worker finishes (or the call is cancelled before starting)
+        future.add_done_callback(self._call_done)
+        
+        timeout = self.query_timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._pending_lock:
+                self._executor_stats["timeouts"] += 1
+            raise TimeoutError(f"Database call exceeded {timeout}s deadline")
+    
+    def _call_done(self, future):
+        with self._pending_lock:
+            self._pending -= 1
+    
+    async def warm_up(self):
+        """Pre-open the minimum number of pooled connections"""
+        try:
+            await self.run(self.pool.warm_up, timeout=60)
+            log.info(f"Database pool warmed - {self.pool.stats()['size']} connections open")
+        except Exception as e:
+            log.error(f"Database pool warm-up failed: {e}")
+        
+        if self.watermark_interval > 0 and self._watermark_task is None:
+            self._watermark_task = asyncio.ensure_future(self._watermark_loop())
+        if self.phone_refresh_interval > 0 and self._phone_task is None:
+            self._phone_task = asyncio.ensure_future(self._phone_index_loop())
+        if self.name_refresh_interval > 0 and self._name_task is None:
+            self._name_task = asyncio.ensure_future(self._name_index_loop())
+    
+    async def _phone_index_loop(self):
+        last_full = 0.0
+        while True:
+            full = not self.phone_index.ready or time.time() - last_full >= self.phone_full_reload_interval
+            if await self.refresh_phone_index(full) and full:
+                last_full = time.time()
+            await asyncio.sleep(self.phone_refresh_interval)
+    
+    async def _name_index_loop(self):
+        while True:
+            await self.refresh_name_index()
+            await self.refresh_team_directory()
+            await asyncio.sleep(self.name_refresh_interval)
+    
+    async def refresh_name_index(self) -> bool:
+        """Reload the spoken-name index from the active users"""
+        try:
+            rows = await self.execute_query(NAME_DIRECTORY_SQL, timeout=60, max_rows=0)
+        except Exception as e:
+            log.error(f"Name index refresh failed: {e}")
+            return False
+        self.name_index.load(rows)
+        log.info(f"Name index loaded - {len(rows)} users")
+        return True
+    
+    async def refresh_team_directory(self) -> bool:
+        """Reload which broker team (EQUITY_DIVISION_25_ID) each active user belongs to"""
+        # Every active user - streamed, so the full row list is never built just to make the map
+        user_teams: Dict[str, str] = {}
+        try:
+            async for batch in self.stream_query(TEAM_DIRECTORY_SQL, timeout=60, max_rows=0):
+                for row in batch:
+                    user_teams[str(row["USER_ID"])] = str(row["EQUITY_DIVISION_25_ID"])
+        except Exception as e:
+            log.error(f"Team directory refresh failed: {e}")
+            return False
+        self._user_teams = user_teams
+        return True
+    
+    def team_of(self, user_id: Any) -> Optional[str]:
+        """The broker team a user belongs to, if the team directory knows them"""
+        return self._user_teams.get(str(user_id)) if user_id is not None else None
+    
+    async def refresh_phone_index(self, full: bool = False) -> bool:
+        """Reload the phone directory, or only add users created since the last load"""
+        since = 0 if full else self.phone_index.max_user_id
+        try:
+            rows = await self.execute_query(PHONE_DIRECTORY_SQL, [since], timeout=60, max_rows=0)
+        except Exception as e:
+            log.error(f"Phone index refresh failed: {e}")
+            return False
+        self.phone_index.load(rows, full)
+        if full:
+            log.info(f"Phone index loaded - {self.phone_index.stats()['numbers']} numbers")
+        return True
+    
+    async def _watermark_loop(self):
+        while True:
+            await self.refresh_watermark()
+            await asyncio.sleep(self.watermark_interval)
+    
+    async def refresh_watermark(self):
+        """Probe the payroll watermark; cached results are dropped when it moves"""
+        try:
+            row = await self.run(self._fetch_one_sync, self.watermark_sql, None, timeout=10)
+            self.result_cache.set_watermark(tuple(row) if row else None)
+        except Exception as e:
+            log.warning(f"Payroll watermark probe failed - result cache paused: {e}")
+            self.result_cache.set_watermark(None)
+    
+    def close(self):
+        """Close all pooled connections and stop the DB executor"""
+        for task in (self._watermark_task, self._phone_task, self._name_task):
+            if task is not None:
+                task.cancel()
+        self._watermark_task = self._phone_task = self._name_task = None
+        self._executor.shutdown(wait=False)
+        self.pool.close()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool and executor metrics"""
+        with self._pending_lock:
+            executor = {**self._executor_stats, "pending": self._pending, "max_pending": self.max_pending}
+        return {**self.pool.stats(), "executor": executor}
+    
     async def health_check(self) -> bool:
         """Check database health"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            result = cursor.fetchone()
-            conn.close()
-            return result is not None
+            return await self.run(self._health_check_sync, timeout=10)
         except Exception as e:
             log.error(f"Database health check failed: {e}")
             return False
     
-    async def execute_query(self, sql: str, params: List[Any] = None) -> List[Dict[str, Any]]:
-        """Execute a SQL query and return results"""
-        try:
-            conn = self.get_connection()
+    def _health_check_sync(self) -> bool:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            if params:
-                cursor.execute(sql, tuple(params))
-            else:
-                cursor.execute(sql)
-            
-            # Get column names
-            columns = [col[0] for col in cursor.description] if cursor.description else []
-            
-            # Fetch all results
-            rows = cursor.fetchall()
-            
-            # Convert to list of dictionaries
-            results = []
-            for row in rows:
-                row_dict = {}
-                for i, value in enumerate(row):
-                    col_name = columns[i]
-                    
-                    # Handle different data types
-                    if isinstance(value, (date, datetime)):
-                        row_dict[col_name] = value.isoformat()
-                    elif hasattr(value, '__float__'):  # Decimal types
-                        row_dict[col_name] = float(value)
-                    else:
-                        row_dict[col_name] = value
-                
-                results.append(row_dict)
-            
-            conn.close()
+            cursor.execute("SELECT 1")
+            result = cursor.fetchone()
+        return result is not None
+    
+    async def execute_query(self, sql: str, params: List[Any] = None,
+                            timeout: Optional[float] = None, cache: bool = False,
+                            max_rows: Optional[int] = None, columnar: bool = False) -> QueryData:
+        """Execute a SQL query and return results
+        
+        With cache=True, read-only payroll queries are answered from the result
+        cache when possible. Cached rows are shared and must not be modified.
+        Queries returning more than max_rows rows (default SQLSERVER_MAX_ROWS,
+        0 for no limit) fail with RuntimeError instead of exhausting memory.
+        With columnar=True the result is a ColumnarResult built straight from
+        the cursor, never materializing a dict per row.
+        """
+        max_rows = self.max_rows if max_rows is None else max_rows
+        cacheable = cache and "payroll_queue_archive" in sql.lower()
+        if cacheable:
+            cached = self.result_cache.get(sql, params)
+            if cached is not None:
+                log.info(f"Query served from result cache - {len(cached)} rows")
+                return self._as_format(cached, columnar)
+            watermark = self.result_cache.watermark
+        
+        try:
+            results = await self.run(self._execute_query_sync, sql, params, max_rows, columnar, timeout=timeout)
             log.info(f"Query executed successfully - {len(results)} rows returned")
+            if cacheable:
+                self.result_cache.put(sql, params, results, watermark)
             return results
             
         except Exception as e:
@@ -105,11 +690,134 @@ class DatabaseService:
             log.error(f"Params: {params}")
             raise
     
+    @staticmethod
+    def _as_format(results: QueryData, columnar: bool) -> QueryData:
+        """A cached result in the form the caller asked for (it may have been stored in the other)"""
+        if columnar and not isinstance(results, ColumnarResult):
+            return ColumnarResult.from_rows(results)
+        if not columnar and isinstance(results, ColumnarResult):
+            return results.to_rows()
+        return results
+    
+    def _execute_query_sync(self, sql: str, params: Optional[List[Any]], max_rows: int,
+                            columnar: bool = False) -> QueryData:
+        results: List[Dict[str, Any]] = []
+        values: List[List[Any]] = []
+        columns: List[str] = []
+        count = 0
+        with span("db_checkout"):
+            conn = self.pool.acquire()
+        unread = False
+        executing = converting = 0.0
+        try:
+            started = time.perf_counter()
+            cursor = self._open_cursor(conn, sql, params)
+            unread = bool(cursor.description)
+            if unread:
+                converter = RowConverter(cursor.description)
+                columns = converter.columns
+                values = [[] for _ in columns]
+                # Convert batch by batch so the raw rows are never all held next to the converted ones
+                while True:
+                    rows = cursor.fetchmany(self.fetch_batch_size)
+                    fetched = time.perf_counter()
+                    executing += fetched - started
+                    if not rows:
+                        break
+                    count += len(rows)
+                    if max_rows and count > max_rows:
+                        raise RuntimeError(f"Query returned more than {max_rows} rows")
+                    if columnar:
+                        converter.extend_columns(values, rows)
+                    else:
+                        results.extend(converter.convert(rows))
+                    started = time.perf_counter()
+                    converting += started - fetched
+                unread = False
+            else:
+                executing = time.perf_counter() - started
+        except Exception:
+            if not executing:
+                executing = time.perf_counter() - started
+            self._release_after_query(conn, unread, failed=True)
+            raise
+        finally:
+            record("db_execute", executing)
+            if converting:
+                record("row_convert", converting)
+        self._release_after_query(conn, unread)
+        
+        return ColumnarResult(columns, values, count) if columnar else results
+    
+    async def stream_query(self, sql: str, params: Optional[List[Any]] = None,
+                           batch_size: Optional[int] = None, max_rows: Optional[int] = None,
+                           timeout: Optional[float] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield a query's rows in converted batches, holding one batch in memory at a time
+        
+            async for batch in db_service.stream_query(sql, params):
+                ...
+        
+        Opening the query and each fetchmany are separate DB executor calls
+        (timeout applies to each), so the connection stays checked out for the
+        life of the stream but no worker waits on the consumer. Raises
+        RuntimeError once more than max_rows rows arrive (default
+        SQLSERVER_MAX_ROWS, 0 for no limit).
+        """
+        batch_size = batch_size or self.fetch_batch_size
+        max_rows = self.max_rows if max_rows is None else max_rows
+        stream = QueryStream(self)
+        failed = False
+        try:
+            await self.run(stream.open, sql, params, timeout=timeout)
+            total = 0
+            while True:
+                rows = await self.run(stream.fetch, batch_size, timeout=timeout)
+                if not rows:
+                    return
+                total += len(rows)
+                if max_rows and total > max_rows:
+                    raise RuntimeError(f"Query returned more than {max_rows} rows")
+                yield rows
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Queued behind any step still running after a timeout; never awaited, so it
+            # also runs when the consumer stops early or the generator is collected
+            try:
+                self._executor.submit(stream.close, failed)
+            except RuntimeError:
+                # Executor already shut down
+                stream.close(failed)
+    
+    @staticmethod
+    def _open_cursor(conn, sql: str, params: Optional[List[Any]]):
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(sql, tuple(params))
+        else:
+            cursor.execute(sql)
+        return cursor
+    
+    def _release_after_query(self, conn, unread: bool, failed: bool = False):
+        """Return a query's connection - closed instead if rows were left unread or it died"""
+        discard = unread or (failed and not self.pool._is_alive(conn))
+        self.pool.release(conn, discard=discard)
+    
     async def get_user_by_phone(self, phone_number: str) -> Optional[Dict[str, Any]]:
-        """Get user by phone number for caller identification"""
+        """Get user by phone number for caller identification
+        
+        Served from the in-memory phone index; the database is only searched
+        for numbers the index doesn't know and that haven't recently missed.
+        """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            user_data = self.phone_index.lookup(phone_number)
+            if user_data:
+                log.info(f"Found user by phone {phone_number}: {user_data['name']} (ID: {user_data['id']})")
+                return user_data
+            if self.phone_index.is_unknown(phone_number):
+                log.info(f"No user found with phone number: {phone_number} (cached)")
+                return None
             
             # Clean phone number (remove common formatting)
             clean_phone = phone_number.replace("+", "").replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
@@ -125,22 +833,16 @@ class DatabaseService:
                 FROM TBL_USER_CREATE u
                 WHERE u.User_Status = 'A' 
                 AND (
-                    REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(u.User_Phone, '+', ''), '-', ''), ' ', ''), '(', ''), ')', '') LIKE '%' + %s + '%'
-                    OR REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(u.User_Cell, '+', ''), '-', ''), ' ', ''), '(', ''), ')', '') LIKE '%' + %s + '%'
+                    REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(u.User_Phone, '+', ''), '-', ''), ' ', ''), '(', ''), ')', '') LIKE '%%' + %s + '%%'
+                    OR REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(u.User_Cell, '+', ''), '-', ''), ' ', ''), '(', ''), ')', '') LIKE '%%' + %s + '%%'
                 )
             """
             
-            cursor.execute(query, (clean_phone, clean_phone))
-            row = cursor.fetchone()
+            results = await self.execute_query(query, [clean_phone, clean_phone])
+            user_data = results[0] if results else None
+            self.phone_index.remember(phone_number, user_data)
             
-            if row:
-                user_data = {
-                    "id": row.id,
-                    "name": row.name,
-                    "phone": row.phone,
-                    "cell": row.cell,
-                    "email": row.email
-                }
+            if user_data:
                 log.info(f"Found user by phone {phone_number}: {user_data['name']} (ID: {user_data['id']})")
                 return user_data
             else:
@@ -150,31 +852,20 @@ class DatabaseService:
         except Exception as e:
             log.error(f"Phone lookup failed for {phone_number}: {e}")
             return None
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
+    def _fetch_one_sync(self, sql: str, params: Optional[Tuple[Any, ...]]):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+    
     async def get_user_info(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user information by ID"""
+        """Get user information by ID (served from the profile cache when fresh)"""
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return cached
         try:
-            sql = """
-            SELECT 
-                u.USER_ID,
-                d.F_NAME,
-                d.L_NAME,
-                d.F_NAME + ' ' + d.L_NAME as full_name,
-                u.UTYPE_ID,
-                CASE 
-                    WHEN u.UTYPE_ID = 14 THEN 'agent'
-                    WHEN u.UTYPE_ID IN (15, 16) THEN 'broker'
-                    WHEN u.UTYPE_ID = 12 THEN 'managingbroker'
-                    WHEN u.UTYPE_ID = 1 THEN 'admin'
-                    ELSE 'user'
-                END as user_type,
-                d.JOINED_DT,
-                u.USTATUS
-            FROM TBL_USER_CREATE u
-            INNER JOIN TBL_USER_DETAILS d ON u.USER_ID = d.USER_ID
+            sql = USER_PROFILE_SQL + """
             WHERE u.USER_ID = %s
               AND u.USTATUS = 1
             """
@@ -182,16 +873,9 @@ class DatabaseService:
             results = await self.execute_query(sql, [user_id])
             
             if results:
-                user_info = results[0]
-                return {
-                    "user_id": user_info["USER_ID"],
-                    "name": user_info["full_name"],
-                    "first_name": user_info["F_NAME"],
-                    "last_name": user_info["L_NAME"],
-                    "user_type": user_info["user_type"],
-                    "joined_date": user_info["JOINED_DT"],
-                    "status": "active" if user_info["USTATUS"] == 1 else "inactive"
-                }
+                user_info = self._profile_from_row(results[0])
+                self.user_cache.put(user_id, user_info)
+                return user_info
             
             return None
             
@@ -199,9 +883,67 @@ class DatabaseService:
             log.error(f"Failed to get user info for {user_id}: {e}")
             return None
     
+    async def get_users_info(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get information for many users in one round trip, keyed by user id
+        
+        Cached profiles are reused; the rest are fetched with a single query
+        whose id list is one parameter split server-side, so the plan is the
+        same whatever the number of ids. Unknown or inactive ids are omitted.
+        """
+        profiles = self.user_cache.get_many(user_ids)
+        missing = sorted({user_key(user_id) for user_id in user_ids if user_key(user_id).isdigit()} - set(profiles))
+        if not missing:
+            return profiles
+        try:
+            sql = USER_PROFILE_SQL + """
+            WHERE u.USER_ID IN (SELECT CAST(value AS INT) FROM STRING_SPLIT(%s, ','))
+              AND u.USTATUS = 1
+            """
+            
+            for row in await self.execute_query(sql, [",".join(missing)]):
+                user_info = self._profile_from_row(row)
+                self.user_cache.put(row["USER_ID"], user_info)
+                profiles[user_key(row["USER_ID"])] = user_info
+            
+        except Exception as e:
+            log.error(f"Failed to get user info for {len(missing)} users: {e}")
+        return profiles
+    
+    def invalidate_user_info(self, user_ids: Optional[List[str]] = None):
+        """Drop cached profiles (all of them when no ids are given) after a user changes"""
+        self.user_cache.invalidate(user_ids)
+    
+    @staticmethod
+    def _profile_from_row(user_info: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "user_id": user_info["USER_ID"],
+            "name": user_info["full_name"],
+            "first_name": user_info["F_NAME"],
+            "last_name": user_info["L_NAME"],
+            "user_type": user_info["user_type"],
+            "joined_date": user_info["JOINED_DT"],
+            "status": "active" if user_info["USTATUS"] == 1 else "inactive"
+        }
+    
     async def find_user_by_name(self, name: str) -> Optional[Dict[str, Any]]:
-        """Find user by name (fuzzy matching)"""
+        """Find user by name (fuzzy matching)
+        
+        Uses the in-memory name index once it is loaded, which also tolerates
+        speech-recognition misspellings; until then falls back to SQL.
+        """
         try:
+            if self.name_index.ready:
+                user_info = self.name_index.identify(name)
+                if not user_info:
+                    return None
+                return {
+                    "user_id": str(user_info["USER_ID"]),
+                    "name": user_info["full_name"],
+                    "first_name": user_info["F_NAME"],
+                    "last_name": user_info["L_NAME"],
+                    "user_type": user_info["user_type"]
+                }
+            
             # Try exact match first
             sql = """
             SELECT TOP 5
@@ -0,0 +1,205 @@
+"""
+Intent Matcher for Jen AI Assistant
+Classifies a question once per request for both SQL selection and response formatting
+"""
+
+import re
+import time
+import logging
+from typing import Dict, Any, Optional, List, FrozenSet, Tuple
+
+from sql_templates import extract_period, extract_top_n
+
+log = logging.getLogger("jen.intents")
+
+# Feature id -> phrases that signal it. Phrases are matched on whole words, overlaps included.
+FEATURE_PHRASES = {
+    # Canned query triggers
+    "income_phrase": ["total income", "how much money", "total commission", "income this year"],
+    "deal_count_phrase": ["how many deals", "deal count", "number of deals"],
+    "worst_month": ["worst month"],
+    "best_month": ["best month"],
+    "average_deal": ["average deal", "average deals", "average sale", "average sales"],
+    "how_many_agents": ["how many agents"],
+    "agent_count": ["agent count"],
+    "how_much": ["how much"],
+    "system": ["system"],
+    
+    # Response formatting cues
+    "income_word": ["income", "money", "commission", "commissions", "earned", "made"],
+    "count_word": ["how many", "count"],
+    "deal": ["deal", "deals"],
+    "agent": ["agent", "agents"],
+    "who": ["who"],
+    "top": ["top"],
+    "month": ["month", "months"],
+    "worst": ["worst"],
+    "best": ["best"],
+    "average": ["average"],
+    "limit": ["highest", "lowest"],
+    
+    # Reporting periods, in the precedence sql_templates.extract_period applies
+    "period_last_year": ["last year", "previous year"],
+    "period_last_month": ["last month", "previous month"],
+    "period_this_month": ["this month", "month to date"],
+    "period_this_year": ["this year", "year to date", "ytd"]
+}
+
+PERIOD_FEATURES = (
+    ("period_last_year", "last_year"),
+    ("period_last_month", "last_month"),
+    ("period_this_month", "this_month"),
+    ("period_this_year", "this_year")
+)
+
+_PERIOD_FEATURE_SET = frozenset(feature for feature, _ in PERIOD_FEATURES)
+
+# A top-N limit ("top 5", "3 best") needs one of these words, so the slot regex only runs when one matched
+LIMIT_FEATURES = frozenset(("top", "best", "worst", "limit"))
+
+TEAM_USER_TYPES = ("broker", "managingbroker")
+
+# Everything but letters and digits becomes a word separator (bytes.translate is a plain table lookup)
+_PUNCTUATION_BYTES = b"!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~"
+_PUNCTUATION = bytes.maketrans(_PUNCTUATION_BYTES, b" " * len(_PUNCTUATION_BYTES))
+_DIGIT = re.compile(r"\d")
+
+def tokenize(question: str) -> List[str]:
+    """Lowercased words of a question, punctuation removed"""
+    return question.lower().encode().translate(_PUNCTUATION).decode().split()
+
+class IntentMatch:
+    """Result of classifying one question"""
+    
+    __slots__ = ("intent", "scope", "features", "slots")
+    
+    def __init__(self, intent: Optional[str], scope: str, features: FrozenSet[str], slots: Dict[str, Any]):
+        self.intent = intent
+        self.scope = scope
+        self.features = features
+        self.slots = slots
+    
+    def has(self, feature: str) -> bool:
+        return feature in self.features
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"intent": self.intent, "scope": self.scope, "features": sorted(self.features), "slots": self.slots}
+
+class IntentMatcher:
+    """Word-set matcher over every feature phrase
+    
+    Single-word phrases are found with one set intersection against the
+    question's words. Multi-word phrases are only tried when their first word
+    occurs, as a substring test on the space-joined words, so overlapping
+    matches such as "total income" and "income" are all found. A fixed
+    precedence table then picks the intent.
+    """
+    
+    def __init__(self, feature_phrases: Dict[str, List[str]], memo_size: int = 4096):
+        self.memo_size = memo_size
+        self._memo: Dict[Tuple[str, str], IntentMatch] = {}
+        self._memo_expires = 0.0
+        words: Dict[str, set] = {}
+        phrases: Dict[str, List[Tuple[str, str]]] = {}
+        for feature, phrase_list in feature_phrases.items():
+            for phrase in phrase_list:
+                split = phrase.split()
+                if len(split) == 1:
+                    words.setdefault(split[0], set()).add(feature)
+                else:
+                    phrases.setdefault(split[0], []).append((f" {' '.join(split)} ", feature))
+        self._words = {word: frozenset(found) for word, found in words.items()}
+        self._word_set = frozenset(words)
+        self._phrases = phrases
+        self._first_words = frozenset(phrases)
+    
+    def features(self, question: str) -> FrozenSet[str]:
+        """All features whose phrases occur in the question"""
+        return self._match(tokenize(question))
+    
+    def _match(self, tokens: List[str]) -> FrozenSet[str]:
+        found = set()
+        words = self._words
+        for word in self._word_set.intersection(tokens):
+            found |= words[word]
+        starts = self._first_words.intersection(tokens)
+        if starts:
+            text = " " + " ".join(tokens) + " "
+            for first in starts:
+                for phrase, feature in self._phrases[first]:
+                    if phrase in text:
+                        found.add(feature)
+        return frozenset(found)
+    
+    def classify(self, question: str, user_type: str) -> IntentMatch:
+        """Map a question to an intent id, the data scope it applies to, and extracted slots
+        
+        Results are memoized - the same questions are asked over and over across agents.
+        Returned matches are shared and must be treated as read-only.
+        """
+        now = time.time()
+        if now >= self._memo_expires or len(self._memo) >= self.memo_size:
+            # Periods like "2026" resolve relative to today, so the memo is also refreshed hourly
+            self._memo.clear()
+            self._memo_expires = now + 3600
+        
+        key = (question, user_type)
+        match = self._memo.get(key)
+        if match is None:
+            match = self.classify_uncached(question, user_type)
+            self._memo[key] = match
+        return match
+    
+    def classify_uncached(self, question: str, user_type: str) -> IntentMatch:
+        """Classify without consulting the memo
+        
+        Named periods come from the phrase match; the slot regexes only run
+        for questions that mention a year or a top-N word.
+        """
+        features = self.features(question)
+        intent = self._resolve(features, user_type)
+        
+        if user_type == "admin":
+            scope = "system"
+        elif user_type in TEAM_USER_TYPES:
+            scope = "team"
+        else:
+            scope = "user"
+        
+        period = None
+        if not _PERIOD_FEATURE_SET.isdisjoint(features):
+            period = next(period for feature, period in PERIOD_FEATURES if feature in features)
+        elif _DIGIT.search(question):
+            period = extract_period(question)
+        top_n = extract_top_n(question) if not LIMIT_FEATURES.isdisjoint(features) else None
+        slots = {"period": period, "top_n": top_n}
+        return IntentMatch(intent, scope, features, slots)
+    
+    @staticmethod
+    def _resolve(features: FrozenSet[str], user_type: str) -> Optional[str]:
+        is_team = user_type in TEAM_USER_TYPES
+        is_admin = user_type == "admin"
+        
+        if "income_phrase" in features:
+            return "total_income"
+        if "deal_count_phrase" in features:
+            return "deal_count"
+        if "worst_month" in features:
+            return "worst_month"
+        if "best_month" in features:
+            return "best_month"
+        if "average_deal" in features:
+            return "average_deal_size"
+        if "how_many_agents" in features and (is_team or is_admin):
+            return "agent_count"
+        if "agent_count" in features and is_admin:
+            return "agent_count"
+        # Generic fallbacks only apply once nothing more specific matched
+        if "how_much" in features and is_team:
+            return "total_income"
+        if "system" in features and is_admin:
+            return "total_income"
+        return None
+
+# Global instance
+intent_matcher = IntentMatcher(FEATURE_PHRASES)
@@ -0,0 +1,264 @@
+"""
+KPI Rollups for Jen AI Assistant
+Keeps monthly payroll aggregates in memory so canned questions skip SQL Server
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+log = logging.getLogger("jen.kpi_rollups")
+
+# One row per agent, division and month; the Wire_Date range keeps the scan sargable
+ROLLUP_SQL = """
+    SELECT
+        USER_ID,
+        EQUITY_DIVISION_25_ID,
+        YEAR(Wire_Date) as wire_year,
+        MONTH(Wire_Date) as wire_month,
+        SUM(NET_COMMISSION) as net_commission,
+        SUM(AMOUNT_1099_AM) as gross_commission,
+        COUNT(*) as deal_count,
+        SUM(CASE WHEN SalesPrice > 0 THEN SalesPrice ELSE 0 END) as sales_price_sum,
+        SUM(CASE WHEN SalesPrice > 0 THEN 1 ELSE 0 END) as sales_price_count,
+        MAX(Wire_Date) as last_wire_date
+    FROM payroll_Queue_Archive
+    WHERE Wire_Date >= %s
+      AND (BuyerID > 0 OR ListingID > 0)
+    GROUP BY USER_ID, EQUITY_DIVISION_25_ID, YEAR(Wire_Date), MONTH(Wire_Date)
+"""
+
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+
+class MonthlyKPI:
+    """Aggregates for one subject (agent, division or whole system) in one month"""
+    
+    __slots__ = ("net_commission", "gross_commission", "deal_count", "sales_price_sum", "sales_price_count")
+    
+    def __init__(self):
+        self.net_commission = 0.0
+        self.gross_commission = 0.0
+        self.deal_count = 0
+        self.sales_price_sum = 0.0
+        self.sales_price_count = 0
+    
+    def add(self, row: Dict[str, Any]):
+        self.net_commission += row["net_commission"] or 0.0
+        self.gross_commission += row["gross_commission"] or 0.0
+        self.deal_count += row["deal_count"] or 0
+        self.sales_price_sum += row["sales_price_sum"] or 0.0
+        self.sales_price_count += row["sales_price_count"] or 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "net_commission": self.net_commission,
+            "gross_commission": self.gross_commission,
+            "deal_count": self.deal_count,
+            "sales_price_sum": self.sales_price_sum,
+            "average_sales_price": self.sales_price_sum / self.sales_price_count if self.sales_price_count else None
+        }
+
+# (year, month) -> aggregates
+Months = Dict[Tuple[int, int], MonthlyKPI]
+
+class KPIRollups:
+    """Per-agent, per-division and system-wide monthly KPIs
+    
+    The first refresh loads everything since January of last year. Later
+    refreshes re-aggregate only from the month of the newest Wire_Date seen,
+    triggered when the payroll watermark moves or the rollup gets too old. A
+    full reload runs periodically to pick up back-dated wires.
+    
+    answer() returns rows shaped exactly like the matching canned query, so
+    generate_response formats them unchanged.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+        self.check_interval = float(os.getenv("KPI_ROLLUP_CHECK_SECONDS", "30"))
+        self.max_age = float(os.getenv("KPI_ROLLUP_MAX_AGE_SECONDS", "900"))
+        self.full_reload_interval = float(os.getenv("KPI_ROLLUP_FULL_RELOAD_SECONDS", str(24 * 3600)))
+        self.query_timeout = float(os.getenv("KPI_ROLLUP_QUERY_TIMEOUT", "120"))
+        
+        # (user_id, division_id, year, month) -> that month's row from ROLLUP_SQL
+        self._rows: Dict[Tuple[str, str, int, int], Dict[str, Any]] = {}
+        self._by_user: Dict[str, Months] = {}
+        self._by_division: Dict[str, Months] = {}
+        self._system: Months = {}
+        self._last_wire: Optional[datetime] = None
+        self._seen_watermark: Any = None
+        self._refreshed_at = 0.0
+        self._full_reload_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"answers": 0, "refreshes": 0, "full_reloads": 0, "refresh_failures": 0}
+    
+    @property
+    def ready(self) -> bool:
+        return self._refreshed_at > 0
+    
+    def start(self):
+        """Begin refreshing in the background (call from within the event loop)"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+    
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            watermark = self.db.result_cache.watermark
+            now = time.time()
+            stale = (
+                not self.ready
+                or (watermark is not None and watermark != self._seen_watermark)
+                or now - self._refreshed_at >= self.max_age
+            )
+            if stale:
+                await self.refresh(full=now - self._full_reload_at >= self.full_reload_interval)
+                self._seen_watermark = watermark
+            await asyncio.sleep(self.check_interval)
+    
+    async def refresh(self, full: bool = False):
+        """Re-aggregate months from the last seen Wire_Date onward (or everything, when full)"""
+        today = date.today()
+        replace_all = full or self._last_wire is None
+        if replace_all:
+            since = date(today.year - 1, 1, 1)
+        else:
+            since = min(self._last_wire.date(), today).replace(day=1)
+        
+        started = time.time()
+        try:
+            rows = await self.db.execute_query(ROLLUP_SQL, [since], timeout=self.query_timeout, max_rows=0)
+        except Exception as e:
+            self._stats["refresh_failures"] += 1
+            log.error(f"KPI rollup refresh failed: {e}")
+            return
+        
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._apply, rows, since, replace_all, today)
+        
+        self._refreshed_at = time.time()
+        self._stats["refreshes"] += 1
+        if replace_all:
+            self._full_reload_at = self._refreshed_at
+            self._stats["full_reloads"] += 1
+        log.info(f"KPI rollups refreshed since {since} - {len(rows)} rows in {self._refreshed_at - started:.2f}s")
+    
+    def _apply(self, rows: List[Dict[str, Any]], since: date, replace_all: bool, today: date):
+        """Replace the refreshed months, then rebuild the per-subject views and swap them in"""
+        base = {} if replace_all else {
+            key: row for key, row in self._rows.items()
+            if (key[2], key[3]) < (since.year, since.month) and key[2] >= today.year - 1
+        }
+        last_wire = None if replace_all else self._last_wire
+        for row in rows:
+            key = (str(row["USER_ID"]), str(row["EQUITY_DIVISION_25_ID"]), int(row["wire_year"]), int(row["wire_month"]))
+            base[key] = row
+            wired = row.get("last_wire_date")
+            if wired:
+                wired = datetime.fromisoformat(wired) if isinstance(wired, str) else wired
+                if last_wire is None or wired > last_wire:
+                    last_wire = wired
+        
+        by_user: Dict[str, Months] = {}
+        by_division: Dict[str, Months] = {}
+        system: Months = {}
+        for (user_id, division_id, year, month), row in base.items():
+            period = (year, month)
+            by_user.setdefault(user_id, {}).setdefault(period, MonthlyKPI()).add(row)
+            by_division.setdefault(division_id, {}).setdefault(period, MonthlyKPI()).add(row)
+            system.setdefault(period, MonthlyKPI()).add(row)
+        
+        # Readers only ever see a complete snapshot
+        self._rows = base
+        self._by_user = by_user
+        self._by_division = by_division
+        self._system = system
+        self._last_wire = last_wire
+    
+    def months(self, scope: str, subject_id: Optional[str] = None) -> Months:
+        """Monthly KPIs for an agent ("user"), a division ("team") or everyone ("system")"""
+        if scope == "system":
+            return self._system
+        if scope == "team":
+            return self._by_division.get(str(subject_id), {})
+        return self._by_user.get(str(subject_id), {})
+    
+    @staticmethod
+    def period_months(period: Optional[str], today: Optional[date] = None) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Inclusive ((year, month), (year, month)) range the rollups hold for a period, or None if they don't"""
+        today = today or date.today()
+        if period in (None, "this_year"):
+            return (today.year, 1), (today.year, 12)
+        if period == "this_month":
+            return (today.year, today.month), (today.year, today.month)
+        if period == "last_month":
+            month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+            return month, month
+        year = today.year - 1 if period == "last_year" else None
+        if period.startswith("year_") and period[5:].isdigit():
+            year = int(period[5:])
+        # Only this year and last year are loaded
+        if year is None or not today.year - 1 <= year <= today.year:
+            return None
+        return (year, 1), (year, 12)
+    
+    def answer(self, query_key: Optional[Tuple[str, str]], subject_id: str, period: Optional[str] = None,
+               today: Optional[date] = None) -> Optional[List[Dict[str, Any]]]:
+        """Rows for a canned (intent, scope) query over period (default this year)
+        
+        None if it must go to SQL Server - including periods older than the
+        rollups hold.
+        """
+        if not self.ready or query_key is None:
+            return None
+        months_range = self.period_months(period, today)
+        if months_range is None:
+            return None
+        first, last = months_range
+        intent, scope = query_key
+        months = {
+            month: kpi for month, kpi in self.months(scope, subject_id).items()
+            if first <= month <= last
+        }
+        
+        if intent == "total_income":
+            rows = [{"total_income": sum(kpi.net_commission for kpi in months.values()) if months else None}]
+        elif intent == "deal_count":
+            rows = [{"deal_count": sum(kpi.deal_count for kpi in months.values())}]
+        elif intent == "average_deal_size":
+            count = sum(kpi.sales_price_count for kpi in months.values())
+            total = sum(kpi.sales_price_sum for kpi in months.values())
+            rows = [{"average_deal_size": total / count if count else None}]
+        elif intent in ("worst_month", "best_month"):
+            earning = [(kpi.net_commission, month) for month, kpi in months.items() if kpi.net_commission > 0]
+            if not earning:
+                rows = []
+            else:
+                total, (year, month) = (min if intent == "worst_month" else max)(earning)
+                rows = [{"month": f"{MONTH_NAMES[month - 1]} {year}", "total": total}]
+        else:
+            return None
+        
+        self._stats["answers"] += 1
+        return rows
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "ready": self.ready,
+            "rows": len(self._rows),
+            "agents": len(self._by_user),
+            "divisions": len(self._by_division),
+            "last_wire_date": self._last_wire.isoformat() if self._last_wire else None,
+            "age_seconds": round(time.time() - self._refreshed_at, 1) if self.ready else None
+        }
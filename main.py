@@ -7,13 +7,14 @@ Agents call Jen and get instant answers to any business question.
 """
 
 import os
+import asyncio
 import logging
-import json
+import functools
 from datetime import datetime, date
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator
 
 from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -22,11 +23,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import our custom modules
-from database_service import DatabaseService
-from ai_service import JenAI
-from voice_service import VoiceProcessor
+from database_service import db_service
+from ai_service import jen_ai as ai_service
+from voice_service import voice_processor, IDENTIFY_PROMPT, ERROR_MESSAGE
 from auth_service import AuthService
 from twilio_service import TwilioService
+from single_flight import SingleFlight
+from kpi_rollups import KPIRollups
+from session_store import SessionStore, CallSession
+from intents import IntentMatch
+from columnar_result import ColumnarResult, QueryData, BINARY_MEDIA_TYPE, as_rows, as_columnar
+from serialization import dumps, dumps_text, loads
+from broadcast_hub import BroadcastHub, Subscriber, Subscription
+from metrics import metrics, timed, current_trace, TimingMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -39,20 +48,41 @@ logging.basicConfig(
 )
 log = logging.getLogger("jen")
 
-# Initialize services
-db_service = DatabaseService()
-ai_service = JenAI()
-voice_processor = VoiceProcessor()
+# Initialize services (the database, AI and voice services are module singletons, so
+# AuthService and start.py share the same pool, SQL cache, STT executor and audio cache)
 auth_service = AuthService()
 twilio_service = TwilioService()
 
+# Identical queries running at the same time share one database execution
+query_flight = SingleFlight("query_execution")
+
+# Monthly payroll aggregates that answer canned questions without a query
+kpi_rollups = KPIRollups(db_service)
+
+# Identified callers per CallSid / conversation id, so later turns skip identification
+call_sessions = SessionStore(
+    idle_seconds=float(os.getenv("SESSION_IDLE_SECONDS", "900")),
+    max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "2000"))
+)
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson (handles Decimal, datetime and ColumnarResult)
+    
+    Returning one directly from an endpoint also skips FastAPI's
+    jsonable_encoder pass over the content.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
 # FastAPI app
 app = FastAPI(
     title="Jen AI Assistant",
     description="The Ultimate Voice-Powered Real Estate AI Assistant",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware for web integration
@@ -64,17 +94,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request stage timing (Server-Timing header, /metrics histograms)
+app.add_middleware(TimingMiddleware)
+
+def with_timing(endpoint):
+    """Add the request's per-stage timing summary to a debug endpoint's dict response"""
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        trace = current_trace()
+        if isinstance(result, dict) and trace is not None:
+            result["timing"] = trace.summary()
+        return result
+    return wrapper
+
+@app.on_event("startup")
+async def startup():
+    """Warm shared resources before the first call arrives"""
+    await db_service.warm_up()
+    kpi_rollups.start()
+    # Fixed prompts render in the background so startup doesn't wait on ElevenLabs
+    asyncio.ensure_future(voice_processor.warm_up())
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled connections"""
+    kpi_rollups.stop()
+    broadcast_hub.close()
+    db_service.close()
+    await ai_service.aclose()
+    await voice_processor.aclose()
+
 # Request models
 class VoiceQueryRequest(BaseModel):
     audio_data: str  # Base64 encoded audio
     caller_id: Optional[str] = None
-    session_id: Optional[str] = None
+    session_id: Optional[str] = None  # as returned by an earlier answer in this call
+    stream_audio: bool = False  # return an audio_url to stream instead of inline base64
 
 class TextQueryRequest(BaseModel):
     question: str
     user_id: str
     user_type: str = "agent"
     session_id: Optional[str] = None
+    result_format: str = "rows"  # "rows" or "columnar"
+    debug: bool = False  # include per-stage timing
+
+RESULT_FORMATS = ("rows", "columnar")
 
 class CallbackRequest(BaseModel):
     call_sid: str
@@ -82,8 +148,11 @@ class CallbackRequest(BaseModel):
     speech_result: Optional[str] = None
     recording_url: Optional[str] = None
 
-# Active WebSocket connections for real-time updates
-active_connections: List[WebSocket] = []
+# Dashboard WebSocket clients - each has its own bounded send queue and writer task
+broadcast_hub = BroadcastHub(
+    queue_size=int(os.getenv("WS_QUEUE_SIZE", "100")),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+)
 
 @app.get("/")
 async def root():
@@ -126,6 +195,24 @@ async def health_check():
                 "ai_service": "healthy" if ai_healthy else "unhealthy",
                 "voice_processor": "healthy" if voice_healthy else "unhealthy"
             },
+            "database_pool": db_service.pool_stats(),
+            "sql_cache": ai_service.sql_cache.stats(),
+            "result_cache": db_service.result_cache.stats(),
+            "kpi_rollups": kpi_rollups.stats(),
+            "phone_index": db_service.phone_index.stats(),
+            "name_index": db_service.name_index.stats(),
+            "user_cache": db_service.user_cache.stats(),
+            "sessions": call_sessions.stats(),
+            "websockets": broadcast_hub.stats(),
+            "stage_latency": metrics.summary(),
+            "tts_cache": voice_processor.audio_cache.stats(),
+            "tts_splicer": voice_processor.splicer.stats() if voice_processor.splicer else None,
+            "stt": voice_processor.stt_engine.stats() if voice_processor.stt_engine else None,
+            "partial_prefetch": prefetch_stats,
+            "coalescing": {
+                "sql_generation": ai_service.generation_flight.stats(),
+                "query_execution": query_flight.stats()
+            },
             "timestamp": datetime.utcnow().isoformat() + "Z"
         }
     except Exception as e:
@@ -135,6 +222,11 @@ async def health_check():
             content={"status": "unhealthy", "error": str(e)}
         )
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage and request latency histograms in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/voice/query")
 async def voice_query(request: VoiceQueryRequest):
     """Process voice-based queries from phone calls"""
@@ -148,58 +240,13 @@ async def voice_query(request: VoiceQueryRequest):
         if not transcript:
             return {"error": "Could not understand audio"}
         
-        # Identify user from caller ID or transcript
-        user_info = await auth_service.identify_user(
-            caller_id=request.caller_id,
-            transcript=transcript
-        )
-        
-        if not user_info:
-            # Generate response asking for identification
-            response_text = "Hi! I'm Jen, your AI assistant. Could you please tell me your agent ID or full name so I can help you?"
-            audio_response = await voice_processor.text_to_speech(response_text)
-            
-            return {
-                "success": False,
-                "needs_identification": True,
-                "text_response": response_text,
-                "audio_response": audio_response,
-                "session_id": request.session_id
-            }
-        
-        # Process the business query
-        result = await process_business_query(
-            question=transcript,
-            user_id=user_info["user_id"],
-            user_type=user_info["user_type"],
-            user_name=user_info.get("name", "")
-        )
-        
-        # Convert response to speech
-        audio_response = await voice_processor.text_to_speech(result["response"])
-        
-        # Broadcast to WebSocket connections
-        await broadcast_query_result({
-            "type": "voice_query",
-            "user": user_info,
-            "question": transcript,
-            "response": result["response"],
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        
-        return {
-            "success": True,
-            "transcript": transcript,
-            "text_response": result["response"],
-            "audio_response": audio_response,
-            "data": result.get("data"),
-            "session_id": request.session_id,
-            "user": user_info
-        }
+        return FastJSONResponse(await answer_voice_transcript(
+            transcript, request.caller_id, request.session_id, request.stream_audio
+        ))
         
     except Exception as e:
         log.error(f"Voice query error: {e}")
-        error_response = "I'm sorry, I'm having trouble processing your request right now. Please try again."
+        error_response = ERROR_MESSAGE
         audio_response = await voice_processor.text_to_speech(error_response)
         
         return {
@@ -209,9 +256,101 @@ async def voice_query(request: VoiceQueryRequest):
             "audio_response": audio_response
         }
 
+async def identify_caller(caller_id: Optional[str], session_id: Optional[str],
+                          transcript: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[CallSession]]:
+    """Identify user from caller ID or transcript (once per session)
+    
+    Session ids are minted here and handed back to the client; an id this
+    server did not issue, or one issued for another caller ID, is ignored.
+    """
+    session = call_sessions.get(session_id, owner=caller_id)
+    if session:
+        return {"user_id": session.user_id, "user_type": session.user_type, "name": session.user_name}, session
+    
+    user_info = await auth_service.identify_user(caller_id=caller_id, transcript=transcript)
+    if user_info:
+        session = call_sessions.start(call_sessions.new_id(), user_info["user_id"], user_info["user_type"],
+                                      user_info.get("name", ""), owner=caller_id)
+    return user_info, session
+
+async def answer_voice_transcript(transcript: str, caller_id: Optional[str], session_id: Optional[str],
+                                  stream_audio: bool, prefetch: Optional["PartialPrefetch"] = None) -> Dict[str, Any]:
+    """Identify the caller, answer what they said and voice the answer"""
+    user_info, session = await identify_caller(caller_id, session_id, transcript)
+    
+    if not user_info:
+        # Generate response asking for identification
+        response_text = IDENTIFY_PROMPT
+        
+        return {
+            "success": False,
+            "needs_identification": True,
+            "text_response": response_text,
+            **await speech_payload(response_text, stream_audio),
+            "session_id": None
+        }
+    
+    # Process the business query
+    result = await process_business_query(
+        question=transcript,
+        user_id=user_info["user_id"],
+        user_type=user_info["user_type"],
+        user_name=user_info.get("name", ""),
+        session=session,
+        prefetch=prefetch
+    )
+    
+    # Convert response to speech (or hand back a URL that streams it)
+    audio = await speech_payload(result["response"], stream_audio)
+    
+    # Broadcast to WebSocket connections
+    broadcast_query_result({
+        "type": "voice_query",
+        "user": user_info,
+        "question": transcript,
+        "response": result["response"],
+        "timestamp": datetime.utcnow().isoformat()
+    })
+    
+    return {
+        "success": True,
+        "transcript": transcript,
+        "text_response": result["response"],
+        **audio,
+        "data": as_rows(result.get("data")),
+        "session_id": session.session_id if session else None,
+        "user": user_info
+    }
+
+async def speech_payload(text: str, stream: bool) -> Dict[str, Any]:
+    """Inline base64 audio, or with stream=True a URL that streams it as it is synthesized"""
+    if stream:
+        return {"audio_url": f"/voice/audio/{voice_processor.create_speech_ticket(text)}"}
+    return {"audio_response": await voice_processor.text_to_speech(text)}
+
+@app.get("/voice/audio/{ticket}")
+async def voice_audio(ticket: str):
+    """Stream MP3 for a /voice/query answer - the first sentence as ElevenLabs produces it, the rest rendered in parallel behind it"""
+    text = voice_processor.redeem_speech_ticket(ticket)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired audio ticket")
+    return StreamingResponse(
+        voice_processor.stream_answer(text),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-store"}
+    )
+
 @app.post("/text/query")
-async def text_query(request: TextQueryRequest):
-    """Process text-based queries (for testing and web interface)"""
+async def text_query(request: TextQueryRequest, http_request: Request):
+    """Process text-based queries (for testing and web interface)
+    
+    result_format="columnar" returns data as column arrays; sending
+    Accept: application/vnd.jen.columnar returns the whole answer in the
+    binary columnar encoding instead of JSON.
+    """
+    binary = BINARY_MEDIA_TYPE in http_request.headers.get("accept", "")
+    if request.result_format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"result_format must be one of {', '.join(RESULT_FORMATS)}")
     try:
         log.info(f"Text query from user {request.user_id}: {request.question}")
         
@@ -225,11 +364,12 @@ async def text_query(request: TextQueryRequest):
             question=request.question,
             user_id=request.user_id,
             user_type=request.user_type,
-            user_name=user_info.get("name", "")
+            user_name=user_info.get("name", ""),
+            columnar=binary or request.result_format == "columnar"
         )
         
         # Broadcast to WebSocket connections
-        await broadcast_query_result({
+        broadcast_query_result({
             "type": "text_query",
             "user": user_info,
             "question": request.question,
@@ -237,13 +377,29 @@ async def text_query(request: TextQueryRequest):
             "timestamp": datetime.utcnow().isoformat()
         })
         
-        return {
+        if binary:
+            data = as_columnar(result.get("data")) or ColumnarResult([], [], 0)
+            return Response(
+                content=data.to_bytes(meta={
+                    "success": True,
+                    "question": request.question,
+                    "response": result["response"],
+                    "has_data": result.get("data") is not None,
+                    "user": user_info
+                }),
+                media_type=BINARY_MEDIA_TYPE
+            )
+        
+        content = {
             "success": True,
             "question": request.question,
             "response": result["response"],
-            "data": result.get("data"),
+            "data": format_result_data(result.get("data"), request.result_format),
             "user": user_info
         }
+        if request.debug and current_trace() is not None:
+            content["timing"] = current_trace().summary()
+        return FastJSONResponse(content)
         
     except Exception as e:
         log.error(f"Text query error: {e}")
@@ -276,44 +432,268 @@ async def elevenlabs_webhook(request: Request):
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time updates"""
+    """WebSocket endpoint for real-time updates
+    
+    Clients get every event until they subscribe, e.g.
+    {"action": "subscribe", "teams": [1234], "users": [5678], "types": ["voice_query"]};
+    {"action": "unsubscribe"} goes back to everything.
+    """
     await websocket.accept()
-    active_connections.append(websocket)
+    subscriber = broadcast_hub.connect(websocket)
     
     try:
         while True:
-            # Keep connection alive and handle any incoming messages
+            # Keep connection alive and handle subscription messages
             data = await websocket.receive_text()
-            await websocket.send_text(f"Echo: {data}")
+            broadcast_hub.send(subscriber, handle_ws_message(subscriber, data))
             
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        pass
+    finally:
+        broadcast_hub.disconnect(subscriber)
+
+prefetch_stats = {"started": 0, "used": 0, "discarded": 0}
+
+# Live speech sessions are capped in both wall-clock time and audio received;
+# the audio queue applies backpressure when recognition falls behind
+VOICE_STREAM_MAX_SECONDS = float(os.getenv("VOICE_STREAM_MAX_SECONDS", "60"))
+VOICE_STREAM_QUEUE_CHUNKS = int(os.getenv("VOICE_STREAM_QUEUE_CHUNKS", "50"))
+
+class PartialPrefetch:
+    """Starts answering a canned question while the caller is still talking
+    
+    Each partial transcript is classified; as soon as one maps to a canned
+    query (total income, deal count, ...) that answer is computed in the
+    background. The final transcript reuses it only if it classifies to the
+    same canned query, slots and wording features - otherwise it is dropped.
+    """
+    
+    def __init__(self, user_info: Dict[str, Any]):
+        self.user_info = user_info
+        self.key: Optional[Tuple[Any, ...]] = None
+        self.task: Optional["asyncio.Future"] = None
+    
+    @staticmethod
+    def _key(intent: IntentMatch) -> Optional[Tuple[Any, ...]]:
+        canned = ai_service.canned_query_key(intent)
+        if canned is None:
+            return None
+        return (canned, repr(sorted(intent.slots.items())), intent.features)
+    
+    def update(self, partial: str) -> IntentMatch:
+        """Classify a partial transcript, (re)starting the prefetch when its canned query changes"""
+        user = self.user_info
+        intent = ai_service.classify(partial, user["user_type"])
+        key = self._key(intent)
+        if key is not None and key != self.key:
+            self.cancel()
+            self.key = key
+            self.task = asyncio.ensure_future(answer_business_query(
+                partial, user["user_id"], user["user_type"], user.get("name", ""), intent
+            ))
+            prefetch_stats["started"] += 1
+        return intent
+    
+    async def take(self, intent: IntentMatch) -> Optional[Dict[str, Any]]:
+        """The prefetched answer if it matches the final intent, else None"""
+        task, key = self.task, self.key
+        self.task, self.key = None, None
+        if task is None:
+            return None
+        if key != self._key(intent):
+            task.cancel()
+            prefetch_stats["discarded"] += 1
+            return None
+        try:
+            result = await task
+        except Exception as e:
+            log.warning(f"Prefetched answer failed, answering again: {e}")
+            prefetch_stats["discarded"] += 1
+            return None
+        prefetch_stats["used"] += 1
+        return result
+    
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            prefetch_stats["discarded"] += 1
+        self.task, self.key = None, None
+
+@app.websocket("/voice/stream")
+async def voice_stream(websocket: WebSocket, caller_id: Optional[str] = None, session_id: Optional[str] = None,
+                       stream_audio: bool = True):
+    """Live speech recognition for the web voice client
+    
+    Send 16 kHz mono 16-bit PCM as binary frames and {"action": "end"} once
+    the caller stops talking. Partial transcripts come back as
+    {"type": "partial", "text": ..., "intent": ...} while audio arrives; a
+    known caller's canned question starts being answered from the partials.
+    The reply is {"type": "answer", ...} with the /voice/query fields.
+    
+    Listening ends after VOICE_STREAM_MAX_SECONDS, or once that much audio
+    has arrived, and the question heard so far is answered.
+    """
+    await websocket.accept()
+    engine = voice_processor.stt_engine
+    if engine is None:
+        await websocket.send_text(dumps_text({"type": "error", "error": "Speech recognition is not available"}))
+        await websocket.close(code=1011)
+        return
+    
+    user_info, session = await identify_caller(caller_id, session_id)
+    session_id = session.session_id if session else None
+    prefetch = PartialPrefetch(user_info) if user_info else None
+    audio: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize=VOICE_STREAM_QUEUE_CHUNKS)
+    max_bytes = int(VOICE_STREAM_MAX_SECONDS * engine.sample_rate * 2)
+    
+    async def receive_audio():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + VOICE_STREAM_MAX_SECONDS
+        received = 0
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(websocket.receive(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    log.info(f"Voice stream reached its {VOICE_STREAM_MAX_SECONDS:.0f}s limit")
+                    break
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    received += len(message["bytes"])
+                    if received > max_bytes:
+                        log.info(f"Voice stream reached its {max_bytes} byte audio limit")
+                        break
+                    await audio.put(message["bytes"])
+                elif message.get("text"):
+                    # Control frames that aren't JSON objects are ignored
+                    try:
+                        control = loads(message["text"])
+                    except ValueError:
+                        continue
+                    if isinstance(control, dict) and control.get("action") == "end":
+                        break
+        except Exception as e:
+            log.warning(f"Voice stream receive failed: {e}")
+        # Not reached when cancelled - recognition has already stopped reading then
+        await audio.put(None)
+    
+    async def chunks() -> AsyncIterator[bytes]:
+        while True:
+            chunk = await audio.get()
+            if chunk is None:
+                return
+            yield chunk
+    
+    receiver = asyncio.ensure_future(receive_audio())
+    try:
+        transcript = None
+        async for result in engine.stream(chunks()):
+            if result.final:
+                transcript = result.text
+                break
+            intent = prefetch.update(result.text) if prefetch is not None else None
+            await websocket.send_text(dumps_text({
+                "type": "partial",
+                "text": result.text,
+                "intent": intent.intent if intent is not None else None
+            }))
+        
+        if not transcript:
+            await websocket.send_text(dumps_text({"type": "answer", "success": False, "error": "Could not understand audio"}))
+            return
+        log.info(f"Streamed transcript: {transcript}")
+        answer = await answer_voice_transcript(transcript, caller_id, session_id, stream_audio, prefetch)
+        await websocket.send_text(dumps_text({"type": "answer", **answer}))
+        
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        log.error(f"Voice stream error: {e}")
+        try:
+            await websocket.send_text(dumps_text({"type": "answer", "success": False, "error": str(e), "text_response": ERROR_MESSAGE}))
+        except Exception:
+            # The socket may already be closed
+            pass
+    finally:
+        receiver.cancel()
+        if prefetch is not None:
+            prefetch.cancel()
+
+async def process_business_query(question: str, user_id: str, user_type: str, user_name: str,
+                                 session: Optional[CallSession] = None, columnar: bool = False,
+                                 prefetch: Optional["PartialPrefetch"] = None) -> Dict[str, Any]:
+    """Process a business query and return response
+    
+    Within a call session, a query that already ran earlier in the call (same
+    SQL and parameters) is answered from the session. With columnar=True,
+    query results come back as a ColumnarResult (rollup answers may still be
+    row lists - see format_result_data). A prefetch started from partial
+    transcripts is used when it answered the same canned question.
+    """
+    # Classify once - the intent drives both SQL selection and response wording
+    intent = ai_service.classify(question, user_type)
+    
+    result = await prefetch.take(intent) if prefetch is not None else None
+    if result is None:
+        result = await answer_business_query(question, user_id, user_type, user_name, intent, columnar, session)
+    call_sessions.remember(session, intent.intent)
+    return result
 
-async def process_business_query(question: str, user_id: str, user_type: str, user_name: str) -> Dict[str, Any]:
-    """Process a business query and return response"""
+async def answer_business_query(question: str, user_id: str, user_type: str, user_name: str,
+                                intent: IntentMatch, columnar: bool = False,
+                                session: Optional[CallSession] = None) -> Dict[str, Any]:
+    """Answer a classified question from the KPI rollups, the call session or SQL Server"""
+    
+    # Canned questions are answered straight from the KPI rollups when they are loaded
+    query_result = kpi_rollups.answer(ai_service.canned_query_key(intent), user_id, intent.slots.get("period"))
+    if query_result is not None:
+        return {
+            "response": ai_service.generate_response(
+                question=question,
+                data=query_result,
+                user_name=user_name,
+                user_type=user_type,
+                intent=intent
+            ),
+            "data": query_result,
+            "sql": None,
+            "source": "kpi_rollup"
+        }
     
     # Generate SQL query using AI
-    sql_query = await ai_service.generate_sql_query(
+    prepared = await ai_service.prepare_query(
         question=question,
         user_type=user_type,
-        user_id=user_id
+        user_id=user_id,
+        intent=intent
     )
     
-    if not sql_query:
+    if not prepared:
         return {
             "response": "I'm sorry, I couldn't understand your question. Could you try rephrasing it?",
             "data": None
         }
+    sql_query, params = prepared
     
-    # Execute the query
-    query_result = await db_service.execute_query(sql_query, [user_id])
+    # Execute the query, unless it already ran earlier in this call
+    query_key = (sql_query, tuple(params), columnar)
+    query_result = call_sessions.cached_data(session, query_key)
+    if query_result is None:
+        try:
+            query_result = await execute_coalesced(sql_query, params, columnar)
+        except Exception:
+            ai_service.forget_sql(question, user_type, sql_query)
+            raise
+        call_sessions.remember_data(session, query_key, query_result)
     
     # Generate natural language response
     response_text = ai_service.generate_response(
         question=question,
         data=query_result,
         user_name=user_name,
-        user_type=user_type
+        user_type=user_type,
+        intent=intent
     )
     
     return {
@@ -322,15 +702,54 @@ async def process_business_query(question: str, user_id: str, user_type: str, us
         "sql": sql_query
     }
 
-async def broadcast_query_result(data: Dict[str, Any]):
-    """Broadcast query results to all connected WebSocket clients"""
-    if active_connections:
-        message = json.dumps(data)
-        for connection in active_connections.copy():
-            try:
-                await connection.send_text(message)
-            except:
-                active_connections.remove(connection)
+async def execute_coalesced(sql_query: str, params: List[Any], columnar: bool = False) -> QueryData:
+    """Run a query, joining an identical one (same SQL, parameters and format) that is already running"""
+    return await query_flight.run(
+        (sql_query, tuple(params), columnar),
+        db_service.execute_query, sql_query, params, cache=True, columnar=columnar
+    )
+
+def format_result_data(data: Optional[QueryData], result_format: str) -> Any:
+    """Query data as JSON in the requested format: row dicts, or {"columns", "types", "values", "row_count"}"""
+    if result_format == "columnar":
+        columnar = as_columnar(data)
+        return columnar.to_dict() if columnar is not None else None
+    return as_rows(data)
+
+def handle_ws_message(subscriber: Subscriber, text: str) -> Dict[str, Any]:
+    """Apply a /ws client message and return the reply"""
+    try:
+        message = loads(text)
+    except ValueError:
+        message = None
+    if not isinstance(message, dict):
+        return {"type": "error", "message": "Expected a JSON object with an \"action\""}
+    
+    action = message.get("action")
+    if action == "subscribe":
+        subscription = Subscription.from_message(message)
+        broadcast_hub.subscribe(subscriber, subscription)
+        return {"type": "subscribed", "filters": subscription.to_dict()}
+    if action == "unsubscribe":
+        broadcast_hub.subscribe(subscriber, None)
+        return {"type": "unsubscribed"}
+    if action == "ping":
+        return {"type": "pong"}
+    return {"type": "error", "message": f"Unknown action: {action}"}
+
+@timed("broadcast")
+def broadcast_query_result(data: Dict[str, Any]):
+    """Broadcast query results to the WebSocket clients subscribed to them
+    
+    Only queues the message - each client's writer task sends it, so a slow
+    dashboard never delays the caller's response.
+    """
+    user_id = (data.get("user") or {}).get("user_id")
+    broadcast_hub.publish(data, topics={
+        "type": data.get("type"),
+        "user_id": user_id,
+        "team_id": db_service.team_of(user_id)
+    })
 
 @app.get("/analytics/dashboard")
 async def analytics_dashboard():
@@ -403,17 +822,26 @@ async def elevenlabs_conversation_initiation(request: Request):
         }
 
 @app.get("/api/chatbase/query")
-async def chatbase_query(agent_id: str, user_type: str, question: str):
+async def chatbase_query(agent_id: str, user_type: str, question: str, conversation_id: Optional[str] = None,
+                         result_format: str = "rows", debug: bool = False):
     """
     ElevenLabs webhook endpoint for agent data queries
     This matches the format expected by the ElevenLabs agent configuration
+    (result_format="columnar" returns data as column arrays)
     """
     try:
         log.info(f"Chatbase query - agent_id: {agent_id}, user_type: {user_type}, question: {question}")
         
         # Process the query through our existing text query logic
-        # Look up user information
-        user_info = await db_service.get_user_info(agent_id)
+        # Look up user information (once per conversation when a conversation id is sent)
+        session = call_sessions.get(conversation_id, owner=str(agent_id))
+        if session:
+            user_info = {"user_id": session.user_id, "name": session.user_name}
+        else:
+            user_info = await db_service.get_user_info(agent_id)
+            if user_info:
+                session = call_sessions.start(conversation_id, agent_id, user_type, user_info.get("name", "Agent"),
+                                              owner=str(agent_id))
         if not user_info:
             return {
                 "success": False,
@@ -421,37 +849,37 @@ async def chatbase_query(agent_id: str, user_type: str, question: str):
                 "response": "I couldn't find your information in the system."
             }
         
-        # Generate SQL query from the natural language question
-        sql_query = await ai_service.generate_sql_query(question, user_type, agent_id)
-        if not sql_query:
+        # Same path as the phone handlers - rollups, then queries already run in this conversation, then SQL
+        result = await process_business_query(
+            question=question,
+            user_id=agent_id,
+            user_type=user_type,
+            user_name=user_info.get("name", "Agent"),
+            session=session,
+            columnar=result_format == "columnar"
+        )
+        if "sql" not in result:
+            # Only the couldn't-understand answer comes back without SQL
             return {
                 "success": False,
                 "message": "Could not understand the question",
-                "response": "I'm sorry, I couldn't understand your question. Could you try rephrasing it?"
+                "response": result["response"]
             }
         
-        # Execute the query
-        query_result = await db_service.execute_query(sql_query, [agent_id])
-        
-        # Generate natural language response
-        response_text = ai_service.generate_response(
-            question,
-            query_result,
-            user_info.get("name", "Agent"),
-            user_type
-        )
-        
         # Return in the format expected by ElevenLabs
-        return {
+        content = {
             "success": True,
-            "response": response_text,
-            "data": query_result,
+            "response": result["response"],
+            "data": format_result_data(result.get("data"), result_format),
             "user": {
                 "user_id": user_info.get("id"),
                 "name": user_info.get("name"),
                 "user_type": user_type
             }
         }
+        if debug and current_trace() is not None:
+            content["timing"] = current_trace().summary()
+        return FastJSONResponse(content)
         
     except Exception as e:
         log.error(f"Chatbase query error: {e}")
@@ -536,12 +964,14 @@ async def twilio_process_speech(request: Request):
 </Response>'''
             return PlainTextResponse(twiml_response, media_type="application/xml")
         
-        # Try to identify the user from their voice input or phone number
-        user_id = None
-        caller_name = "Real Estate Agent"
+        # Later turns of the same call reuse the caller identified on the first one
+        # (bound to the calling number, so a CallSid alone cannot resume someone else's call)
+        session = call_sessions.get(call_sid, owner=from_number)
+        user_id = session.user_id if session else None
+        caller_name = session.user_name if session else "Real Estate Agent"
         
         # Check if user provided agent ID in speech
-        if "agent id" in speech_result.lower() or "my id" in speech_result.lower():
+        if not user_id and ("agent id" in speech_result.lower() or "my id" in speech_result.lower()):
             import re
             id_match = re.search(r'\b(\d{6})\b', speech_result)
             if id_match:
@@ -569,13 +999,17 @@ async def twilio_process_speech(request: Request):
 </Response>'''
             return PlainTextResponse(twiml_response, media_type="application/xml")
         
+        if not session:
+            session = call_sessions.start(call_sid, user_id, "agent", caller_name, owner=from_number)
+        
         # Process the business query
         try:
             result = await process_business_query(
                 question=speech_result,
                 user_id=user_id,
                 user_type="agent",
-                user_name=caller_name
+                user_name=caller_name,
+                session=session
             )
             
             response_text = result.get("response", "I'm sorry, I couldn't process your request.")
@@ -655,11 +1089,15 @@ async def twilio_process_speech(request: Request):
             )
             return PlainTextResponse(twiml, media_type="application/xml")
         
-        # Identify the user
-        user_info = await auth_service.identify_user(
-            caller_id=caller_number,
-            transcript=speech_result
-        )
+        # Identify the user (once per call)
+        session = call_sessions.get(call_sid, owner=caller_number)
+        if session:
+            user_info = {"user_id": session.user_id, "user_type": session.user_type, "name": session.user_name}
+        else:
+            user_info = await auth_service.identify_user(
+                caller_id=caller_number,
+                transcript=speech_result
+            )
         
         if not user_info:
             # User not identified
@@ -669,12 +1107,17 @@ async def twilio_process_speech(request: Request):
             )
             return PlainTextResponse(twiml, media_type="application/xml")
         
+        if not session:
+            session = call_sessions.start(call_sid, user_info['user_id'], user_info['user_type'], user_info['name'],
+                                          owner=caller_number)
+        
         # Process the business query
         result = await process_business_query(
             question=speech_result,
             user_id=user_info['user_id'],
             user_type=user_info['user_type'],
-            user_name=user_info['name']
+            user_name=user_info['name'],
+            session=session
         )
         
         # Create voice response
@@ -754,6 +1197,7 @@ async def twilio_health():
     }
 
 @app.post("/debug/test-user-types")
+@with_timing
 async def debug_test_user_types():
     """Debug endpoint to test specific user types with known IDs"""
     try:
@@ -795,13 +1239,16 @@ async def debug_test_user_types():
         
         results = []
         
+        # One round trip for every test user's profile
+        profiles = await db_service.get_users_info([test_user["user_id"] for test_user in test_users])
+        
         for test_user in test_users:
             user_id = test_user["user_id"]
             result = {"user_id": user_id, "description": test_user["description"]}
             
             try:
                 # Test user lookup
-                user_info = await db_service.get_user_info(user_id)
+                user_info = profiles.get(user_id)
                 if not user_info:
                     result["error"] = f"User {user_id} not found"
                     result["status"] = "failed"
@@ -820,23 +1267,25 @@ async def debug_test_user_types():
                     question = "Show me system statistics"
                 
                 # Generate SQL query
-                sql_query = await ai_service.generate_sql_query(
+                prepared = await ai_service.prepare_query(
                     question=question,
                     user_type=user_info.get("user_type", "agent"),
                     user_id=user_id
                 )
                 
-                if not sql_query:
+                if not prepared:
                     result["error"] = "SQL generation failed"
                     result["status"] = "failed"
                     results.append(result)
                     continue
+                sql_query, params = prepared
                 
                 result["sql_query"] = sql_query
+                result["sql_params"] = [str(p) for p in params]
                 result["test_question"] = question
                 
                 # Execute query
-                query_result = await db_service.execute_query(sql_query, [user_id])
+                query_result = await db_service.execute_query(sql_query, params)
                 result["query_result"] = query_result
                 result["data_count"] = len(query_result) if query_result else 0
                 
@@ -879,6 +1328,7 @@ async def debug_test_user_types():
         }
 
 @app.post("/debug/test-query")
+@with_timing
 async def debug_test_query():
     """Debug endpoint to test individual components"""
     try:
@@ -955,17 +1405,18 @@ async def debug_test_query():
         
         # Test 2: AI service SQL generation
         question = "What is my total income this year?"
-        sql_query = await ai_service.generate_sql_query(
+        prepared = await ai_service.prepare_query(
             question=question,
             user_type="agent",
             user_id=first_agent
         )
-        if not sql_query:
+        if not prepared:
             return {"error": "SQL generation failed", "step": "sql_generation", "user_info": user_info}
+        sql_query, params = prepared
         
         # Test 3: Database query execution
         try:
-            query_result = await db_service.execute_query(sql_query, [first_agent])
+            query_result = await db_service.execute_query(sql_query, params)
         except Exception as e:
             return {
                 "error": f"Database query failed: {str(e)}", 
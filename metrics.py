@@ -0,0 +1,220 @@
+"""
+Metrics for Jen AI Assistant
+Per-stage latency spans, histograms and Prometheus text exposition
+"""
+
+import time
+import asyncio
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+log = logging.getLogger("jen.metrics")
+
+# Seconds - from in-memory lookups (sub-millisecond) up to slow LLM and TTS calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_METRIC = "jen_stage_duration_seconds"
+REQUEST_METRIC = "jen_request_duration_seconds"
+UNMATCHED_PATH = "unmatched"
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+    
+    __slots__ = ("buckets", "counts", "count", "total", "_lock")
+    
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+    
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """Cumulative bucket counts, total count and sum"""
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.total
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, count, total
+
+class MetricsRegistry:
+    """Histograms keyed by metric name and label values"""
+    
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._help: Dict[str, str] = {
+            STAGE_METRIC: "Time spent in each query pipeline stage",
+            REQUEST_METRIC: "HTTP request duration by path"
+        }
+        self._lock = threading.Lock()
+    
+    def observe(self, name: str, labels: Dict[str, str], value: float):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        histogram.observe(value)
+    
+    def summary(self, name: str = STAGE_METRIC) -> Dict[str, Dict[str, Any]]:
+        """count / average per label set, for /health-style JSON"""
+        result = {}
+        for (metric, labels), histogram in sorted(self._histograms.items()):
+            if metric != name:
+                continue
+            _, count, total = histogram.snapshot()
+            label = ",".join(value for _, value in labels)
+            result[label] = {"count": count, "avg_ms": round(total / count * 1000, 2) if count else 0.0}
+        return result
+    
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        described = set()
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative, count, total = histogram.snapshot()
+            base = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+            prefix = f"{base}," if base else ""
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {value}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{base}}} {total:.6f}" if base else f"{name}_sum {total:.6f}")
+            lines.append(f"{name}_count{{{base}}} {count}" if base else f"{name}_count {count}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+metrics = MetricsRegistry()
+
+class Trace:
+    """Stage spans recorded while handling one request
+    
+    Spans from DB worker threads land here too (DatabaseService.run copies
+    the request's context into the worker).
+    """
+    
+    __slots__ = ("started", "spans")
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+    
+    def stages(self) -> Dict[str, float]:
+        """Milliseconds per stage, summed over repeated spans"""
+        totals: Dict[str, float] = {}
+        for stage, seconds in list(self.spans):
+            totals[stage] = totals.get(stage, 0.0) + seconds * 1000
+        return {stage: round(ms, 2) for stage, ms in totals.items()}
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages_ms": self.stages(),
+            "spans": len(self.spans)
+        }
+    
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. 'llm;dur=812.4, db_execute;dur=35.1'"""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.stages().items())
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("jen_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def record(stage: str, seconds: float):
+    """Record a finished stage in its histogram and the current request's trace"""
+    metrics.observe(STAGE_METRIC, {"stage": stage}, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append((stage, seconds))
+
+@contextmanager
+def span(stage: str):
+    """Time a block as one pipeline stage
+    
+        with span("db_execute"):
+            cursor.execute(sql)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+def timed(stage: str) -> Callable:
+    """Decorator form of span() for plain and async functions"""
+    def decorate(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class TimingMiddleware:
+    """ASGI middleware giving every HTTP request a Trace
+    
+    Records the request duration per route template ("/voice/audio/{ticket}",
+    not the concrete path, with every unrouted request under "unmatched") so
+    label cardinality stays bounded, and adds a Server-Timing header with the
+    stage breakdown.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        trace = Trace()
+        token = _current_trace.set(trace)
+        status = 500
+        
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = trace.server_timing()
+                if timing:
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", timing.encode("latin-1"))]}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            # The router leaves the matched route in the (shared) scope
+            path = getattr(scope.get("route"), "path", None) or UNMATCHED_PATH
+            metrics.observe(REQUEST_METRIC, {"path": path, "method": scope.get("method", "")},
+                            time.perf_counter() - trace.started)
@@ -0,0 +1,215 @@
+"""
+Name Index for Jen AI Assistant
+In-memory fuzzy lookup of spoken agent names (trigrams plus a phonetic key)
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Any, Optional, List, Set, Tuple
+
+log = logging.getLogger("jen.name_index")
+
+_NON_LETTERS = re.compile(r"[^a-z ]+")
+
+# Spellings that sound alike, rewritten before vowels are reduced (order matters)
+_PHONETIC_RULES = [
+    (re.compile(r"^kn|^gn|^pn|^wr"), lambda m: m.group(0)[1]),
+    (re.compile(r"^x"), lambda m: "s"),
+    (re.compile(r"ph"), lambda m: "f"),
+    (re.compile(r"sch"), lambda m: "sk"),
+    (re.compile(r"ch|sh"), lambda m: "x"),
+    (re.compile(r"ck|q"), lambda m: "k"),
+    (re.compile(r"c(?=[eiy])"), lambda m: "s"),
+    (re.compile(r"c"), lambda m: "k"),
+    (re.compile(r"dg(?=[eiy])"), lambda m: "j"),
+    (re.compile(r"g(?=[eiy])"), lambda m: "j"),
+    (re.compile(r"gh(?![aeiou])"), lambda m: ""),
+    (re.compile(r"x"), lambda m: "ks"),
+    (re.compile(r"z"), lambda m: "s"),
+    (re.compile(r"th"), lambda m: "0"),
+    (re.compile(r"(?<=[^aeiou])h|h(?![aeiou])"), lambda m: ""),
+    (re.compile(r"w(?![aeiou])"), lambda m: ""),
+    (re.compile(r"(?<=.)y"), lambda m: "i"),
+    (re.compile(r"v"), lambda m: "f"),
+    # Silent final e ("Jane", "Katherine")
+    (re.compile(r"(?<=[^aeiou])e$"), lambda m: "")
+]
+
+# Per-word score for a name that only sounds like the spoken word - it still
+# counts, but ranks below every trigram or exact match
+SOUND_ONLY_SCORE = 0.4
+# Sounding alike lifts a trigram match to at least this
+SOUND_AND_SPELLING_SCORE = 0.8
+
+def normalize_name(name: str) -> str:
+    return " ".join(_NON_LETTERS.sub(" ", name.lower()).split())
+
+def phonetic_key(word: str) -> str:
+    """Metaphone-style sound key - "Katherine"/"Catherine" and "Jon"/"John" collide
+    
+    A simplified subset of Metaphone: similar-sounding consonant spellings
+    are unified and repeated letters collapse. Vowels are kept (a run of
+    them keeps its first), so "Jane" and "John" stay apart.
+    """
+    word = _NON_LETTERS.sub("", word.lower())
+    if not word:
+        return ""
+    for pattern, replace in _PHONETIC_RULES:
+        word = pattern.sub(replace, word)
+    if not word:
+        return ""
+    key = word[0]
+    for char in word[1:]:
+        if char == key[-1] or (char in "aeiou" and key[-1] in "aeiou"):
+            continue
+        key += char
+    return key
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """Ranked fuzzy search over active users' names
+    
+    Each spoken word is matched against the vocabulary of distinct first and
+    last names - exactly, by trigram (Dice) similarity, or, ranked below
+    those, because it sounds the same. Users whose names match every spoken
+    word are ranked by the average match; an exact full-name match always
+    ranks first.
+    """
+    
+    def __init__(self, min_score: float = 0.5, min_word_score: float = 0.4, min_margin: float = 0.1):
+        self.min_score = min_score
+        self.min_word_score = min_word_score
+        self.min_margin = min_margin
+        self._users: List[Dict[str, Any]] = []
+        self._full_names: List[str] = []
+        # Distinct name word -> users whose first or last name contains it
+        self._word_users: Dict[str, List[int]] = {}
+        self._word_grams: Dict[str, Set[str]] = {}
+        self._by_trigram: Dict[str, List[str]] = {}
+        self._by_sound: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self.loaded_at = 0.0
+        self._stats = {"searches": 0, "matches": 0, "ambiguous": 0, "loads": 0}
+    
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at > 0
+    
+    def load(self, users: List[Dict[str, Any]]):
+        """Replace the index with these users (must carry F_NAME and L_NAME)"""
+        full_names = []
+        word_users: Dict[str, List[int]] = {}
+        for position, user in enumerate(users):
+            full = normalize_name(f"{user.get('F_NAME') or ''} {user.get('L_NAME') or ''}")
+            full_names.append(full)
+            for word in set(full.split()):
+                word_users.setdefault(word, []).append(position)
+        
+        word_grams = {word: trigrams(word) for word in word_users}
+        by_trigram: Dict[str, List[str]] = {}
+        by_sound: Dict[str, List[str]] = {}
+        for word, grams in word_grams.items():
+            for gram in grams:
+                by_trigram.setdefault(gram, []).append(word)
+            by_sound.setdefault(phonetic_key(word), []).append(word)
+        
+        with self._lock:
+            self._users = list(users)
+            self._full_names = full_names
+            self._word_users = word_users
+            self._word_grams = word_grams
+            self._by_trigram = by_trigram
+            self._by_sound = by_sound
+            self.loaded_at = time.time()
+            self._stats["loads"] += 1
+    
+    def _similar_words(self, word: str) -> Dict[str, float]:
+        """Vocabulary words resembling a spoken word, with a 0..1 similarity"""
+        grams = trigrams(word)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._by_trigram.get(gram, ()))
+        similar = {}
+        for candidate, count in shared.items():
+            score = 2.0 * count / (len(grams) + len(self._word_grams[candidate]))
+            if score >= self.min_word_score:
+                similar[candidate] = score
+        # Sounding alike strengthens a trigram match; on its own it is the weakest match that counts
+        for candidate in self._by_sound.get(phonetic_key(word), ()):
+            if candidate in similar:
+                similar[candidate] = max(similar[candidate], SOUND_AND_SPELLING_SCORE)
+            else:
+                similar[candidate] = SOUND_ONLY_SCORE
+        if word in self._word_users:
+            similar[word] = 1.0
+        return similar
+    
+    def search(self, name: str, limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        """Best matching users for a (possibly misheard) name, highest score first"""
+        query = normalize_name(name)
+        if not query:
+            return []
+        words = query.split()
+        
+        with self._lock:
+            users, full_names, word_users = self._users, self._full_names, self._word_users
+            self._stats["searches"] += 1
+            matches = [self._similar_words(word) for word in words]
+        
+        # Each spoken word contributes its best match among the user's names
+        best: Dict[int, List[float]] = {}
+        for index, similar in enumerate(matches):
+            for candidate, score in similar.items():
+                for position in word_users[candidate]:
+                    scores = best.setdefault(position, [0.0] * len(words))
+                    if score > scores[index]:
+                        scores[index] = score
+        
+        scored = []
+        for position, scores in best.items():
+            # Every spoken word must match one of the user's names
+            if min(scores) < self.min_word_score:
+                continue
+            score = sum(scores) / len(words)
+            if full_names[position] == query:
+                score += 1.0
+            if score >= self.min_score:
+                scored.append((score, position))
+        
+        scored.sort(key=lambda item: -item[0])
+        results = [(round(score, 4), users[position]) for score, position in scored[:limit]]
+        if results:
+            with self._lock:
+                self._stats["matches"] += 1
+        return results
+    
+    def identify(self, name: str) -> Optional[Dict[str, Any]]:
+        """The one user a spoken name clearly refers to
+        
+        None when nothing matches or the runner-up scores within min_margin
+        of the best match - the caller is then asked for their agent ID
+        rather than risk identifying them as someone else.
+        """
+        candidates = self.search(name, limit=2)
+        if not candidates:
+            return None
+        if len(candidates) > 1 and candidates[0][0] - candidates[1][0] < self.min_margin:
+            with self._lock:
+                self._stats["ambiguous"] += 1
+            return None
+        return candidates[0][1]
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "users": len(self._users),
+                "words": len(self._word_users),
+                "age_seconds": round(time.time() - self.loaded_at, 1) if self.ready else None
+            }
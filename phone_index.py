@@ -0,0 +1,125 @@
+"""
+Phone Index for Jen AI Assistant
+In-memory phone number -> user directory for caller identification
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+log = logging.getLogger("jen.phone_index")
+
+_NON_DIGITS = re.compile(r"\D")
+
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    """E.164 digits without the "+" - US numbers gain their leading 1
+    
+    "(555) 123-4567", "555-123-4567" and "+1 555 123 4567" all become
+    "15551234567". Returns None for values too short to be a phone number.
+    """
+    if not value:
+        return None
+    digits = _NON_DIGITS.sub("", str(value))
+    if len(digits) == 10:
+        digits = "1" + digits
+    return digits if len(digits) >= 7 else None
+
+class PhoneIndex:
+    """Normalized phone number -> user record, plus a negative cache of unknown numbers
+    
+    A full load replaces the directory atomically; incremental loads add
+    users created since (User_ID above the highest one seen). Numbers that
+    missed both the index and the database are remembered for
+    negative_ttl_seconds so repeat calls from them skip the database too.
+    """
+    
+    def __init__(self, negative_ttl_seconds: float = 600.0, max_negative: int = 10000):
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_negative = max_negative
+        
+        self._numbers: Dict[str, Dict[str, Any]] = {}
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_user_id = 0
+        self.loaded_at = 0.0
+        self._stats = {"hits": 0, "misses": 0, "negative_hits": 0, "db_hits": 0, "full_loads": 0, "incremental_loads": 0}
+    
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at > 0
+    
+    def load(self, rows: List[Dict[str, Any]], full: bool):
+        """Index user rows (id, name, phone, cell, email)"""
+        numbers = {} if full else dict(self._numbers)
+        max_user_id = 0 if full else self.max_user_id
+        for row in rows:
+            user = {key: row.get(key) for key in ("id", "name", "phone", "cell", "email")}
+            for column in ("phone", "cell"):
+                number = normalize_phone(row.get(column))
+                if number:
+                    # Shared numbers resolve to the earliest account, as before
+                    numbers.setdefault(number, user)
+            try:
+                max_user_id = max(max_user_id, int(row["id"]))
+            except (TypeError, ValueError):
+                pass
+        
+        with self._lock:
+            self._numbers = numbers
+            self.max_user_id = max_user_id
+            self.loaded_at = time.time()
+            # Newly indexed numbers must not stay negatively cached
+            for number in [n for n in self._negative if n in numbers]:
+                del self._negative[number]
+            self._stats["full_loads" if full else "incremental_loads"] += 1
+    
+    def lookup(self, phone: str) -> Optional[Dict[str, Any]]:
+        """The user for a number, if indexed"""
+        number = normalize_phone(phone)
+        user = self._numbers.get(number) if number else None
+        with self._lock:
+            self._stats["hits" if user else "misses"] += 1
+        return dict(user) if user else None
+    
+    def is_unknown(self, phone: str) -> bool:
+        """Whether the number recently missed both the index and the database"""
+        number = normalize_phone(phone)
+        if not number:
+            return False
+        with self._lock:
+            expires = self._negative.get(number)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self._negative[number]
+                return False
+            self._stats["negative_hits"] += 1
+            return True
+    
+    def remember(self, phone: str, user: Optional[Dict[str, Any]]):
+        """Record a database fallback result - the user, or None for an unknown number"""
+        number = normalize_phone(phone)
+        if not number:
+            return
+        with self._lock:
+            if user:
+                self._stats["db_hits"] += 1
+                self._numbers[number] = dict(user)
+                self._negative.pop(number, None)
+                return
+            self._negative[number] = time.time() + self.negative_ttl_seconds
+            self._negative.move_to_end(number)
+            while len(self._negative) > self.max_negative:
+                self._negative.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "numbers": len(self._numbers),
+                "unknown_numbers": len(self._negative),
+                "age_seconds": round(time.time() - self.loaded_at, 1) if self.ready else None
+            }
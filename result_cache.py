@@ -0,0 +1,122 @@
+"""
+Result Cache for Jen AI Assistant
+Keeps query results in memory until their TTL passes or the payroll data changes
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple, Hashable
+
+log = logging.getLogger("jen.result_cache")
+
+# Cheap change detector for payroll_Queue_Archive: new wires move the max date or the row count.
+# MAX(Wire_Date) is one seek on a Wire_Date index, and the row count comes from partition
+# metadata (heap or clustered index) rather than COUNT_BIG(*), which scans the whole table.
+DEFAULT_WATERMARK_SQL = """
+SELECT
+    (SELECT MAX(Wire_Date) FROM payroll_Queue_Archive) AS wire_date,
+    (SELECT SUM(p.rows) FROM sys.partitions p
+     WHERE p.object_id = OBJECT_ID('payroll_Queue_Archive') AND p.index_id IN (0, 1)) AS row_count
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_sql(sql: str) -> str:
+    """Collapse formatting differences so equivalent SQL text shares a key"""
+    return _WHITESPACE.sub(" ", sql).strip().rstrip(";").strip()
+
+class ResultCache:
+    """(normalized SQL, params) -> rows (dicts or a ColumnarResult), with TTL and LRU eviction
+    
+    Every entry records the data watermark it was computed under. Once the
+    watermark moves (new wires posted) all older entries are dropped. While
+    the watermark is unknown - probe not run yet, or failing - nothing is
+    cached, so results are never served on TTL alone. Cached rows are shared
+    between callers and must be treated as read-only.
+    """
+    
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        self._entries: "OrderedDict[Tuple[str, Tuple[Any, ...]], Tuple[float, Hashable, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._watermark: Optional[Hashable] = None
+        self._watermark_checked = 0.0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+    
+    @staticmethod
+    def key(sql: str, params: Optional[List[Any]]) -> Tuple[str, Tuple[Any, ...]]:
+        return normalize_sql(sql), tuple(params or ())
+    
+    def get(self, sql: str, params: Optional[List[Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Cached rows for this query, if still valid"""
+        key = self.key(sql, params)
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or self._watermark is None:
+                self._stats["misses"] += 1
+                return None
+            created, watermark, rows = item
+            if watermark != self._watermark or now - created > self.ttl_seconds:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return rows
+    
+    def put(self, sql: str, params: Optional[List[Any]], rows: List[Dict[str, Any]],
+            watermark: Optional[Hashable]):
+        """Store rows computed under watermark (read before the query started)"""
+        key = self.key(sql, params)
+        with self._lock:
+            # A result computed before the data changed must not be stored under the new watermark
+            if watermark is None or watermark != self._watermark:
+                return
+            self._entries[key] = (time.time(), watermark, rows)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    @property
+    def watermark(self) -> Optional[Hashable]:
+        return self._watermark
+    
+    def set_watermark(self, watermark: Optional[Hashable]):
+        """Record the latest probe result, dropping every entry if the data changed
+        
+        Passing None (probe failed) disables the cache until the next success.
+        """
+        with self._lock:
+            self._watermark_checked = time.time()
+            if watermark == self._watermark:
+                return
+            if self._entries:
+                log.info(f"Payroll watermark moved to {watermark} - dropping {len(self._entries)} cached results")
+                self._stats["invalidations"] += 1
+            self._entries.clear()
+            self._watermark = watermark
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, size and current watermark"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "watermark": str(self._watermark) if self._watermark is not None else None,
+                "watermark_age_seconds": round(time.time() - self._watermark_checked, 1) if self._watermark_checked else None
+            }
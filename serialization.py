@@ -0,0 +1,40 @@
+"""
+Serialization for Jen AI Assistant
+One orjson-backed JSON encoder for API responses and WebSocket broadcasts
+"""
+
+import logging
+from decimal import Decimal
+from typing import Any
+
+import orjson
+
+from columnar_result import ColumnarResult
+
+log = logging.getLogger("jen.serialization")
+
+# Stats dicts can be keyed by ints; datetimes/dates/UUIDs are handled by orjson itself
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def _default(value: Any) -> Any:
+    """Types orjson doesn't know: Decimal rows, columnar results, sets"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, ColumnarResult):
+        return value.to_dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "dict"):
+        return value.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(value: Any) -> bytes:
+    """Encode to compact UTF-8 JSON"""
+    return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+def dumps_text(value: Any) -> str:
+    """Encode to a JSON string (for WebSocket text frames)"""
+    return dumps(value).decode("utf-8")
+
+def loads(data: Any) -> Any:
+    return orjson.loads(data)
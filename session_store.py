@@ -0,0 +1,156 @@
+"""
+Session Store for Jen AI Assistant
+Remembers who is on a call (CallSid / conversation id) so later turns skip identification
+"""
+
+import time
+import logging
+import secrets
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, Hashable
+
+log = logging.getLogger("jen.sessions")
+
+class CallSession:
+    """State for one call or conversation
+    
+    owner is what the session is bound to (the caller's number, or the user
+    id a webhook authenticated); a request for another owner never resumes it.
+    """
+    
+    __slots__ = ("session_id", "user_id", "user_type", "user_name", "owner", "intents", "results",
+                 "turns", "created", "last_seen")
+    
+    def __init__(self, session_id: str, user_id: str, user_type: str, user_name: str,
+                 owner: Optional[str] = None, max_intents: int = 20):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.user_type = user_type
+        self.user_name = user_name
+        self.owner = owner
+        self.intents: "deque[Optional[str]]" = deque(maxlen=max_intents)
+        # resolved query (SQL, parameters, format) -> its data, most recent last
+        self.results: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.turns = 0
+        self.created = time.time()
+        self.last_seen = self.created
+    
+    def cached_data(self, query_key: Hashable) -> Optional[Any]:
+        """Data already fetched in this call for the same resolved query"""
+        return self.results.get(query_key)
+    
+    def remember(self, intent: Optional[str]):
+        """Record a turn"""
+        self.turns += 1
+        self.intents.append(intent)
+    
+    def remember_data(self, query_key: Hashable, data: Any, max_results: int = 10):
+        """Keep a query's data so the same query later in the call skips the database"""
+        self.results[query_key] = data
+        self.results.move_to_end(query_key)
+        while len(self.results) > max_results:
+            self.results.popitem(last=False)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "user_type": self.user_type,
+            "user_name": self.user_name,
+            "turns": self.turns,
+            "intents": list(self.intents),
+            "age_seconds": round(time.time() - self.created, 1)
+        }
+
+class SessionStore:
+    """session id -> CallSession with idle expiry and a cap on live sessions
+    
+    Sessions are kept in least-recently-used order, so expired ones are
+    swept from the front and the oldest is dropped once max_sessions is hit.
+    """
+    
+    def __init__(self, idle_seconds: float = 900.0, max_sessions: int = 2000,
+                 max_results_per_session: int = 10):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.max_results_per_session = max_results_per_session
+        self._sessions: "OrderedDict[str, CallSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "resumed": 0, "expired": 0, "evicted": 0, "result_hits": 0}
+    
+    @staticmethod
+    def new_id() -> str:
+        """An unguessable id for a session the server starts itself"""
+        return secrets.token_urlsafe(18)
+    
+    def get(self, session_id: Optional[str], owner: Optional[str] = None) -> Optional[CallSession]:
+        """The live session for this id and owner, refreshing its idle timer"""
+        if not session_id:
+            return None
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            self._stats["resumed"] += 1
+            return session
+    
+    def start(self, session_id: Optional[str], user_id: str, user_type: str, user_name: str,
+              owner: Optional[str] = None) -> Optional[CallSession]:
+        """Record the identified caller for a session
+        
+        A live session with the same id but another owner is left alone and
+        None is returned, so one caller cannot take over another's session.
+        """
+        if not session_id:
+            return None
+        session = CallSession(session_id, str(user_id), user_type, user_name, owner)
+        with self._lock:
+            self._sweep(session.created)
+            current = self._sessions.get(session_id)
+            if current is not None and current.owner != owner:
+                return None
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._stats["started"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evicted"] += 1
+        return session
+    
+    def end(self, session_id: Optional[str]):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def cached_data(self, session: Optional[CallSession], query_key: Hashable) -> Optional[Any]:
+        if session is None:
+            return None
+        data = session.cached_data(query_key)
+        if data is not None:
+            with self._lock:
+                self._stats["result_hits"] += 1
+        return data
+    
+    def remember(self, session: Optional[CallSession], intent: Optional[str]):
+        if session is not None:
+            session.remember(intent)
+    
+    def remember_data(self, session: Optional[CallSession], query_key: Hashable, data: Any):
+        if session is not None and data is not None:
+            session.remember_data(query_key, data, self.max_results_per_session)
+    
+    def _sweep(self, now: float):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.idle_seconds:
+                break
+            del self._sessions[session_id]
+            self._stats["expired"] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "active": len(self._sessions)}
@@ -0,0 +1,54 @@
+"""
+Single-Flight Coalescing for Jen AI Assistant
+Concurrent identical requests share one in-flight call instead of each running their own
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Hashable, Callable, Awaitable
+
+log = logging.getLogger("jen.single_flight")
+
+class SingleFlight:
+    """Runs at most one call per key at a time and fans its result out to every waiter
+    
+    The first caller for a key starts the work as a task; callers arriving
+    while it is running await the same task. The task is shielded, so a
+    caller that disconnects does not cancel the work for the others. Results
+    are shared between waiters and must be treated as read-only.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, "asyncio.Task"] = {}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "failures": 0}
+    
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await func(*args, **kwargs), or the identical call already in flight for key"""
+        self._stats["calls"] += 1
+        task = self._calls.get(key)
+        if task is None:
+            self._stats["executions"] += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self._stats["coalesced"] += 1
+            log.debug(f"{self.name}: joined in-flight call")
+        return await asyncio.shield(task)
+    
+    def _finished(self, key: Hashable, task: "asyncio.Task"):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so it is never reported as unhandled when every waiter went away
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["failures"] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Call counters, including how many calls were deduplicated"""
+        calls = self._stats["calls"]
+        return {
+            **self._stats,
+            "in_flight": len(self._calls),
+            "dedup_rate": round(self._stats["coalesced"] / calls, 4) if calls else 0.0
+        }
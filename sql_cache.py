@@ -0,0 +1,323 @@
+"""
+SQL Cache for Jen AI Assistant
+Remembers validated LLM-generated SQL so paraphrased questions skip the LLM
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Set, Tuple
+
+log = logging.getLogger("jen.sql_cache")
+
+# Words that carry no meaning for which query to run
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "am", "do", "does", "did",
+    "i", "me", "my", "mine", "we", "our", "you", "your", "it", "its", "of", "in", "on",
+    "at", "for", "to", "from", "by", "with", "and", "or", "so", "far", "what", "whats",
+    "tell", "show", "give", "can", "could", "would", "please", "jen", "hey", "hi", "hello",
+    "much", "have", "has", "had", "get", "got", "there", "up", "until", "now", "date", "total",
+    "how"
+}
+
+# Spoken variants mapped onto one canonical token
+SYNONYMS = {
+    "earn": "income", "earned": "income", "earning": "income", "earnings": "income",
+    "made": "income", "make": "income", "money": "income", "commission": "income",
+    "commissions": "income", "paid": "income", "pay": "income",
+    "deals": "deal", "transactions": "deal", "transaction": "deal", "closings": "deal",
+    "closed": "deal", "close": "deal", "sales": "deal", "sale": "deal",
+    "agents": "agent", "months": "month", "years": "year",
+    "highest": "best", "top": "best", "biggest": "best",
+    "lowest": "worst", "smallest": "worst",
+    "avg": "average", "mean": "average",
+    "number": "count", "many": "count",
+    "ytd": "this_year", "current": "this"
+}
+
+# Tokens that change the meaning of a query - they must match exactly, never fuzzily
+DISCRIMINATORS = {
+    "this", "last", "next", "previous", "best", "worst", "average", "count",
+    "month", "year", "week", "day", "quarter", "today", "yesterday", "this_year",
+    "last_year", "this_month", "last_month", "@period",
+    "team", "agent", "who", "not", "without", "first", "least"
+}
+
+# Multi-word periods collapsed into single tokens before tokenizing
+PERIOD_PHRASES = [
+    (re.compile(r"\b(?:last|previous) year\b"), " last_year "),
+    (re.compile(r"\b(?:last|previous) month\b"), " last_month "),
+    (re.compile(r"\b(?:this month|month to date)\b"), " this_month "),
+    (re.compile(r"\b(?:this year|year to date)\b"), " this_year ")
+]
+
+PERIOD_TOKENS = {"this_year", "last_year", "this_month", "last_month"}
+
+TOP_N_PHRASE = re.compile(
+    r"\btop\s+(?:\d+|one|two|three|four|five|six|seven|eight|nine|ten)\b"
+    r"|\b(?:\d+|one|two|three|four|five|six|seven|eight|nine|ten)\s+(?=best|top|highest|lowest|worst)"
+)
+
+READ_ONLY_SQL = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|merge|drop|alter|create|truncate|exec|execute|grant|revoke)\b",
+    re.IGNORECASE
+)
+
+def normalize_question(question: str, period_agnostic: bool = False, limit_agnostic: bool = False) -> Tuple[str, ...]:
+    """Reduce a question to a sorted tuple of canonical content tokens
+    
+    With period_agnostic, every reporting period ("this year", "last month",
+    "2024") becomes one "@period" token; with limit_agnostic, "top 3" / "top
+    five" lose their number. Questions that differ only in those parts then
+    share a key.
+    """
+    text = question.lower().replace("'", "")
+    for pattern, replacement in PERIOD_PHRASES:
+        text = pattern.sub(replacement, text)
+    if limit_agnostic:
+        text = TOP_N_PHRASE.sub(" top ", text)
+    words = re.findall(r"[a-z_]+|\d+", text)
+    tokens = set()
+    for word in words:
+        word = SYNONYMS.get(word, word)
+        if word in STOPWORDS:
+            continue
+        tokens.add(word)
+    current_year = time.localtime().tm_year
+    if str(current_year) in tokens:
+        tokens.discard(str(current_year))
+        tokens.add("this_year")
+    if str(current_year - 1) in tokens:
+        tokens.discard(str(current_year - 1))
+        tokens.add("last_year")
+    if period_agnostic:
+        periods = {t for t in tokens if t in PERIOD_TOKENS or (t.isdigit() and len(t) == 4)}
+        if periods:
+            tokens.difference_update(periods)
+            tokens.add("@period")
+    return tuple(sorted(tokens))
+
+def is_cacheable_sql(sql: str, user_id: Optional[str] = None) -> bool:
+    """Only single read-only statements that are not tied to one user may be reused"""
+    if not sql or not READ_ONLY_SQL.match(sql):
+        return False
+    if WRITE_KEYWORDS.search(sql):
+        return False
+    if sql.strip().rstrip(";").count(";"):
+        return False
+    # The user id must be a %s parameter, not a literal baked into the SQL
+    if user_id and re.search(rf"\b{re.escape(str(user_id))}\b", sql):
+        return False
+    return True
+
+# Key variants tried on lookup, most specific first
+KEY_VARIANTS = [(False, False), (True, False), (False, True), (True, True)]
+
+class SemanticSQLCache:
+    """Persistent (question, user_type) -> SQL cache with paraphrase matching
+    
+    Lookups first try the exact normalized token key, then the closest stored
+    question of the same user type by Jaccard similarity (discriminator tokens
+    such as "best"/"worst" or years must match exactly). Entries expire after
+    a TTL and the least recently used entries are evicted beyond max_entries.
+    """
+    
+    def __init__(self, path: Optional[str] = None, max_entries: int = 2000,
+                 ttl_seconds: float = 7 * 24 * 3600, threshold: float = 0.75,
+                 save_interval: float = 30.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.save_interval = save_interval
+        
+        # key: (user_type, tokens) -> {"sql", "question", "created"}
+        self._entries: "OrderedDict[Tuple[str, Tuple[str, ...]], Dict[str, Any]]" = OrderedDict()
+        # (user_type, token) -> keys containing that token, for fuzzy candidate lookup
+        self._index: Dict[Tuple[str, str], Set[Tuple[str, Tuple[str, ...]]]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        self._stats = {"hits": 0, "fuzzy_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+        
+        if self.path:
+            self._load()
+    
+    def get(self, question: str, user_type: str) -> Optional[str]:
+        """Return cached SQL for the question or a close paraphrase of it"""
+        entry = self.lookup(question, user_type)
+        return entry["sql"] if entry else None
+    
+    def lookup(self, question: str, user_type: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for the question or a close paraphrase of it
+        
+        Entries stored period- or limit-agnostic answer the same question for
+        any period or top-N.
+        """
+        keys = []
+        for period_agnostic, limit_agnostic in KEY_VARIANTS:
+            tokens = normalize_question(question, period_agnostic, limit_agnostic)
+            if tokens and (user_type, tokens) not in keys:
+                keys.append((user_type, tokens))
+        if not keys:
+            return None
+        now = time.time()
+        
+        with self._lock:
+            for key in keys:
+                entry = self._live_entry(key, now)
+                if entry:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(entry)
+            
+            for key in keys:
+                match = self._best_match(user_type, key[1], now)
+                if match:
+                    self._entries.move_to_end(match)
+                    self._stats["fuzzy_hits"] += 1
+                    return dict(self._entries[match])
+            
+            self._stats["misses"] += 1
+            return None
+    
+    def put(self, question: str, user_type: str, sql: str,
+            template: Optional[Dict[str, Any]] = None, period_agnostic: bool = False,
+            limit_agnostic: bool = False):
+        """Store SQL (and optionally its parameter template) generated for a question"""
+        tokens = normalize_question(question, period_agnostic, limit_agnostic)
+        if not tokens:
+            return
+        key = (user_type, tokens)
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            entry = {"sql": sql, "question": question, "created": time.time()}
+            if template is not None:
+                entry["template"] = template
+            self._entries[key] = entry
+            for token in tokens:
+                self._index.setdefault((user_type, token), set()).add(key)
+            self._stats["stores"] += 1
+            
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+            self._dirty = True
+        
+        self.maybe_save()
+    
+    def discard(self, question: str, user_type: str, sql: Optional[str] = None):
+        """Drop whichever entry answers this question (e.g. its SQL failed to run)"""
+        now = time.time()
+        with self._lock:
+            for period_agnostic, limit_agnostic in KEY_VARIANTS:
+                tokens = normalize_question(question, period_agnostic, limit_agnostic)
+                key = (user_type, tokens)
+                if key not in self._entries:
+                    key = self._best_match(user_type, tokens, now)
+                if key and (sql is None or self._entries[key]["sql"] == sql):
+                    self._remove(key)
+                    self._dirty = True
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["fuzzy_hits"] + self._stats["misses"]
+            hits = self._stats["hits"] + self._stats["fuzzy_hits"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def maybe_save(self):
+        """Persist to disk if dirty and the save interval has passed"""
+        if self.path and self._dirty and time.time() - self._last_save >= self.save_interval:
+            self.save()
+    
+    def save(self):
+        """Write all live entries to disk atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            payload = [
+                {"user_type": key[0], "tokens": list(key[1]), **entry}
+                for key, entry in self._entries.items()
+            ]
+            self._dirty = False
+            self._last_save = time.time()
+        
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.error(f"Failed to save SQL cache to {self.path}: {e}")
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                payload = json.load(f)
+            now = time.time()
+            for item in payload:
+                if now - item["created"] > self.ttl_seconds:
+                    continue
+                key = (item["user_type"], tuple(item["tokens"]))
+                self._entries[key] = {k: v for k, v in item.items() if k not in ("user_type", "tokens")}
+                for token in key[1]:
+                    self._index.setdefault((key[0], token), set()).add(key)
+            self._last_save = now
+            log.info(f"Loaded {len(self._entries)} cached SQL queries from {self.path}")
+        except Exception as e:
+            log.error(f"Failed to load SQL cache from {self.path}: {e}")
+    
+    def _live_entry(self, key, now: float) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry and now - entry["created"] > self.ttl_seconds:
+            self._remove(key)
+            self._stats["expired"] += 1
+            self._dirty = True
+            return None
+        return entry
+    
+    def _best_match(self, user_type: str, tokens: Tuple[str, ...], now: float):
+        query = set(tokens)
+        required = {t for t in query if t in DISCRIMINATORS or t.isdigit()}
+        candidates = set()
+        for token in query:
+            candidates.update(self._index.get((user_type, token), ()))
+        
+        best_key, best_score = None, 0.0
+        for key in candidates:
+            other = set(key[1])
+            if {t for t in other if t in DISCRIMINATORS or t.isdigit()} != required:
+                continue
+            score = len(query & other) / len(query | other)
+            if score > best_score:
+                best_key, best_score = key, score
+        
+        if best_key is None or best_score < self.threshold:
+            return None
+        if not self._live_entry(best_key, now):
+            return None
+        return best_key
+    
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        for token in key[1]:
+            keys = self._index.get((key[0], token))
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._index[(key[0], token)]
@@ -0,0 +1,256 @@
+"""
+SQL Templates for Jen AI Assistant
+Turns generated SQL into parameterized templates that are reused across users and periods
+"""
+
+import re
+import logging
+from datetime import date, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+
+log = logging.getLogger("jen.sql_templates")
+
+# Slot kinds and the SQL Server type each is declared as in sp_executesql
+SLOT_TYPES = {
+    "user_id": "INT",
+    "date_start": "DATE",
+    "date_end": "DATE",
+    "date_end_exclusive": "DATE",
+    "year": "INT",
+    "top_n": "INT"
+}
+
+PERIOD_SLOTS = {"date_start", "date_end", "date_end_exclusive", "year"}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+}
+
+ID_COLUMN = r"(?:USER_ID|EQUITY_DIVISION_25_ID)"
+DATE_LITERAL = re.compile(r"'(\d{4}-\d{2}-\d{2})(?:[ T][\d:.]+)?'")
+YEAR_LITERAL = re.compile(r"(YEAR\s*\([^()]*\)\s*=\s*)(\d{4})\b", re.IGNORECASE)
+TOP_LITERAL = re.compile(r"\bTOP\s*(?:\(\s*(\d+)\s*\)|(\d+))", re.IGNORECASE)
+STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+
+# Stands in for a slot while a template is built, so % inside string literals is never mistaken for one
+SLOT_MARK = "\x00"
+
+PERIOD_PATTERN = re.compile(
+    r"\b(?:(?P<last_year>(?:last|previous) year)"
+    r"|(?P<last_month>(?:last|previous) month)"
+    r"|(?P<this_month>this month|month to date)"
+    r"|(?P<this_year>this year|year to date|ytd)"
+    r"|(?P<year>(?:19|20)\d{2}))\b"
+)
+
+def extract_period(question: str, today: Optional[date] = None) -> Optional[str]:
+    """Find the time period a question asks about ("this_year", "last_month", "year_2024", ...)"""
+    found = {}
+    for match in PERIOD_PATTERN.finditer(question.lower()):
+        found.setdefault(match.lastgroup, match.group(0))
+    
+    for period in ("last_year", "last_month", "this_month", "this_year"):
+        if period in found:
+            return period
+    
+    if "year" in found:
+        today = today or date.today()
+        year = int(found["year"])
+        return "this_year" if year == today.year else f"year_{year}"
+    
+    return None
+
+def period_range(period: str, today: Optional[date] = None) -> Tuple[date, date]:
+    """Inclusive (start, end) dates for a period"""
+    today = today or date.today()
+    
+    if period == "this_month":
+        start = today.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    if period == "last_month":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    if period == "last_year":
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+    if period.startswith("year_"):
+        year = int(period[5:])
+        return date(year, 1, 1), date(year, 12, 31)
+    return date(today.year, 1, 1), date(today.year, 12, 31)
+
+_NUMBER = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+TOP_N_PATTERN = re.compile(rf"\btop\s+{_NUMBER}\b|\b{_NUMBER}\s+(?:best|top|highest|lowest|worst)\b")
+
+def extract_top_n(question: str) -> Optional[int]:
+    """Read "top 3" / "top five" / "5 best" style limits from a question"""
+    match = TOP_N_PATTERN.search(question.lower())
+    if not match:
+        return None
+    value = match.group(1) or match.group(2)
+    return int(value) if value.isdigit() else NUMBER_WORDS[value]
+
+def _classify_placeholder(prefix: str, previous_kind: Optional[str]) -> str:
+    """Decide what a %s stands for from the SQL text just before it"""
+    tail = prefix[-80:].upper()
+    
+    if re.search(r"\bTOP\s*\(?\s*$", tail):
+        return "top_n"
+    if re.search(ID_COLUMN + r"\s*(=|IN\s*\()\s*$", tail):
+        return "user_id"
+    if re.search(r"YEAR\s*\([^()]*\)\s*=\s*$", tail):
+        return "year"
+    if re.search(r"\bBETWEEN\s*$", tail) or re.search(r">=?\s*$", tail):
+        return "date_start"
+    if re.search(r"\bAND\s*$", tail) and previous_kind == "date_start":
+        return "date_end"
+    if re.search(r"<\s*$", tail):
+        return "date_end_exclusive"
+    if re.search(r"<=\s*$", tail):
+        return "date_end"
+    # Matches the historical behaviour of binding every placeholder to the caller's id
+    return "user_id"
+
+class SQLTemplate:
+    """Parameterized SQL plus the slots needed to bind it for a question
+    
+    The template text uses %s for every slot. The period recorded when the
+    template was built is the default for questions that don't name one.
+    """
+    
+    def __init__(self, sql: str, slots: List[str], period: str = "this_year", top_n: Optional[int] = None):
+        self.sql = sql
+        self.slots = slots
+        self.period = period
+        self.top_n = top_n
+        self._prepared_sql: Optional[str] = None
+    
+    @property
+    def is_periodic(self) -> bool:
+        """Whether the reporting period is a parameter rather than fixed SQL"""
+        return any(slot in PERIOD_SLOTS for slot in self.slots)
+    
+    @property
+    def has_limit(self) -> bool:
+        """Whether the TOP N row limit is a parameter"""
+        return "top_n" in self.slots
+    
+    @property
+    def prepared_sql(self) -> str:
+        """The template wrapped in sp_executesql so SQL Server caches one plan for it"""
+        if self._prepared_sql is None:
+            if not self.slots:
+                self._prepared_sql = self.sql
+            else:
+                body = self.sql.strip().rstrip(";")
+                index = 0
+                
+                def next_param(match):
+                    nonlocal index
+                    name = f"@p{index}"
+                    index += 1
+                    return name
+                
+                body = re.sub(r"%%|%s", lambda m: "%" if m.group(0) == "%%" else next_param(m), body)
+                body = body.replace("'", "''").replace("%", "%%")
+                declarations = ", ".join(f"@p{i} {SLOT_TYPES[slot]}" for i, slot in enumerate(self.slots))
+                assignments = ", ".join(f"@p{i} = %s" for i in range(len(self.slots)))
+                self._prepared_sql = f"EXEC sp_executesql N'{body}', N'{declarations}', {assignments};"
+        return self._prepared_sql
+    
+    def bind(self, question: str, user_id: str, today: Optional[date] = None,
+             slots: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """Parameter values for this question, in placeholder order
+        
+        slots may carry period/top_n already extracted from the question.
+        """
+        if slots is None:
+            slots = {"period": extract_period(question, today), "top_n": extract_top_n(question)}
+        period = slots.get("period") or self.period
+        start, end = period_range(period, today)
+        top_n = slots.get("top_n") or self.top_n or 5
+        
+        values = {
+            "user_id": user_id,
+            "date_start": start,
+            "date_end": end,
+            "date_end_exclusive": end + timedelta(days=1),
+            "year": start.year,
+            "top_n": top_n
+        }
+        return [values[slot] for slot in self.slots]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sql": self.sql, "slots": self.slots, "period": self.period, "top_n": self.top_n}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SQLTemplate":
+        return cls(data["sql"], list(data["slots"]), data.get("period", "this_year"), data.get("top_n"))
+
+def build_template(sql: str, question: str, user_id: Optional[str] = None,
+                   today: Optional[date] = None) -> SQLTemplate:
+    """Lift literals in generated SQL into slots
+    
+    Date and year literals are only parameterized when they exactly match the
+    period the question asked about, so a literal with some other meaning
+    (e.g. "since 2020-01-01") is left in the SQL untouched.
+    """
+    period = extract_period(question, today) or "this_year"
+    start, end = period_range(period, today)
+    top_n = None
+    
+    # Placeholders the SQL already has - a %s inside a string literal (LIKE '%smith%') is text
+    sql = _outside_literals(sql, lambda part: part.replace("%s", SLOT_MARK))
+    
+    # Caller id inlined as a literal
+    if user_id and str(user_id).isdigit():
+        sql = re.sub(
+            rf"({ID_COLUMN}\s*=\s*)'?{re.escape(str(user_id))}\b'?",
+            r"\g<1>" + SLOT_MARK,
+            sql,
+            flags=re.IGNORECASE
+        )
+    
+    # Year literals for the requested period
+    sql = YEAR_LITERAL.sub(lambda m: m.group(1) + SLOT_MARK if int(m.group(2)) == start.year else m.group(0), sql)
+    
+    # Row limits
+    top_match = TOP_LITERAL.search(sql)
+    if top_match:
+        top_n = int(top_match.group(1) or top_match.group(2))
+        sql = sql[:top_match.start()] + f"TOP ({SLOT_MARK})" + sql[top_match.end():]
+    
+    # Date literals that bound the requested period - only lifted as a complete start/end pair
+    expected = {start.isoformat(), end.isoformat(), (end + timedelta(days=1)).isoformat()}
+    dated_sql = DATE_LITERAL.sub(lambda m: SLOT_MARK if m.group(1) in expected else m.group(0), sql)
+    slots = _classify_placeholders(dated_sql)
+    has_start = "date_start" in slots
+    has_end = "date_end" in slots or "date_end_exclusive" in slots
+    if has_start == has_end:
+        sql = dated_sql
+    else:
+        slots = _classify_placeholders(sql)
+    
+    # Literal % (e.g. LIKE patterns) must be escaped once placeholders are bound
+    if slots:
+        sql = sql.replace("%", "%%")
+    sql = sql.replace(SLOT_MARK, "%s")
+    
+    return SQLTemplate(sql, slots, period, top_n)
+
+def _outside_literals(sql: str, func) -> str:
+    """Apply func to the parts of sql that are not inside string literals"""
+    parts: List[str] = []
+    position = 0
+    for match in STRING_LITERAL.finditer(sql):
+        parts.append(func(sql[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(func(sql[position:]))
+    return "".join(parts)
+
+def _classify_placeholders(sql: str) -> List[str]:
+    slots: List[str] = []
+    for match in re.finditer(SLOT_MARK, sql):
+        slots.append(_classify_placeholder(sql[:match.start()], slots[-1] if slots else None))
+    return slots
@@ -0,0 +1,216 @@
+"""
+STT Engines for Jen AI Assistant
+Pluggable speech-to-text backends - whole clips or live PCM with partial transcripts
+"""
+
+import io
+import json
+import asyncio
+import logging
+import threading
+import contextvars
+import importlib
+import importlib.util
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+
+from pydub import AudioSegment
+
+from metrics import span
+
+log = logging.getLogger("jen.stt")
+
+# What the old placeholder recognizer always heard - kept for STT_ENGINE=mock
+MOCK_TRANSCRIPT = "What is my total income this year?"
+
+def decode_audio(audio: bytes, sample_rate: int = 16000) -> bytes:
+    """Any clip pydub can read -> mono 16-bit PCM at sample_rate
+    
+    WAV is read natively; compressed formats (webm, ogg, mp3) go through ffmpeg.
+    """
+    audio_format = "wav" if audio[:4] == b"RIFF" and audio[8:12] == b"WAVE" else None
+    segment = AudioSegment.from_file(io.BytesIO(audio), format=audio_format)
+    return segment.set_channels(1).set_frame_rate(sample_rate).set_sample_width(2).raw_data
+
+class Transcript:
+    """Recognized text so far; final=True once the utterance is complete"""
+    
+    __slots__ = ("text", "final")
+    
+    def __init__(self, text: str, final: bool):
+        self.text = text
+        self.final = final
+
+class STTEngine(ABC):
+    """Speech-to-text backend
+    
+    transcribe() takes a whole encoded clip. stream() takes raw mono 16-bit
+    PCM chunks at sample_rate and yields partial Transcripts as recognition
+    progresses, then exactly one final Transcript when the chunks run out.
+    """
+    
+    name = "none"
+    sample_rate = 16000
+    
+    @abstractmethod
+    async def transcribe(self, audio: bytes) -> Optional[str]:
+        """Text of a whole encoded clip, or None if nothing was recognized"""
+    
+    @abstractmethod
+    def stream(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[Transcript]:
+        """Partial Transcripts for the PCM chunks, then one final Transcript"""
+    
+    async def warm_up(self):
+        """Load models ahead of the first call"""
+    
+    def health_check(self) -> bool:
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"engine": self.name}
+    
+    def close(self):
+        pass
+
+class MockSTT(STTEngine):
+    """Hears the same question every time - for local testing without a recognizer"""
+    
+    name = "mock"
+    
+    def __init__(self, text: str = MOCK_TRANSCRIPT):
+        self.text = text
+    
+    async def transcribe(self, audio: bytes) -> Optional[str]:
+        return self.text
+    
+    async def stream(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[Transcript]:
+        async for _ in chunks:
+            pass
+        words = self.text.split()
+        for count in range(1, len(words)):
+            yield Transcript(" ".join(words[:count]), False)
+        yield Transcript(self.text, True)
+
+class VoskSTT(STTEngine):
+    """Offline Kaldi recognition on the CPU via the optional vosk package
+    
+    The model is loaded once and shared; each clip or stream gets its own
+    recognizer. Decoding and recognition run on a dedicated worker pool so
+    the event loop never blocks on them.
+    """
+    
+    name = "vosk"
+    
+    def __init__(self, model_path: str, workers: int = 2, chunk_bytes: int = 8000):
+        self.model_path = model_path
+        self.chunk_bytes = chunk_bytes
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="jen-stt")
+        self._stats = {"transcribed": 0, "streams": 0, "partials": 0, "failures": 0}
+    
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("vosk") is not None
+    
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                vosk = importlib.import_module("vosk")
+                vosk.SetLogLevel(-1)
+                self._model = vosk.Model(self.model_path)
+                log.info(f"Vosk model loaded from {self.model_path}")
+            return self._model
+    
+    def _recognizer(self):
+        vosk = importlib.import_module("vosk")
+        return vosk.KaldiRecognizer(self._get_model(), self.sample_rate)
+    
+    async def _run(self, func, *args):
+        """Run on the STT pool, keeping the request's trace context"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, contextvars.copy_context().run, func, *args)
+    
+    async def warm_up(self):
+        try:
+            await self._run(self._get_model)
+        except Exception as e:
+            log.error(f"Could not load Vosk model from {self.model_path}: {e}")
+    
+    def health_check(self) -> bool:
+        return self._model is not None
+    
+    def _transcribe_sync(self, audio: bytes) -> str:
+        with span("stt_decode"):
+            pcm = decode_audio(audio, self.sample_rate)
+        recognizer = self._recognizer()
+        parts = []
+        for start in range(0, len(pcm), self.chunk_bytes):
+            if recognizer.AcceptWaveform(pcm[start:start + self.chunk_bytes]):
+                parts.append(json.loads(recognizer.Result()).get("text", ""))
+        parts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+        return " ".join(part for part in parts if part)
+    
+    async def transcribe(self, audio: bytes) -> Optional[str]:
+        try:
+            text = await self._run(self._transcribe_sync, audio)
+        except Exception as e:
+            self._stats["failures"] += 1
+            log.error(f"Vosk transcription failed: {e}")
+            return None
+        self._stats["transcribed"] += 1
+        return text or None
+    
+    @staticmethod
+    def _accept(recognizer, chunk: bytes) -> Tuple[bool, str]:
+        """Feed one chunk; (True, utterance text) at an endpoint, else (False, current partial)"""
+        if recognizer.AcceptWaveform(chunk):
+            return True, json.loads(recognizer.Result()).get("text", "")
+        return False, json.loads(recognizer.PartialResult()).get("partial", "")
+    
+    @staticmethod
+    def _finish(recognizer) -> str:
+        return json.loads(recognizer.FinalResult()).get("text", "")
+    
+    async def stream(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[Transcript]:
+        recognizer = await self._run(self._recognizer)
+        self._stats["streams"] += 1
+        # Utterances Vosk has already closed; the open one is reported as a partial
+        settled = []
+        last = ""
+        async for chunk in chunks:
+            endpoint, text = await self._run(self._accept, recognizer, chunk)
+            if endpoint:
+                if text:
+                    settled.append(text)
+                current = " ".join(settled)
+            else:
+                current = " ".join(settled + [text] if text else settled)
+            if current and current != last:
+                last = current
+                self._stats["partials"] += 1
+                yield Transcript(current, False)
+        tail = await self._run(self._finish, recognizer)
+        self._stats["transcribed"] += 1
+        yield Transcript(" ".join(settled + [tail] if tail else settled), True)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "engine": self.name, "model_loaded": self._model is not None, "model_path": self.model_path}
+    
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+def create_engine(name: str, model_path: str, workers: int = 2) -> Optional[STTEngine]:
+    """The engine STT_ENGINE names, or None when it can't run here"""
+    name = name.lower()
+    if name == "mock":
+        log.warning("Using the mock speech recognizer - every caller is heard asking the same question")
+        return MockSTT()
+    if name == "vosk":
+        if not VoskSTT.available():
+            log.error("STT_ENGINE=vosk but the vosk package is not installed - speech recognition disabled")
+            return None
+        return VoskSTT(model_path, workers=workers)
+    log.error(f"Unknown STT_ENGINE '{name}' - speech recognition disabled")
+    return None
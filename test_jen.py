@@ -156,11 +156,12 @@ class JenTestSuite:
             user_type = "agent"
             
             # Step 1: Generate SQL
-            sql = await jen_ai.generate_sql_query(question, user_type, user_id)
+            prepared = await jen_ai.prepare_query(question, user_type, user_id)
             
             # Step 2: Execute query
-            if sql:
-                results = await db_service.execute_query(sql, [user_id])
+            if prepared:
+                sql, params = prepared
+                results = await db_service.execute_query(sql, params)
                 
                 # Step 3: Generate response
                 if results:
@@ -176,6 +177,27 @@ class JenTestSuite:
         except Exception as e:
             self.test_result("Complete Workflow", False, str(e))
     
+    async def test_sql_templates(self):
+        """Test that generated SQL becomes a correctly parameterized template"""
+        try:
+            from datetime import date
+            from sql_templates import build_template
+            
+            # % inside a LIKE pattern is text, even when followed by "s"
+            template = build_template(
+                "SELECT SUM(Amount) FROM payroll_Queue_Archive WHERE EQUITY_DIVISION_25_ID = %s "
+                "AND Agent_Name LIKE '%smith%' AND YEAR(Wire_Date) = 2025",
+                "What is my team's income this year?", "121901", today=date(2025, 6, 1)
+            )
+            like_kept = "LIKE '%%smith%%'" in template.sql and template.slots == ["user_id", "year"]
+            self.test_result("SQL Template - LIKE Pattern", like_kept, f"Slots: {template.slots}")
+            
+            prepared_ok = "LIKE ''%%smith%%''" in template.prepared_sql and "@p2" not in template.prepared_sql
+            self.test_result("SQL Template - Prepared SQL", prepared_ok, template.prepared_sql[:80])
+        
+        except Exception as e:
+            self.test_result("SQL Templates", False, str(e))
+    
     async def test_error_handling(self):
         """Test error handling and edge cases"""
         try:
@@ -242,6 +264,7 @@ async def main():
     await suite.test_voice_service()
     await suite.test_auth_service()
     await suite.test_integration_workflow()
+    await suite.test_sql_templates()
     await suite.test_error_handling()
     
     # Print summary
@@ -0,0 +1,122 @@
+"""
+TTS Cache for Jen AI Assistant
+Content-addressed synthesized audio - an in-memory LRU tier over an on-disk tier
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+log = logging.getLogger("jen.tts_cache")
+
+def audio_key(text: str, voice_id: str, model_id: str, voice_settings: Dict[str, Any]) -> str:
+    """sha256 over everything that changes the audio, so a new voice or setting never reuses old clips"""
+    material = json.dumps(
+        {"text": text, "voice_id": voice_id, "model_id": model_id, "voice_settings": voice_settings},
+        sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class AudioCache:
+    """key -> audio bytes, kept in memory (LRU, bounded by bytes) and on disk
+    
+    Disk entries live at <directory>/<key[:2]>/<key>.mp3 and are written
+    atomically, so a crash never leaves a truncated clip behind. A disk hit
+    is promoted to memory. directory=None keeps the cache memory-only.
+    """
+    
+    def __init__(self, directory: Optional[str] = ".tts_cache", max_memory_bytes: int = 32 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "disk_errors": 0}
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return audio
+        
+        audio = self._read(key)
+        with self._lock:
+            if audio is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, audio)
+        return audio
+    
+    def put(self, key: str, audio: bytes, persist: bool = True):
+        """Cache a clip in memory and, unless persist=False, on disk"""
+        with self._lock:
+            self._remember(key, audio)
+            self._stats["stores"] += 1
+        if persist:
+            self._write(key, audio)
+    
+    def _remember(self, key: str, audio: bytes):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats["evictions"] += 1
+    
+    def _read(self, key: str) -> Optional[bytes]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log.warning(f"TTS cache read failed for {key[:12]}: {e}")
+            with self._lock:
+                self._stats["disk_errors"] += 1
+            return None
+    
+    def _write(self, key: str, audio: bytes):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning(f"TTS cache write failed for {key[:12]}: {e}")
+            with self._lock:
+                self._stats["disk_errors"] += 1
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            return {
+                **self._stats,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "directory": self.directory
+            }
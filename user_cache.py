@@ -0,0 +1,85 @@
+"""
+User Profile Cache for Jen AI Assistant
+Keeps recently used user profiles so every conversation turn doesn't re-read them
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Iterable
+
+log = logging.getLogger("jen.user_cache")
+
+def user_key(user_id: Any) -> str:
+    """Canonical string form of a user id: 129814, 129814.0 and "129814" all map to "129814" """
+    if isinstance(user_id, float) and user_id.is_integer():
+        return str(int(user_id))
+    key = str(user_id).strip()
+    if key.endswith(".0") and key[:-2].isdigit():
+        return key[:-2]
+    return key
+
+class UserProfileCache:
+    """user_id -> profile dict, with TTL, LRU eviction and explicit invalidation
+    
+    Profiles are copied in and out, so callers may modify what they get back.
+    """
+    
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+    
+    def get(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        key = user_key(user_id)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or time.time() - item[0] > self.ttl_seconds:
+                if item is not None:
+                    del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return dict(item[1])
+    
+    def get_many(self, user_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Cached profiles among user_ids, keyed by id"""
+        found = {}
+        for user_id in user_ids:
+            profile = self.get(user_id)
+            if profile is not None:
+                found[user_key(user_id)] = profile
+        return found
+    
+    def put(self, user_id: Any, profile: Dict[str, Any]):
+        key = user_key(user_id)
+        with self._lock:
+            self._entries[key] = (time.time(), dict(profile))
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    def invalidate(self, user_ids: Optional[List[Any]] = None):
+        """Forget the given users' profiles, or every profile when None"""
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_key(user_id), None)
+            self._stats["invalidations"] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0
+            }
@@ -4,16 +4,75 @@ Handles speech-to-text, text-to-speech, and phone integrations
 """
 
 import os
+import re
+import time
 import logging
 import base64
+import asyncio
+import secrets
 import requests
 import json
-from typing import Dict, Any, Optional
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, AsyncIterator, Tuple, List, Deque
+
+import httpx
 from dotenv import load_dotenv
+from metrics import record, timed
+from tts_cache import AudioCache, audio_key
+from audio_splicer import AudioSplicer
+from stt_engines import STTEngine, create_engine
 
 load_dotenv()
 log = logging.getLogger("jen.voice")
 
+# Fixed prompts - rendered once, then served from the audio cache
+GREETING = "Hi! I'm Jen, your AI assistant. I can help you with questions about your real estate business. What would you like to know?"
+IDENTIFY_PROMPT = "Hi! I'm Jen, your AI assistant. Could you please tell me your agent ID or full name so I can help you?"
+ERROR_MESSAGE = "I'm sorry, I'm having trouble processing your request right now. Please try again."
+STATIC_PHRASES = (GREETING, IDENTIFY_PROMPT, ERROR_MESSAGE)
+
+# Answer sentences that carry no caller figures, so their audio is worth keeping
+REUSABLE_PHRASES = frozenset((
+    "Great work!",
+    "Excellent work!",
+    "Keep pushing!",
+    "Outstanding!",
+    "You might want to check if all your transactions have been processed.",
+    "You haven't closed any deals this year yet.",
+    "I couldn't find any data for your question.",
+    "You might want to try asking about a different time period or check if you have any transactions recorded."
+))
+# "Hi Maria!" - one clip per agent, reused by every answer they get
+_GREETING_UNIT = re.compile(r"^Hi [^\W\d][\w'-]*!$")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_PHRASE_BREAK = re.compile(r"(?<=[,:;])\s+")
+
+def split_sentences(text: str, max_chars: int = 120) -> List[str]:
+    """Split text into speakable units - sentences, with long ones broken at commas/colons
+    
+    Only punctuation followed by whitespace ends a unit, so "$1,234.56" stays
+    whole. Phrases of an over-long sentence (a list of agent names) are packed
+    back together up to max_chars.
+    """
+    units: List[str] = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            units.append(sentence)
+            continue
+        current = ""
+        for phrase in _PHRASE_BREAK.split(sentence):
+            if current and len(current) + 1 + len(phrase) > max_chars:
+                units.append(current)
+                current = phrase
+            else:
+                current = f"{current} {phrase}" if current else phrase
+        if current:
+            units.append(current)
+    return units
+
 class VoiceProcessor:
     """Voice processing service for phone and audio integration"""
     
@@ -24,6 +83,49 @@ class VoiceProcessor:
         
         # ElevenLabs API endpoints
         self.elevenlabs_base_url = "https://api.elevenlabs.io/v1"
+        self.tts_model_id = "eleven_monolingual_v1"
+        self.voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.8,
+            "style": 0.2,
+            "use_speaker_boost": True
+        }
+        
+        # Speech recognition runs locally (STT_ENGINE=vosk) or is mocked for testing (STT_ENGINE=mock)
+        self.stt_engine: Optional[STTEngine] = create_engine(
+            os.getenv("STT_ENGINE", "vosk"),
+            model_path=os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15"),
+            workers=int(os.getenv("STT_WORKERS", "2"))
+        )
+        
+        # Clips are keyed by text, voice, model and settings, so changing any of them re-renders
+        self.audio_cache = AudioCache(
+            directory=os.getenv("TTS_CACHE_DIR", ".tts_cache") or None,
+            max_memory_bytes=int(float(os.getenv("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024)
+        )
+        self.static_phrases = set(STATIC_PHRASES)
+        
+        # Pooled ElevenLabs client (created lazily inside the event loop)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self.tts_timeout = float(os.getenv("TTS_TIMEOUT_SECONDS", "30"))
+        self.stream_chunk_size = int(os.getenv("TTS_STREAM_CHUNK_BYTES", "4096"))
+        
+        # ticket -> (expires_at, text) for audio fetched from /voice/audio/{ticket}
+        self._speech_tickets: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.speech_ticket_ttl = float(os.getenv("TTS_STREAM_TICKET_TTL_SECONDS", "120"))
+        self.max_speech_tickets = 1000
+        
+        # Multi-sentence answers render unit by unit, this many ahead of playback
+        self.tts_parallelism = max(1, int(os.getenv("TTS_PARALLELISM", "3")))
+        self.tts_unit_chars = int(os.getenv("TTS_UNIT_MAX_CHARS", "120"))
+        
+        # Templated sentences ("Your total income this year is $X.") are spliced from cached fragments
+        self.splicer: Optional[AudioSplicer] = None
+        if os.getenv("TTS_SPLICING", "true").lower() == "true":
+            self.splicer = AudioSplicer(
+                self._fragment_audio,
+                crossfade_ms=int(os.getenv("TTS_SPLICE_CROSSFADE_MS", "15"))
+            )
         
         log.info(f"VoiceProcessor initialized - Voice ID: {self.jen_voice_id}")
     
@@ -31,63 +133,290 @@ class VoiceProcessor:
         """Check if voice service is healthy"""
         return bool(self.elevenlabs_api_key)
     
+    @timed("stt")
     async def speech_to_text(self, audio_data: str) -> Optional[str]:
-        """Convert speech to text using ElevenLabs or Whisper"""
+        """Transcribe a base64-encoded clip (WAV, or any format ffmpeg reads) with the configured engine"""
+        if self.stt_engine is None:
+            log.error("No speech recognition engine available")
+            return None
+        if audio_data.startswith("data:"):
+            # Browser recorders hand over data URLs ("data:audio/webm;base64,...")
+            audio_data = audio_data.partition(",")[2]
         try:
-            # For now, this is a placeholder
-            # In production, you'd use ElevenLabs speech recognition or OpenAI Whisper
-            log.info("Processing speech-to-text conversion")
-            
-            # Placeholder implementation
-            # You would decode the base64 audio and send to speech recognition service
-            
-            return "What is my total income this year?"  # Mock response for testing
-            
-        except Exception as e:
-            log.error(f"Speech-to-text conversion failed: {e}")
+            audio = base64.b64decode(audio_data, validate=True)
+        except ValueError as e:
+            log.error(f"Speech-to-text got invalid base64 audio: {e}")
             return None
+        if not audio:
+            return None
+        
+        transcript = await self.stt_engine.transcribe(audio)
+        log.info(f"Speech-to-text ({self.stt_engine.name}) heard {len(transcript or '')} chars")
+        return transcript
     
-    async def text_to_speech(self, text: str) -> Optional[str]:
-        """Convert text to speech using ElevenLabs"""
+    @timed("tts")
+    async def text_to_speech(self, text: str, cache: Optional[bool] = None) -> Optional[str]:
+        """Convert text to speech using ElevenLabs
+        
+        Fixed phrases (or any text with cache=True) are synthesized once and
+        then served from the audio cache. Longer answers are split into
+        sentences rendered in parallel; of those only reusable ones (the
+        per-agent greeting, fixed encouragements) are cached - sentences
+        quoting a caller's own figures never are.
+        """
         try:
-            if not self.elevenlabs_api_key:
-                log.error("ElevenLabs API key not configured")
+            units = self._speech_units(text, cache)
+            if len(units) == 1:
+                audio = await self.speech_bytes(text, cache)
+            else:
+                audio = await self._render_units(units, cache)
+            if audio is None:
                 return None
             
-            url = f"{self.elevenlabs_base_url}/text-to-speech/{self.jen_voice_id}"
-            
-            headers = {
-                "Accept": "audio/mpeg",
-                "Content-Type": "application/json",
-                "xi-api-key": self.elevenlabs_api_key
-            }
-            
-            data = {
-                "text": text,
-                "model_id": "eleven_monolingual_v1",
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.8,
-                    "style": 0.2,
-                    "use_speaker_boost": True
-                }
-            }
-            
-            response = requests.post(url, json=data, headers=headers, timeout=30)
+            # Convert audio bytes to base64 for transmission
+            return base64.b64encode(audio).decode('utf-8')
             
-            if response.status_code == 200:
-                # Convert audio bytes to base64 for transmission
-                audio_base64 = base64.b64encode(response.content).decode('utf-8')
-                log.info(f"Text-to-speech successful for: {text[:50]}...")
-                return audio_base64
-            else:
-                log.error(f"ElevenLabs TTS failed: {response.status_code} - {response.text}")
-                return None
-                
         except Exception as e:
             log.error(f"Text-to-speech conversion failed: {e}")
             return None
     
+    async def speech_bytes(self, text: str, cache: Optional[bool] = None) -> Optional[bytes]:
+        """MP3 for one unit of text - cached when reusable, spliced when templated, else synthesized"""
+        use_cache = self._reusable(text) if cache is None else cache
+        key = self._audio_key(text)
+        if use_cache:
+            audio = self.audio_cache.get(key)
+            if audio is not None:
+                return audio
+        elif self.splicer is not None:
+            audio = await self.splicer.assemble(text)
+            if audio is not None:
+                return audio
+        
+        audio = await self._synthesize(text)
+        if audio is not None and use_cache:
+            self.audio_cache.put(key, audio)
+        return audio
+    
+    async def _fragment_audio(self, fragment: str) -> Optional[bytes]:
+        """Splice fragments are rendered once and kept in the audio cache"""
+        return await self.speech_bytes(fragment, cache=True)
+    
+    def _reusable(self, text: str) -> bool:
+        return text in self.static_phrases or text in REUSABLE_PHRASES or bool(_GREETING_UNIT.match(text))
+    
+    def _speech_units(self, text: str, cache: Optional[bool]) -> List[str]:
+        """Fixed phrases stay whole so their cached clip keeps its natural prosody"""
+        if cache or text in self.static_phrases:
+            return [text]
+        return split_sentences(text, self.tts_unit_chars) or [text]
+    
+    async def _render_units(self, units: List[str], cache: Optional[bool]) -> Optional[bytes]:
+        """Render every unit, at most tts_parallelism at once, joined in order"""
+        semaphore = asyncio.Semaphore(self.tts_parallelism)
+        
+        async def render(unit: str) -> Optional[bytes]:
+            async with semaphore:
+                return await self.speech_bytes(unit, cache)
+        
+        parts = await asyncio.gather(*(render(unit) for unit in units))
+        if any(part is None for part in parts):
+            return None
+        # MP3 is a stream of self-contained frames, so clips concatenate cleanly
+        return b"".join(parts)
+    
+    async def stream_answer(self, text: str, cache: Optional[bool] = None) -> AsyncIterator[bytes]:
+        """Stream a whole answer sentence by sentence
+        
+        The first sentence streams straight from ElevenLabs while up to
+        tts_parallelism of the following ones render concurrently behind it;
+        they are emitted strictly in order, so the caller hears Jen after the
+        first sentence's latency rather than the whole answer's. Time to the
+        first audio byte is recorded as the "tts_first_audio" stage.
+        """
+        units = self._speech_units(text, cache)
+        started = time.perf_counter()
+        ahead: Deque["asyncio.Future[Optional[bytes]]"] = deque()
+        next_unit = 1
+        
+        def fill():
+            nonlocal next_unit
+            while next_unit < len(units) and len(ahead) < self.tts_parallelism:
+                ahead.append(asyncio.ensure_future(self.speech_bytes(units[next_unit], cache)))
+                next_unit += 1
+        
+        try:
+            fill()
+            first = True
+            async for chunk in self.stream_speech(units[0], cache):
+                if first:
+                    record("tts_first_audio", time.perf_counter() - started)
+                    first = False
+                yield chunk
+            if first:
+                # The opening sentence failed; don't play the rest without it
+                return
+            
+            while ahead:
+                audio = await ahead.popleft()
+                fill()
+                if audio is None:
+                    log.error(f"Text-to-speech failed mid-answer ({len(units)} sentences) - ending stream early")
+                    return
+                yield audio
+        finally:
+            for pending in ahead:
+                pending.cancel()
+    
+    def _audio_key(self, text: str) -> str:
+        return audio_key(text, self.jen_voice_id, self.tts_model_id, self.voice_settings)
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client reused for every ElevenLabs TTS request"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                base_url=self.elevenlabs_base_url,
+                headers={
+                    "Accept": "audio/mpeg",
+                    "Content-Type": "application/json",
+                    "xi-api-key": self.elevenlabs_api_key or ""
+                },
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("TTS_MAX_CONNECTIONS", "10")),
+                    max_keepalive_connections=int(os.getenv("TTS_MAX_CONNECTIONS", "10")),
+                    keepalive_expiry=60
+                ),
+                timeout=httpx.Timeout(self.tts_timeout, connect=5.0)
+            )
+        return self._http_client
+    
+    async def aclose(self):
+        """Close pooled HTTP connections and the STT worker pool"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self.stt_engine is not None:
+            self.stt_engine.close()
+    
+    def _tts_request(self, text: str) -> Dict[str, Any]:
+        return {
+            "text": text,
+            "model_id": self.tts_model_id,
+            "voice_settings": self.voice_settings
+        }
+    
+    async def _synthesize(self, text: str) -> Optional[bytes]:
+        """Render text with ElevenLabs, returning the whole MP3 (None on any failure)"""
+        if not self.elevenlabs_api_key:
+            log.error("ElevenLabs API key not configured")
+            return None
+        
+        try:
+            response = await self._get_http_client().post(
+                f"/text-to-speech/{self.jen_voice_id}", json=self._tts_request(text)
+            )
+        except httpx.HTTPError as e:
+            log.error(f"ElevenLabs TTS request failed: {e}")
+            return None
+        
+        if response.status_code == 200:
+            log.info(f"Text-to-speech successful for: {text[:50]}...")
+            return response.content
+        log.error(f"ElevenLabs TTS failed: {response.status_code} - {response.text}")
+        return None
+    
+    async def stream_speech(self, text: str, cache: Optional[bool] = None) -> AsyncIterator[bytes]:
+        """Yield MP3 chunks as ElevenLabs produces them
+        
+        Time to the first provider byte is recorded as the "tts_ttfb" stage and
+        the whole stream as "tts_stream". Cached clips are replayed in chunks;
+        a clip that should be cached (same rule as text_to_speech) is stored
+        once the stream completes. Failures end the stream early rather than
+        raising, since the response headers have already gone out.
+        """
+        use_cache = self._reusable(text) if cache is None else cache
+        key = self._audio_key(text)
+        if use_cache:
+            audio = self.audio_cache.get(key)
+            if audio is not None:
+                for start in range(0, len(audio), self.stream_chunk_size):
+                    yield audio[start:start + self.stream_chunk_size]
+                return
+        elif self.splicer is not None and self.splicer.plan(text) is not None:
+            audio = await self.splicer.assemble(text)
+            if audio is not None:
+                for start in range(0, len(audio), self.stream_chunk_size):
+                    yield audio[start:start + self.stream_chunk_size]
+                return
+        
+        if not self.elevenlabs_api_key:
+            log.error("ElevenLabs API key not configured")
+            return
+        
+        started = time.perf_counter()
+        chunks = [] if use_cache else None
+        complete = False
+        try:
+            async with self._get_http_client().stream(
+                "POST", f"/text-to-speech/{self.jen_voice_id}/stream", json=self._tts_request(text)
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    log.error(f"ElevenLabs TTS stream failed: {response.status_code} - {body[:200]!r}")
+                    return
+                first = True
+                async for chunk in response.aiter_bytes(self.stream_chunk_size):
+                    if first:
+                        record("tts_ttfb", time.perf_counter() - started)
+                        first = False
+                    if chunks is not None:
+                        chunks.append(chunk)
+                    yield chunk
+            complete = True
+        except httpx.HTTPError as e:
+            log.error(f"Text-to-speech stream failed: {e}")
+        finally:
+            record("tts_stream", time.perf_counter() - started)
+        
+        if complete and chunks:
+            self.audio_cache.put(key, b"".join(chunks))
+    
+    def create_speech_ticket(self, text: str) -> str:
+        """Park text for a later /voice/audio/{ticket} stream; tickets expire after speech_ticket_ttl"""
+        now = time.time()
+        while self._speech_tickets:
+            oldest, (expires_at, _) = next(iter(self._speech_tickets.items()))
+            if expires_at > now and len(self._speech_tickets) < self.max_speech_tickets:
+                break
+            del self._speech_tickets[oldest]
+        ticket = secrets.token_urlsafe(16)
+        self._speech_tickets[ticket] = (now + self.speech_ticket_ttl, text)
+        return ticket
+    
+    def redeem_speech_ticket(self, ticket: str) -> Optional[str]:
+        """Text for a live ticket - reusable until it expires, so a player can retry"""
+        entry = self._speech_tickets.get(ticket)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at <= time.time():
+            del self._speech_tickets[ticket]
+            return None
+        return text
+    
+    async def warm_up(self):
+        """Load the STT model, then render (or load from disk) every fixed phrase and splice fragment so no caller waits on ElevenLabs for them"""
+        if self.stt_engine is not None:
+            await self.stt_engine.warm_up()
+        ready = 0
+        for phrase in STATIC_PHRASES:
+            if await self.text_to_speech(phrase, cache=True):
+                ready += 1
+        log.info(f"TTS cache warmed - {ready}/{len(STATIC_PHRASES)} fixed phrases ready")
+        if self.splicer is not None and self.elevenlabs_api_key:
+            fragments = await self.splicer.warm_up(self.tts_parallelism)
+            log.info(f"Audio splicer warmed - {fragments} fragments ready")
+    
     async def process_phone_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process incoming phone webhook from ElevenLabs"""
         try:
@@ -121,11 +450,8 @@ class VoiceProcessor:
     async def _handle_call_start(self, call_id: str, caller_number: str) -> Dict[str, Any]:
         """Handle the start of a phone call"""
         try:
-            # Generate greeting message
-            greeting = "Hi! I'm Jen, your AI assistant. I can help you with questions about your real estate business. What would you like to know?"
-            
-            # Convert to speech
-            audio_response = await self.text_to_speech(greeting)
+            # Convert the greeting to speech (pre-rendered at startup)
+            audio_response = await self.text_to_speech(GREETING)
             
             if audio_response:
                 # Send response back to ElevenLabs to play to caller
@@ -221,7 +547,7 @@ class VoiceProcessor:
                 "system_prompt": """You are Jen, a helpful AI assistant for real estate professionals. 
                 You help agents and brokers with questions about their business data, income, deals, and performance. 
                 You are friendly, professional, and always ready to help with business insights.""",
-                "first_message": "Hi! I'm Jen, your AI assistant. I can help you with questions about your real estate business. What would you like to know?",
+                "first_message": GREETING,
                 "language": "en",
                 "max_duration_seconds": 600,
                 "webhook_url": os.getenv("JEN_WEBHOOK_URL", "https://jen-ai.onrender.com/elevenlabs/webhook")